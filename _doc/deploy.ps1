@@ -19,6 +19,9 @@ pip install -r ..\requirements.txt
 # 运行迁移
 python manage.py migrate
 
+# 把音乐 / 视频文件从 MEDIA_ROOT 移到 PROTECTED_MEDIA_ROOT（已移动的跳过，可重复执行）
+python manage.py move_protected_media
+
 # 收集静态文件
 python manage.py collectstatic --noinput
 
@@ -38,3 +41,6 @@ Set-Location ..
 
 Write-Host "✅ 部署完成!" -ForegroundColor Green
 Write-Host "📝 请手动重启 Web 服务器" -ForegroundColor Yellow
+Write-Host "📝 请手动重启后台任务 worker（python manage.py runworker），Stripe 支付、发放商品、退款恢复库存都依赖它" -ForegroundColor Yellow
+Write-Host "📝 请确认过期订单清理在运行（python manage.py expire_orders --interval 60），否则未支付订单一直占用库存" -ForegroundColor Yellow
+Write-Host "📝 请在任务计划程序中每 5 分钟执行一次 python manage.py rollup_sales，否则销售分析图表没有数据" -ForegroundColor Yellow
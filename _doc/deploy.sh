@@ -7,6 +7,31 @@ echo "🚀 开始部署..."
 echo "📥 拉取最新代码..."
 git pull origin main
 
+# 安装 / 更新常驻后台进程的 systemd 服务（异常退出后自动重启），并重启使新代码生效
+install_service() {
+    local name=$1 description=$2 command=$3
+    sudo tee /etc/systemd/system/$name.service > /dev/null <<EOF
+[Unit]
+Description=$description
+After=network.target
+
+[Service]
+User=$(whoami)
+WorkingDirectory=$(pwd)
+ExecStart=$(pwd)/venv/bin/python manage.py $command
+Restart=always
+RestartSec=5
+# 收到 SIGTERM 后执行完当前任务再退出
+TimeoutStopSec=120
+
+[Install]
+WantedBy=multi-user.target
+EOF
+    sudo systemctl daemon-reload
+    sudo systemctl enable $name
+    sudo systemctl restart $name
+}
+
 # 2. 后端部署
 echo "🔧 部署后端..."
 cd backend
@@ -20,12 +45,29 @@ pip install -r ../requirements.txt
 # 运行迁移
 python manage.py migrate
 
+# 把音乐 / 视频文件从 MEDIA_ROOT 移到 PROTECTED_MEDIA_ROOT（已移动的跳过，可重复执行）
+python manage.py move_protected_media
+
 # 收集静态文件
 python manage.py collectstatic --noinput
 
 # 重启 Gunicorn
 sudo systemctl restart gunicorn
 
+# 后台任务 worker（必需）：Stripe Webhook 事件处理、发放已购商品、评价图片处理、批量退款后恢复库存
+echo "⚙️ 启动后台任务 worker..."
+install_service social-commerce-worker "Social Commerce 后台任务 worker" "runworker --processes 2"
+
+# 过期订单清理：取消超过 ORDER_PENDING_TTL 未支付的订单并释放库存
+install_service social-commerce-expire-orders "Social Commerce 过期订单清理" "expire_orders --interval 60"
+
+# 每日销售汇总：每 5 分钟重新汇总有变化的日期（管理后台销售分析只读取汇总表），替换已有的同名 cron 任务
+echo "📊 配置销售汇总定时任务..."
+ROLLUP_CRON="*/5 * * * * cd $(pwd) && venv/bin/python manage.py rollup_sales 2>&1 | logger -t rollup_sales"
+(crontab -l 2>/dev/null | grep -v 'manage.py rollup_sales'; echo "$ROLLUP_CRON") | crontab -
+# 立即汇总一次（汇总表为空时自动全量汇总）
+python manage.py rollup_sales
+
 cd ..
 
 # 3. 前端部署
@@ -46,4 +88,6 @@ cd ..
 echo "✅ 部署完成!"
 echo "🔍 检查服务状态..."
 sudo systemctl status gunicorn
+sudo systemctl status social-commerce-worker
+sudo systemctl status social-commerce-expire-orders
 sudo systemctl status nginx
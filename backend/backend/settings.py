@@ -14,6 +14,8 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # 加载环境变量
 from dotenv import load_dotenv
 load_dotenv(os.path.join(Path(__file__).resolve().parent.parent, '.env'))
@@ -58,6 +60,7 @@ INSTALLED_APPS = [
     'shopping.apps.ShoppingConfig',
     'publish.apps.PublishConfig',
     'forum.apps.ForumConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
@@ -106,6 +109,78 @@ DATABASES = {
 }
 
 
+# ==================== 缓存配置 ====================
+# SKU 矩阵（含库存）、分类树、publish 列表等缓存靠递增版本号失效，版本号也存在缓存中，
+# 进程内缓存（LocMemCache）的失效只对当前进程生效，多进程部署时其他进程会一直返回旧数据。
+# 因此只有 DEBUG 下默认使用进程内缓存，DEBUG=False 时必须配置 Redis / Memcached 等共享缓存，例如：
+#     CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#     CACHE_LOCATION=redis://127.0.0.1:6379/1
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or (LOCAL_CACHE_BACKENDS[0] if DEBUG else None)
+if not CACHE_BACKEND or (CACHE_BACKEND in LOCAL_CACHE_BACKENDS and not DEBUG):
+    raise ImproperlyConfigured('DEBUG=False 时必须通过 CACHE_BACKEND / CACHE_LOCATION 配置共享缓存（Redis 或 Memcached）')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# SPU 的 SKU 矩阵缓存时间（秒），数据变更时由信号主动失效
+SKU_MATRIX_CACHE_TIMEOUT = int(os.environ.get('SKU_MATRIX_CACHE_TIMEOUT', 60 * 60))
+
+# publish 公开列表接口的响应缓存时间（秒），数据变更时由信号主动失效
+PUBLISH_CACHE_TIMEOUT = int(os.environ.get('PUBLISH_CACHE_TIMEOUT', 60 * 60))
+
+# 管理后台订单 / 退款统计的缓存时间（秒），设为 0 不缓存
+ORDER_STATS_CACHE_TIMEOUT = int(os.environ.get('ORDER_STATS_CACHE_TIMEOUT', 30))
+# 订单状态汇总表每个状态的分片数，订单变化时随机更新一个分片，减少并发下单时的行锁争用
+ORDER_STATS_SHARDS = int(os.environ.get('ORDER_STATS_SHARDS', 16))
+
+# 商品目录批量导入（shopping/catalog_io.py）每个事务写入的行数
+CATALOG_IMPORT_BATCH_SIZE = int(os.environ.get('CATALOG_IMPORT_BATCH_SIZE', 1000))
+
+# 评价图片（shopping/review_images.py）：单张上传大小上限（字节）、单次最多张数、
+# 处理后的最长边（像素）、允许解码的最大像素数
+REVIEW_IMAGE_MAX_UPLOAD_SIZE = int(os.environ.get('REVIEW_IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+REVIEW_IMAGE_MAX_COUNT = int(os.environ.get('REVIEW_IMAGE_MAX_COUNT', 9))
+REVIEW_IMAGE_MAX_DIMENSION = int(os.environ.get('REVIEW_IMAGE_MAX_DIMENSION', 2048))
+REVIEW_IMAGE_MAX_PIXELS = int(os.environ.get('REVIEW_IMAGE_MAX_PIXELS', 40_000_000))
+
+# 待支付订单的有效期（秒），超时后由 expire_orders 命令取消并恢复库存；
+# Stripe 支付页在订单过期前关闭，剩余不足 30 分钟（Stripe 支付页的最短有效期）的订单不能再发起 Stripe 支付
+ORDER_PENDING_TTL = int(os.environ.get('ORDER_PENDING_TTL', 60 * 60))
+# 过期订单每个事务处理的数量
+ORDER_EXPIRY_BATCH_SIZE = int(os.environ.get('ORDER_EXPIRY_BATCH_SIZE', 500))
+
+# 订单号生成方式（shopping/order_numbers.py）: snowflake / sequence
+ORDER_NUMBER_GENERATOR = os.environ.get('ORDER_NUMBER_GENERATOR', 'snowflake')
+# Snowflake worker id（0 ~ 1023），留空时每个进程启动后自动从数据库租用
+ORDER_NUMBER_WORKER_ID = int(os.environ['ORDER_NUMBER_WORKER_ID']) if os.environ.get('ORDER_NUMBER_WORKER_ID') else None
+# 自动租用的 worker id 的租约时长（秒），进程退出后超过该时长 worker id 才会被其他进程回收
+ORDER_NUMBER_WORKER_LEASE_TTL = int(os.environ.get('ORDER_NUMBER_WORKER_LEASE_TTL', 10 * 60))
+# 数据库序列方式每次分配的号段大小
+ORDER_NUMBER_SEQUENCE_BLOCK = int(os.environ.get('ORDER_NUMBER_SEQUENCE_BLOCK', 100))
+
+# 后台任务队列（jobs/queue.py）：running 超过该秒数的任务视为 worker 已退出，重新排队
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 10 * 60))
+
+# 音乐 / 视频流式播放（publish/streaming.py）
+# 文件保存在 PROTECTED_MEDIA_ROOT（不在 MEDIA_ROOT 下，不能通过 MEDIA_URL 访问），只能经 stream 接口播放
+PROTECTED_MEDIA_ROOT = os.environ.get('PROTECTED_MEDIA_ROOT') or os.path.join(BASE_DIR, 'protected_media')
+# MEDIA_SENDFILE_BACKEND: 留空由 Django 分块发送；'x-accel-redirect' 交给 Nginx；'x-sendfile' 交给 Apache
+# 使用 Nginx 时需配置内部路径，例如：
+#     location /protected-media/ { internal; alias /path/to/backend/protected_media/; }
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND') or None
+MEDIA_SENDFILE_URL_PREFIX = os.environ.get('MEDIA_SENDFILE_URL_PREFIX', '/protected-media/')
+# 播放签名链接的有效期（秒）
+MEDIA_STREAM_TOKEN_MAX_AGE = int(os.environ.get('MEDIA_STREAM_TOKEN_MAX_AGE', 60 * 60))
+
+
+# 商品搜索后端，留空则按数据库自动选择（MySQL 使用 FULLTEXT，其他数据库使用进程内倒排索引）
+PRODUCT_SEARCH_BACKEND = os.environ.get('PRODUCT_SEARCH_BACKEND') or None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
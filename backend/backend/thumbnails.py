@@ -0,0 +1,270 @@
+"""
+图片衍生图（缩略图 / WebP）
+商品图片、评价图片、头像、帖子图片、专辑封面等按固定尺寸生成缩小后的副本：
+    原图            products/2025/01/a.jpg
+    衍生图          _thumbs/small/products/2025/01/a.jpg         （原格式）
+                    _thumbs/small/products/2025/01/a.jpg.webp    （WebP）
+- 衍生图 URL 只由原图路径计算得出，序列化时不访问存储
+- 首次访问时由 serve_derivative 生成并写入存储，之后直接返回文件；
+  生产环境可让 Nginx 先查找文件（try_files），不存在时再转给 Django 生成
+- manage.py build_thumbnails 可为已有图片批量生成
+接口通过查询参数选择尺寸和格式：?image_size=small&image_format=webp，不传时返回原图
+"""
+import mimetypes
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models
+from django.http import FileResponse, Http404
+from rest_framework import serializers
+
+THUMBNAIL_DIR = '_thumbs'
+
+# 尺寸名: (最大宽度, 最大高度)，等比缩小到框内，不放大
+THUMBNAIL_SIZES = {
+    'thumb': (150, 150),
+    'small': (400, 400),
+    'medium': (800, 800),
+    'large': (1600, 1600),
+}
+DERIVATIVE_FORMATS = ('original', 'webp')
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# 需要生成衍生图的图片字段（build_thumbnails 命令按此列表补全）
+IMAGE_FIELDS = [
+    ('shopping.ProductImage', 'image'),
+    ('shopping.OrderItemReviewImage', 'image'),
+    ('user.User', 'avatar'),
+    ('forum.Image', 'file'),
+    ('publish.Artist', 'image'),
+    ('publish.Album', 'cover_image'),
+    ('publish.Video', 'thumbnail'),
+]
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+# 原格式中 Pillow 的保存格式
+_SAVE_FORMATS = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.png': 'PNG',
+    '.gif': 'GIF',
+    '.webp': 'WEBP',
+    '.bmp': 'BMP',
+}
+
+
+class DerivativeError(Exception):
+    """原图不存在或无法解码"""
+
+
+def derivative_name(name, size, fmt='original'):
+    """衍生图在存储中的路径"""
+    path = posixpath.join(THUMBNAIL_DIR, size, name)
+    return f'{path}.webp' if fmt == 'webp' else path
+
+
+def parse_derivative_name(path):
+    """
+    从衍生图路径解析出 (原图路径, 尺寸, 格式)，不合法时返回 None
+    path: THUMBNAIL_DIR 之后的部分，如 'small/products/a.jpg.webp'
+    """
+    size, _, name = path.partition('/')
+    if size not in THUMBNAIL_SIZES or not name:
+        return None
+    fmt = 'original'
+    if name.endswith('.webp') and posixpath.splitext(name[:-len('.webp')])[1].lower() in IMAGE_EXTENSIONS:
+        name, fmt = name[:-len('.webp')], 'webp'
+    # 不允许访问上级目录，也不为衍生图再生成衍生图
+    if posixpath.normpath(name) != name or name.startswith(('/', '../', f'{THUMBNAIL_DIR}/')):
+        return None
+    if posixpath.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+        return None
+    return name, size, fmt
+
+
+def open_image(file):
+    """解码原图并按 EXIF 方向旋转"""
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(file) as image:
+            image.load()
+            return ImageOps.exif_transpose(image)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise DerivativeError(f'无法处理图片: {exc}')
+
+
+def encode_image(image, fmt, ext):
+    """按目标格式转换颜色模式并编码，返回 bytes"""
+    from PIL import Image
+
+    save_format = 'WEBP' if fmt == 'webp' else _SAVE_FORMATS.get(ext.lower(), 'PNG')
+    if save_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif save_format in ('WEBP', 'PNG') and image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.mode else 'RGB')
+    elif save_format == 'GIF' and image.mode not in ('P', 'L'):
+        image = image.convert('P', palette=Image.ADAPTIVE)
+
+    options = {}
+    if save_format == 'JPEG':
+        options = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+    elif save_format == 'WEBP':
+        options = {'quality': WEBP_QUALITY, 'method': 4}
+    elif save_format == 'PNG':
+        options = {'optimize': True}
+    output = BytesIO()
+    try:
+        image.save(output, save_format, **options)
+    except (OSError, ValueError) as exc:
+        raise DerivativeError(f'无法处理图片: {exc}')
+    return output.getvalue()
+
+
+def _save(storage, target, content, overwrite):
+    if overwrite and storage.exists(target):
+        storage.delete(target)
+    saved = storage.save(target, ContentFile(content))
+    # 并发生成同一张衍生图时，后写入的副本会被自动改名，删除即可，结果一致
+    if saved != target:
+        storage.delete(saved)
+
+
+def generate_derivatives(name, sizes=None, formats=DERIVATIVE_FORMATS, storage=None, overwrite=False):
+    """
+    生成一张原图的多个衍生图并写入存储，返回衍生图路径列表
+    已存在的跳过（overwrite=False）；原图只解码一次，从大到小依次缩放
+    """
+    from PIL import Image
+
+    storage = storage or default_storage
+    sizes = sorted(sizes or THUMBNAIL_SIZES, key=lambda size: THUMBNAIL_SIZES[size], reverse=True)
+    targets = [(size, fmt, derivative_name(name, size, fmt)) for size in sizes for fmt in formats]
+    missing = [item for item in targets if overwrite or not storage.exists(item[2])]
+    if not missing:
+        return [target for _, _, target in targets]
+    if not storage.exists(name):
+        raise DerivativeError(f'原图不存在: {name}')
+
+    with storage.open(name, 'rb') as file:
+        image = open_image(file)
+    ext = posixpath.splitext(name)[1]
+    for size in sizes:
+        wanted = [(fmt, target) for item_size, fmt, target in missing if item_size == size]
+        image.thumbnail(THUMBNAIL_SIZES[size], Image.LANCZOS)
+        for fmt, target in wanted:
+            _save(storage, target, encode_image(image, fmt, ext), overwrite)
+    return [target for _, _, target in targets]
+
+
+def generate_derivative(name, size, fmt='original', storage=None, overwrite=False):
+    """生成一张衍生图，返回衍生图路径，已存在且 overwrite=False 时直接返回"""
+    return generate_derivatives(name, [size], [fmt], storage=storage, overwrite=overwrite)[0]
+
+
+def delete_derivatives(name, storage=None):
+    """删除一张原图的全部衍生图（原图被替换或删除时调用）"""
+    storage = storage or default_storage
+    for size in THUMBNAIL_SIZES:
+        for fmt in DERIVATIVE_FORMATS:
+            target = derivative_name(name, size, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+
+
+def iter_image_names(labels=None):
+    """
+    遍历 IMAGE_FIELDS 中已上传图片的路径，返回 (模型, 路径)；labels 只遍历指定模型
+    多条记录共用的图片（如默认头像）只返回一次
+    """
+    for label, field_name in IMAGE_FIELDS:
+        if labels is not None and label not in labels:
+            continue
+        model = apps.get_model(label)
+        names = model._default_manager.exclude(**{field_name: ''}).exclude(
+            **{f'{field_name}__isnull': True}
+        ).order_by(field_name).values_list(field_name, flat=True).distinct()
+        for name in names.iterator(chunk_size=2000):
+            if posixpath.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                yield label, name
+
+
+# ==================== URL ====================
+
+def requested_variant(request):
+    """从请求参数读取 (尺寸, 格式)，未指定或不合法时尺寸为 None（原图）"""
+    if request is None:
+        return None, 'original'
+    params = getattr(request, 'query_params', request.GET)
+    size = params.get('image_size')
+    fmt = params.get('image_format', 'original')
+    return (size if size in THUMBNAIL_SIZES else None), (fmt if fmt in DERIVATIVE_FORMATS else 'original')
+
+
+def image_url(field_file, request=None, size=None, fmt=None):
+    """
+    图片 URL，request 不为空时返回完整地址
+    size / fmt 未指定时按请求参数 image_size / image_format 选择，都没有时返回原图
+    """
+    if not field_file:
+        return None
+    return image_url_for_name(field_file.name, request, size, fmt, storage=field_file.storage)
+
+
+def image_url_for_name(name, request=None, size=None, fmt=None, storage=None):
+    """同 image_url，参数为存储中的文件路径（如查询注解出的路径）"""
+    if not name:
+        return None
+    storage = storage or default_storage
+    requested_size, requested_fmt = requested_variant(request)
+    size = size or requested_size
+    fmt = fmt or requested_fmt
+    if size and posixpath.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+        name = derivative_name(name, size, fmt)
+    url = storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class DerivativeImageField(serializers.ImageField):
+    """ImageField 的输出按请求参数返回对应尺寸的衍生图 URL，上传行为不变"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return image_url(value, self.context.get('request'))
+
+
+class DerivativeImageModelSerializer(serializers.ModelSerializer):
+    """模型中的 ImageField 自动使用 DerivativeImageField"""
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: DerivativeImageField,
+    }
+
+
+# ==================== 按需生成 ====================
+
+def serve_derivative(request, path):
+    """
+    返回衍生图，不存在时先生成
+    URL: MEDIA_URL + THUMBNAIL_DIR + '/<尺寸>/<原图路径>[.webp]'
+    """
+    parsed = parse_derivative_name(path)
+    if parsed is None:
+        raise Http404
+    name, size, fmt = parsed
+    try:
+        target = generate_derivative(name, size, fmt)
+    except DerivativeError:
+        raise Http404
+    content_type = 'image/webp' if fmt == 'webp' else mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    response = FileResponse(default_storage.open(target, 'rb'), content_type=content_type)
+    # 头像等被替换后可能沿用原文件名，缓存时间不宜过长
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
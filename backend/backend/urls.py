@@ -18,7 +18,9 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from backend.thumbnails import THUMBNAIL_DIR, serve_derivative
 
 # 导入首页视图
 from shopping.index_views import index, index_login
@@ -32,6 +34,12 @@ urlpatterns = [
     path('api/', include('publish.urls')),
     path('api/forum/', include('forum.urls')),
     path('manage/shopping/', include('shopping.admin_urls')),  # 管理页面路由
+    # 图片衍生图：文件不存在时生成（生产环境 Nginx 找不到文件时转发到这里）
+    re_path(
+        rf'^{settings.MEDIA_URL.lstrip("/")}{THUMBNAIL_DIR}/(?P<path>.+)$',
+        serve_derivative,
+        name='image_derivative',
+    ),
 ]
 
 # ⭐ 开发环境：Django 提供文件服务
@@ -54,13 +54,20 @@ def check_settings():
     else:
         print("✅ CORS 配置正确")
     
-    # 6. 检查静态文件
+    # 6. 检查缓存（缓存失效靠共享的版本号，进程内缓存在多进程下会返回旧数据）
+    cache_backend = settings.CACHES['default']['BACKEND']
+    if cache_backend in settings.LOCAL_CACHE_BACKENDS:
+        issues.append(f"❌ CACHE_BACKEND = {cache_backend} (必须使用 Redis / Memcached 等共享缓存)")
+    else:
+        print(f"✅ CACHE_BACKEND = {cache_backend}")
+    
+    # 7. 检查静态文件
     if not settings.STATIC_ROOT:
         warnings.append("⚠️  STATIC_ROOT 未配置")
     else:
         print(f"✅ STATIC_ROOT = {settings.STATIC_ROOT}")
     
-    # 7. 检查安全设置
+    # 8. 检查安全设置
     security_settings = {
         'SECURE_SSL_REDIRECT': False,
         'SESSION_COOKIE_SECURE': False,
@@ -0,0 +1,105 @@
+"""
+帖子列表性能对比：完整 PostSerializer vs 精简 PostListSerializer
+统计每页响应字节数、序列化耗时（p50 / p95）和 SQL 查询数
+用法:
+    python manage.py benchmark_post_list --seed 300      # 先生成 300 个测试帖子（含图片和回复）
+    python manage.py benchmark_post_list --page-size 100 --repeat 20
+    python manage.py benchmark_post_list --cleanup       # 删除生成的测试帖子
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from forum.models import Image, Post, Reply
+from forum.replies import load_reply_trees
+from forum.serializers import PostSerializer
+from forum.views import PostViewSet, prefetch_post_relations
+
+BENCH_USERNAME = '__post_benchmark__'
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+class Command(BaseCommand):
+    help = '对比帖子列表完整表示与精简表示的响应大小和序列化耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='每页帖子数')
+        parser.add_argument('--repeat', type=int, default=10, help='重复次数')
+        parser.add_argument('--seed', type=int, default=0, help='先生成指定数量的测试帖子')
+        parser.add_argument('--replies', type=int, default=20, help='生成测试帖子时每个帖子的回复数')
+        parser.add_argument('--cleanup', action='store_true', help='删除生成的测试帖子后退出')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(username=BENCH_USERNAME).delete()
+            Image.objects.filter(file__startswith='posts/benchmark/').delete()
+            self.stdout.write(self.style.SUCCESS(f'已删除 {deleted} 条测试数据'))
+            return
+
+        if options['seed']:
+            self.seed(options['seed'], options['replies'])
+
+        page_size = options['page_size']
+        factory = APIRequestFactory()
+        list_view = PostViewSet.as_view({'get': 'list'})
+
+        def run_full():
+            # 拆分前的列表：每个帖子返回完整内容、全部图片和完整回复树
+            request = factory.get('/api/forum/posts/')
+            posts = list(prefetch_post_relations(Post.objects.order_by('-updated_at'))[:page_size])
+            trees = load_reply_trees([post.id for post in posts])
+            data = PostSerializer(posts, many=True, context={'request': request, 'reply_trees': trees}).data
+            return JSONRenderer().render(data)
+
+        def run_compact():
+            response = list_view(factory.get('/api/forum/posts/', {'page_size': page_size}))
+            return response.render().content
+
+        self.stdout.write(f'帖子总数: {Post.objects.count()}，page_size={page_size}')
+        for label, runner in (('full', run_full), ('compact', run_compact)):
+            runner()  # 预热
+            samples = []
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    content = runner()
+                    samples.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{label:<8} bytes={len(content):>9}  queries={len(queries):>3}  '
+                f'p50={percentile(samples, 50):8.2f}ms  p95={percentile(samples, 95):8.2f}ms'
+            )
+
+    def seed(self, count, replies_per_post):
+        User = get_user_model()
+        author, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        paragraph = '这是一段用于性能测试的帖子正文，包含足够长的内容以模拟真实的长帖。' * 20
+        posts = Post.objects.bulk_create([
+            Post(title=f'测试帖子 {i}', content=paragraph, author=author) for i in range(count)
+        ])
+        images = Image.objects.bulk_create([
+            Image(file=f'posts/benchmark/{i}.jpg') for i in range(count * 3)
+        ])
+        Post.images.through.objects.bulk_create([
+            Post.images.through(post_id=post.id, image_id=images[i * 3 + j].id)
+            for i, post in enumerate(posts) for j in range(3)
+        ])
+        for post in posts:
+            parent = None
+            for j in range(replies_per_post):
+                # 每三条回复组成一条楼中楼
+                reply = Reply.objects.create(
+                    post=post, author=author, content=f'回复 {j}', parent=parent if j % 3 else None
+                )
+                parent = reply
+        self.stdout.write(f'已生成 {count} 个测试帖子')
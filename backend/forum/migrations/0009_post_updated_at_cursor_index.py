@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0008_cursor_pagination_indexes'),
+        ('shopping', '0019_order_status_created_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['updated_at', 'id'], name='forum_post_updated_b917ff_idx'),
+        ),
+    ]
@@ -28,7 +28,8 @@ class Post(models.Model):
         verbose_name_plural = "帖子"
         indexes = [
             models.Index(fields=['author']),
-            models.Index(fields=['created_at']),
+            models.Index(fields=['created_at', 'id']),  # 游标分页 (created_at, id)
+            models.Index(fields=['updated_at', 'id']),  # 列表默认排序 -updated_at 的游标分页
         ]
 
         ordering = ['-created_at']
@@ -36,17 +37,23 @@ class Post(models.Model):
     def __str__(self):
         return self.title
 
-# 在删除帖子时，删除不再被任何帖子使用的图片文件：
+# 在删除帖子时，删除不再被任何帖子使用的图片：
+# 图片记录随帖子一起删除，文件由后台任务在事务提交后删除（事务回滚时任务也不会执行）
 @receiver(pre_delete, sender=Post)
 def delete_unused_images(sender, instance, **kwargs):
-    images_to_delete = []
-    for image in instance.images.all():
-        if image.posts.count() == 1:  # 只有当前帖子使用（删除后为 0）
-            images_to_delete.append(image)
-
-    for image in images_to_delete:
-        image.file.delete(save=False)
-        image.delete()
+    from django.db.models import Count
+    from .tasks import delete_image_files
+
+    # 只有当前帖子使用（删除后为 0）
+    unused = dict(
+        Image.objects.filter(id__in=instance.images.values('id'))
+        .annotate(post_count=Count('posts')).filter(post_count=1).values_list('id', 'file')
+    )
+    if not unused:
+        return
+
+    Image.objects.filter(id__in=unused.keys()).delete()
+    delete_image_files.enqueue(names=[name for name in unused.values() if name])
 
 
 class Image(models.Model):
@@ -1,9 +1,12 @@
 from rest_framework.pagination import PageNumberPagination
 
+from shopping.pagination import KeysetPaginationMixin
 
-class CustomPageNumberPagination(PageNumberPagination):
+
+class CustomPageNumberPagination(KeysetPaginationMixin, PageNumberPagination):
     """
     自定义分页类，支持客户端通过 page_size 参数控制每页数量
+    传 ?pagination=cursor 时使用游标分页（见 KeysetPaginationMixin）
     """
     page_size = 10  # 默认每页10条
     page_size_query_param = 'page_size'  # 允许客户端通过 page_size 参数指定
@@ -0,0 +1,78 @@
+"""
+回复树加载
+一次查询取出若干帖子的回复（连同作者），在内存中按 parent 组装成树，
+每条回复的子回复存放在 tree_children 属性中，ReplySerializer 优先读取它，不再逐条查询 children。
+"""
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Reply
+
+
+def _reply_queryset():
+    return Reply.objects.select_related('author').order_by('created_at', 'id')
+
+
+def load_reply_trees(post_ids, max_depth=None, max_replies=None):
+    """
+    加载帖子的回复树，返回 {post_id: [顶级回复, ...]}
+    max_depth: 最大层级（1 表示只返回顶级回复），None 不限制
+    max_replies: 每个帖子最多加载的回复数（按发布时间取最早的 N 条），None 不限制
+    子回复一定晚于父回复发布，按时间截取不会出现缺少父回复的情况。
+    """
+    trees = {post_id: [] for post_id in post_ids}
+    if not post_ids or max_depth == 0 or max_replies == 0:
+        return trees
+
+    queryset = _reply_queryset().filter(post_id__in=post_ids)
+    if max_replies is not None:
+        queryset = queryset.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=[F('post_id')],
+                order_by=[F('created_at').asc(), F('id').asc()],
+            )
+        ).filter(row_number__lte=max_replies)
+
+    children = defaultdict(list)
+    for reply in queryset:
+        reply.tree_children = []
+        if reply.parent_id is None:
+            trees[reply.post_id].append(reply)
+        else:
+            children[reply.parent_id].append(reply)
+
+    def attach(replies, depth):
+        for reply in replies:
+            if max_depth is None or depth < max_depth:
+                reply.tree_children = children.get(reply.id, [])
+                attach(reply.tree_children, depth + 1)
+
+    for roots in trees.values():
+        attach(roots, 1)
+    return trees
+
+
+def attach_reply_children(replies):
+    """
+    为任意一组回复填充完整的 tree_children（用于回复列表接口）
+    一次查询取出这些回复所在帖子的全部回复，返回的对象也会挂上各自的子回复
+    """
+    replies = list(replies)
+    if not replies:
+        return replies
+
+    loaded = {}
+    children = defaultdict(list)
+    for reply in _reply_queryset().filter(post_id__in={reply.post_id for reply in replies}):
+        loaded[reply.id] = reply
+        if reply.parent_id is not None:
+            children[reply.parent_id].append(reply)
+
+    for reply in loaded.values():
+        reply.tree_children = children.get(reply.id, [])
+    for reply in replies:
+        reply.tree_children = children.get(reply.id, [])
+    return replies
@@ -1,13 +1,15 @@
 from rest_framework import serializers
 from .models import Tag, Post, Image, Reply
+from .replies import load_reply_trees
 from django.apps import apps  # 用于延迟导入模型
+from backend.thumbnails import DerivativeImageModelSerializer, image_url, image_url_for_name
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
 
-class ImageSerializer(serializers.ModelSerializer):
+class ImageSerializer(DerivativeImageModelSerializer):
     class Meta:
         model = Image
         fields = '__all__'
@@ -21,20 +23,17 @@ class ReplySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_author(self, obj):
-        request = self.context.get('request')
-        avatar_url = obj.author.avatar.url if obj.author.avatar else None
-
-        if avatar_url and request:
-            avatar_url = request.build_absolute_uri(avatar_url)
-
         return {
             'id': obj.author.id,
             'name': obj.author.username,
-            'avatar': avatar_url
+            'avatar': image_url(obj.author.avatar, self.context.get('request'))
         }
 
     def get_children(self, obj):
-        children = obj.children.all()
+        # 优先使用 replies.py 预先组装好的子回复，避免每条回复查询一次
+        children = getattr(obj, 'tree_children', None)
+        if children is None:
+            children = obj.children.select_related('author')
         return ReplySerializer(children, many=True, context=self.context).data
 
 class PostSerializer(serializers.ModelSerializer):
@@ -42,7 +41,7 @@ class PostSerializer(serializers.ModelSerializer):
     products = serializers.SerializerMethodField()
     images = ImageSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
-    replies = ReplySerializer(many=True, read_only=True)
+    replies = serializers.SerializerMethodField()  # 顶级回复，子回复嵌套在 children 中
 
     tag_ids = serializers.PrimaryKeyRelatedField(
         many=True, 
@@ -93,40 +92,89 @@ class PostSerializer(serializers.ModelSerializer):
         return post
 
     def get_author(self, obj):
-        request = self.context.get('request')
-        avatar_url = obj.author.avatar.url if obj.author.avatar else None
-
-        if avatar_url and request:
-            avatar_url = request.build_absolute_uri(avatar_url)
-
         return {
             'id': obj.author.id,
             'name': obj.author.username,
-            'avatar': avatar_url
+            'avatar': image_url(obj.author.avatar, self.context.get('request'))
         }
     
+    def get_replies(self, obj):
+        """
+        返回回复树，层级和数量受 reply_max_depth / reply_max_replies 限制
+        列表接口由视图为整页帖子一次性加载（context['reply_trees']），其他情况单独加载
+        """
+        trees = self.context.get('reply_trees')
+        if trees is None or obj.id not in trees:
+            trees = load_reply_trees(
+                [obj.id],
+                max_depth=self.context.get('reply_max_depth'),
+                max_replies=self.context.get('reply_max_replies'),
+            )
+        return ReplySerializer(trees[obj.id], many=True, context=self.context).data
+
     def get_products(self, obj):
         """返回关联商品信息，包含图片"""
         request = self.context.get('request')
         products = obj.products.all()
         result = []
         for product in products:
-            # 获取主图
-            image = product.images.filter(is_main=True).first()
-            image_url = None
-            if image:
-                if request:
-                    try:
-                        image_url = request.build_absolute_uri(image.image.url)
-                    except Exception:
-                        image_url = image.image.url
-                else:
-                    image_url = image.image.url
-            
+            # 获取主图（优先使用视图预加载的 main_images）
+            if hasattr(product, 'main_images'):
+                image = product.main_images[0] if product.main_images else None
+            else:
+                image = product.images.filter(is_main=True).first()
             result.append({
                 'id': product.id,
                 'name': product.name,
                 'description': product.description,
-                'image': image_url
+                'image': image_url(image.image, request) if image else None
             })
-        return result
\ No newline at end of file
+        return result
+
+# 列表摘要长度（字符）
+POST_EXCERPT_LENGTH = 200
+
+
+class PostListSerializer(serializers.ModelSerializer):
+    """
+    帖子列表的精简表示：标题、摘要、作者、首图、标签、关联商品和各项计数
+    完整内容、全部图片和回复只在详情接口（PostSerializer）返回
+    计数、摘要、首图由 PostViewSet.annotate_list_fields 以注解方式提供
+    """
+    author = serializers.SerializerMethodField()
+    excerpt = serializers.SerializerMethodField()
+    content_truncated = serializers.SerializerMethodField()
+    first_image = serializers.SerializerMethodField()
+    image_count = serializers.IntegerField(read_only=True)
+    reply_count = serializers.IntegerField(read_only=True)
+    favorite_count = serializers.IntegerField(read_only=True)
+    is_favorited = serializers.BooleanField(read_only=True)
+    tags = TagSerializer(many=True, read_only=True)
+    products = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'excerpt', 'content_truncated', 'author', 'first_image', 'image_count',
+                  'tags', 'products', 'reply_count', 'favorite_count', 'is_favorited', 'created_at', 'updated_at']
+
+    get_author = PostSerializer.get_author
+    get_products = PostSerializer.get_products
+
+    def get_excerpt(self, obj):
+        if hasattr(obj, 'excerpt'):
+            return obj.excerpt
+        return obj.content[:POST_EXCERPT_LENGTH]
+
+    def get_content_truncated(self, obj):
+        if hasattr(obj, 'content_length'):
+            return obj.content_length > POST_EXCERPT_LENGTH
+        return len(obj.content) > POST_EXCERPT_LENGTH
+
+    def get_first_image(self, obj):
+        """首图完整 URL（first_image_file 为注解出的文件路径）"""
+        if hasattr(obj, 'first_image_file'):
+            name = obj.first_image_file
+        else:
+            image = obj.images.order_by('id').first()
+            name = image.file.name if image else None
+        return image_url_for_name(name, self.context.get('request'), storage=Image._meta.get_field('file').storage)
@@ -0,0 +1,16 @@
+"""
+forum 应用的后台任务（由 manage.py runworker 执行，见 jobs/queue.py）
+"""
+from jobs.queue import task
+
+
+@task('forum.delete_image_files')
+def delete_image_files(names):
+    """删除帖子图片文件及其缩略图（文件不存在时跳过，可重复执行）"""
+    from django.core.files.storage import default_storage
+
+    from backend.thumbnails import delete_derivatives
+
+    for name in names:
+        delete_derivatives(name)
+        default_storage.delete(name)
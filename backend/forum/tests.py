@@ -1,3 +1,158 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from shopping.models import Category, ProductImage, ProductSPU
+from user.models import PostFavorite, User
+from .models import Image, Post, Reply, Tag
+from .serializers import POST_EXCERPT_LENGTH
+
+
+class ForumTestCase(TestCase):
+    """帖子作者、回复用户和查询计数"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='x')
+        self.reader = User.objects.create_user(username='reader', password='x')
+
+    def create_post(self, chain=5, flat=0):
+        """chain 层嵌套的回复链，加上 flat 条顶级回复"""
+        post = Post.objects.create(title='帖子', content='内容', author=self.author)
+        parent = None
+        for _ in range(chain):
+            parent = Reply.objects.create(content='楼中楼', author=self.reader, post=post, parent=parent)
+        for _ in range(flat):
+            Reply.objects.create(content='顶级回复', author=self.reader, post=post)
+        return post
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+
+class PostListTests(ForumTestCase):
+    """帖子列表返回精简表示，查询数与每页条数无关"""
+
+    def setUp(self):
+        super().setUp()
+        tags = [Tag.objects.create(name=f'标签{index}') for index in range(2)]
+        category = Category.objects.create(name='音乐')
+        for index in range(12):
+            post = Post.objects.create(title=f'帖子{index}', content='长' * (POST_EXCERPT_LENGTH + index), author=self.author)
+            post.tags.set(tags)
+            spu = ProductSPU.objects.create(name=f'商品{index}', category=category)
+            ProductImage.objects.create(spu=spu, image=f'products/{spu.id}.jpg', is_main=True)
+            post.products.add(spu)
+            for number in range(2):
+                post.images.add(Image.objects.create(file=f'posts/images/{index}-{number}.jpg'))
+            for number in range(3):
+                Reply.objects.create(content='回复', author=self.reader, post=post)
+        self.favorited = Post.objects.order_by('id').first()
+        PostFavorite.objects.create(user=self.reader, post=self.favorited)
+
+    def test_compact_payload(self):
+        self.client.force_authenticate(self.reader)
+        _, response = self.count_queries('/api/forum/posts/?page_size=20')
+        results = {result['id']: result for result in response.data['results']}
+        result = results[self.favorited.id]
+        self.assertEqual(set(result), {
+            'id', 'title', 'excerpt', 'content_truncated', 'author', 'first_image', 'image_count',
+            'tags', 'products', 'reply_count', 'favorite_count', 'is_favorited', 'created_at', 'updated_at',
+        })
+        self.assertEqual(len(result['excerpt']), POST_EXCERPT_LENGTH)
+        # 第一个帖子的内容正好等于摘要长度，其余帖子超出
+        self.assertFalse(result['content_truncated'])
+        self.assertEqual(sum(item['content_truncated'] for item in results.values()), 11)
+        self.assertTrue(result['first_image'].endswith('posts/images/0-0.jpg'))
+        self.assertEqual((result['image_count'], result['reply_count'], result['favorite_count']), (2, 3, 1))
+        self.assertTrue(result['is_favorited'])
+        self.assertTrue(result['products'][0]['image'].endswith('.jpg'))
+        self.assertEqual(sum(item['is_favorited'] for item in results.values()), 1)
+
+    def test_queries_independent_of_page_size(self):
+        for user in (None, self.reader):
+            self.client.force_authenticate(user)
+            small, _ = self.count_queries('/api/forum/posts/?page_size=2')
+            large, response = self.count_queries('/api/forum/posts/?page_size=12')
+            self.assertEqual(len(response.data['results']), 12)
+            self.assertEqual(small, large)
+
+    def test_detail_keeps_full_content(self):
+        _, response = self.count_queries(f'/api/forum/posts/{self.favorited.id}/')
+        self.assertEqual(response.data['content'], self.favorited.content)
+        self.assertEqual(len(response.data['images']), 2)
+        self.assertEqual(len(response.data['replies']), 3)
+
+
+def reply_depth(replies):
+    """回复树的层数"""
+    return 1 + max((reply_depth(reply['children']) for reply in replies), default=0) if replies else 0
+
+
+def count_replies(replies):
+    return sum(1 + count_replies(reply['children']) for reply in replies)
+
+
+class ReplyTreeTests(ForumTestCase):
+    """回复树一次查询加载，层级和数量按参数截断"""
+
+    def replies(self, post, query=''):
+        response = self.client.get(f'/api/forum/posts/{post.id}/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data['replies']
+
+    def test_detail_returns_full_tree(self):
+        post = self.create_post(chain=5, flat=25)
+        replies = self.replies(post)
+        self.assertEqual(reply_depth(replies), 5)
+        self.assertEqual(count_replies(replies), 30)
+
+    def test_depth_limit(self):
+        post = self.create_post(chain=5)
+        replies = self.replies(post, '?reply_depth=2')
+        self.assertEqual(reply_depth(replies), 2)
+        self.assertEqual(replies[0]['children'][0]['children'], [])
+        self.assertEqual(self.replies(post, '?reply_depth=0'), [])
+
+    def test_reply_count_limit(self):
+        post = self.create_post(chain=2, flat=10)
+        replies = self.replies(post, '?max_replies=3')
+        # 按发布时间取最早的 3 条：两层回复链和第一条顶级回复
+        self.assertEqual(count_replies(replies), 3)
+        self.assertEqual(reply_depth(replies), 2)
+
+    def test_detail_queries_independent_of_reply_count(self):
+        small, _ = self.count_queries(f'/api/forum/posts/{self.create_post(chain=1).id}/')
+        large, _ = self.count_queries(f'/api/forum/posts/{self.create_post(chain=5, flat=30).id}/')
+        self.assertEqual(small, large)
+
+
+class PostFavoriteReplyTreeTests(ForumTestCase):
+    """收藏列表为整页帖子一次加载回复树，默认限制层级和数量"""
+
+    def favorite(self, *posts):
+        for post in posts:
+            PostFavorite.objects.create(user=self.reader, post=post)
+
+    def test_list_default_limits(self):
+        self.client.force_authenticate(self.reader)
+        self.favorite(self.create_post(chain=5, flat=30))
+        _, response = self.count_queries('/api/post-favorites/')
+        replies = response.data['results'][0]['post']['replies']
+        # 取最早的 20 条（5 层回复链 + 15 条顶级回复），第 4、5 层超出层级限制不返回
+        self.assertEqual(reply_depth(replies), 3)
+        self.assertEqual(count_replies(replies), 18)
+
+    def test_list_queries_independent_of_page_size(self):
+        self.client.force_authenticate(self.reader)
+        self.favorite(*(self.create_post(chain=3, flat=index) for index in range(6)))
+        small, _ = self.count_queries('/api/post-favorites/?page_size=1')
+        large, response = self.count_queries('/api/post-favorites/?page_size=6')
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(small, large)
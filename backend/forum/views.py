@@ -1,10 +1,18 @@
 from rest_framework import viewsets
 from rest_framework import filters
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.apps import apps
+from django.db.models import (
+    BooleanField, Count, Exists, IntegerField, OuterRef, Prefetch, Q, Subquery, Value
+)
+from django.db.models.functions import Coalesce, Length, Substr
 from .models import Tag, Post, Image, Reply
-from .serializers import TagSerializer, PostSerializer, ImageSerializer, ReplySerializer
+from .serializers import (
+    TagSerializer, PostSerializer, PostListSerializer, ImageSerializer, ReplySerializer, POST_EXCERPT_LENGTH
+)
 from .pagination import CustomPageNumberPagination
+from .replies import attach_reply_children, load_reply_trees
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
 
 class TagViewSet(viewsets.ModelViewSet):
@@ -21,7 +29,79 @@ class TagViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
 
-class PostViewSet(viewsets.ModelViewSet):
+def prefetch_post_relations(queryset, prefix='', images=True):
+    """
+    预加载 PostSerializer 用到的关联数据：作者、图片、标签、关联商品及其主图
+    prefix: 从其他模型出发时的路径前缀，如 'post__'
+    images: 列表接口只需首图（注解获取），传 False 不预加载全部图片
+    """
+    ProductSPU = apps.get_model('shopping', 'ProductSPU')
+    ProductImage = apps.get_model('shopping', 'ProductImage')
+    lookups = [
+        f'{prefix}tags',
+        Prefetch(f'{prefix}products', queryset=ProductSPU.objects.prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.filter(is_main=True), to_attr='main_images')
+        )),
+    ]
+    if images:
+        lookups.append(f'{prefix}images')
+    return queryset.select_related(f'{prefix}author').prefetch_related(*lookups)
+
+
+def count_subquery(queryset, field):
+    """统计每个帖子的关联行数，用相关子查询代替 JOIN + GROUP BY，多个计数互不放大"""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class PostReplyTreeMixin:
+    """
+    列表接口为整页帖子一次查询加载回复树，并限制层级和数量
+    客户端可通过 ?reply_depth=（0 表示不返回回复）和 ?max_replies= 调整，不超过 reply_limit_cap
+    详情接口默认返回完整回复树
+    """
+    reply_max_depth = 3  # 列表默认最多 3 层
+    reply_max_per_post = 20  # 列表默认每个帖子最多 20 条回复
+    reply_limit_cap = 100
+
+    def get_reply_limits(self):
+        if self.action == 'list':
+            max_depth, max_replies = self.reply_max_depth, self.reply_max_per_post
+        else:
+            max_depth, max_replies = None, None
+
+        params = self.request.query_params
+        depth_param = params.get('reply_depth', '')
+        if depth_param.isdigit():
+            max_depth = min(int(depth_param), self.reply_limit_cap)
+        replies_param = params.get('max_replies', '')
+        if replies_param.isdigit():
+            max_replies = min(int(replies_param), self.reply_limit_cap)
+        return max_depth, max_replies
+
+    def get_reply_posts(self, page):
+        """从分页结果中取出帖子"""
+        return page
+
+    def should_load_reply_trees(self):
+        return True
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.should_load_reply_trees():
+            max_depth, max_replies = self.get_reply_limits()
+            post_ids = [post.id for post in self.get_reply_posts(page)]
+            self.reply_trees = load_reply_trees(post_ids, max_depth=max_depth, max_replies=max_replies)
+        return page
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['reply_max_depth'], context['reply_max_replies'] = self.get_reply_limits()
+        context['reply_trees'] = getattr(self, 'reply_trees', None)
+        return context
+
+
+class PostViewSet(PostReplyTreeMixin, viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -31,7 +111,10 @@ class PostViewSet(viewsets.ModelViewSet):
     ordering = ['-updated_at']  # 默认按更新时间倒序
 
     def get_queryset(self):
-        queryset = Post.objects.all()
+        if self.action == 'list':
+            queryset = self.annotate_list_fields(Post.objects.all())
+        else:
+            queryset = prefetch_post_relations(Post.objects.all())
         
         # 按作者过滤
         author_id = self.request.query_params.get('author', None)
@@ -55,6 +138,38 @@ class PostViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def get_serializer_class(self):
+        # 列表返回精简表示，完整内容、图片和回复只在详情中返回
+        if self.action == 'list':
+            return PostListSerializer
+        return PostSerializer
+
+    def should_load_reply_trees(self):
+        return self.action != 'list'
+
+    def annotate_list_fields(self, queryset):
+        """
+        为列表注解摘要、首图、回复数、收藏数、图片数和当前用户是否收藏
+        不加载完整 content，全部在一条 SQL 中完成
+        """
+        PostFavorite = apps.get_model('user', 'PostFavorite')
+        first_image = Image.objects.filter(posts=OuterRef('pk')).order_by('id').values('file')[:1]
+        queryset = prefetch_post_relations(queryset, images=False).defer('content').annotate(
+            excerpt=Substr('content', 1, POST_EXCERPT_LENGTH),
+            content_length=Length('content'),
+            first_image_file=Subquery(first_image),
+            image_count=count_subquery(Post.images.through.objects.all(), 'post'),
+            reply_count=count_subquery(Reply.objects.all(), 'post'),
+            favorite_count=count_subquery(PostFavorite.objects.all(), 'post'),
+        )
+
+        user = self.request.user
+        if user.is_authenticated:
+            is_favorited = Exists(PostFavorite.objects.filter(user=user, post=OuterRef('pk')))
+        else:
+            is_favorited = Value(False, output_field=BooleanField())
+        return queryset.annotate(is_favorited=is_favorited)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -72,7 +187,7 @@ class ReplyViewSet(viewsets.ModelViewSet):
     filterset_fields = ['post', 'author', 'parent']
 
     def get_queryset(self):
-        queryset = Reply.objects.all()
+        queryset = Reply.objects.select_related('author')
         
         # 按帖子过滤
         post_id = self.request.query_params.get('post', None)
@@ -81,6 +196,12 @@ class ReplyViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # 一次查询组装所有回复的子回复，避免逐条递归查询
+        replies = attach_reply_children(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(replies, many=True)
+        return Response(serializer.data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
     
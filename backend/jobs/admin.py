@@ -0,0 +1,21 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'priority', 'run_at', 'attempts', 'locked_by', 'created_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name']
+    readonly_fields = ['attempts', 'locked_by', 'locked_at', 'last_error', 'created_at']
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        """把失败的任务重新排队，立即执行"""
+        updated = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_at=timezone.now(), last_error='',
+        )
+        self.message_user(request, f'已重新排队 {updated} 个任务')
+    retry_jobs.short_description = '重新执行失败的任务'
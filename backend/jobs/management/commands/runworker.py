@@ -0,0 +1,157 @@
+"""
+执行后台任务队列（jobs.Job）中的到期任务
+用法:
+    python manage.py runworker                    # 单进程持续运行
+    python manage.py runworker --processes 4      # 4 个子进程并行执行，主进程汇总监控数据
+    python manage.py runworker --once             # 执行完当前到期任务后退出（适合 cron）
+    python manage.py runworker --stats            # 输出队列状态后退出
+每隔 --stats-interval 秒输出一次监控数据：队列深度（排队 / 到期 / 执行中 / 失败）、最早到期任务的等待时间，
+以及这段时间内完成的任务数和等待、执行耗时的 p50 / p95。
+可在多台机器上同时运行，任务在领取时被锁定（SKIP LOCKED），不会被重复执行。
+收到 Ctrl+C / SIGTERM 后执行完当前任务再退出，已领取未执行的任务放回队列。
+"""
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jobs.queue import queue_stats
+from jobs.worker import work, worker_process
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = '执行后台任务队列中的到期任务，失败的任务按指数退避重试'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='worker 进程数')
+        parser.add_argument('--once', action='store_true', help='执行完当前到期任务后退出（仅单进程）')
+        parser.add_argument('--batch-size', type=int, default=10, help='每次领取的任务数')
+        parser.add_argument('--interval', type=float, default=1, help='没有到期任务时的等待秒数')
+        parser.add_argument('--stats-interval', type=float, default=60, help='输出监控数据的间隔秒数，0 不输出')
+        parser.add_argument('--stats', action='store_true', help='输出队列状态后退出')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.write_stats(queue_stats())
+            return
+        if options['processes'] < 1:
+            raise CommandError('--processes 至少为 1')
+        if options['once'] and options['processes'] > 1:
+            raise CommandError('--once 只能在单进程下使用')
+
+        self.verbosity = options['verbosity']
+        self.stats_interval = options['stats_interval']
+        self.results = []
+        self.last_report = time.monotonic()
+
+        if options['processes'] == 1:
+            self.run_single(options)
+        else:
+            self.run_pool(options)
+        if self.results or self.stats_interval:
+            self.report()
+
+    # ==================== 运行方式 ====================
+
+    def run_single(self, options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        def record(result):
+            self.record((result.job.id, result.job.name, result.job.attempts, result.ok, result.error,
+                         result.wait, result.duration))
+
+        work(
+            stop=stop, once=options['once'], batch_size=options['batch_size'], interval=options['interval'],
+            on_result=record, on_tick=self.maybe_report,
+        )
+
+    def run_pool(self, options):
+        context = multiprocessing.get_context()
+        stop = context.Event()
+        results = context.Queue()
+        args = (stop, results, options['batch_size'], options['interval'])
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+
+        # 子进程不能共用主进程的数据库连接
+        connections.close_all()
+        processes = [context.Process(target=worker_process, args=args) for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+        self.stdout.write(f'已启动 {len(processes)} 个 worker 进程')
+
+        try:
+            while not stop.is_set():
+                self.drain(results, timeout=1)
+                self.maybe_report()
+                for index, process in enumerate(processes):
+                    if not process.is_alive() and not stop.is_set():
+                        self.stderr.write(self.style.WARNING(f'worker 进程 {process.pid} 已退出（{process.exitcode}），重新启动'))
+                        processes[index] = context.Process(target=worker_process, args=args)
+                        processes[index].start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            self.stdout.write('正在等待 worker 执行完当前任务…')
+            # 等待期间继续读取结果，避免子进程写队列时阻塞
+            while any(process.is_alive() for process in processes):
+                self.drain(results, timeout=0.5)
+            for process in processes:
+                process.join()
+            self.drain(results, timeout=0)
+
+    def drain(self, results, timeout):
+        try:
+            item = results.get(timeout=timeout) if timeout else results.get_nowait()
+            while True:
+                self.record(item)
+                item = results.get_nowait()
+        except queue.Empty:
+            pass
+
+    # ==================== 输出 ====================
+
+    def record(self, item):
+        job_id, name, attempts, ok, error, wait, duration = item
+        self.results.append((ok, wait, duration))
+        if not ok:
+            self.stderr.write(self.style.WARNING(f'[失败] {name} #{job_id}（第 {attempts} 次）: {error}'))
+        elif self.verbosity >= 2:
+            self.stdout.write(f'[完成] {name} #{job_id} 等待 {wait:.2f}s 执行 {duration:.3f}s')
+
+    def maybe_report(self):
+        if self.stats_interval and time.monotonic() - self.last_report >= self.stats_interval:
+            self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.last_report
+        self.write_stats(queue_stats())
+        if self.results:
+            waits = sorted(wait for _, wait, _ in self.results)
+            durations = sorted(duration for _, _, duration in self.results)
+            succeeded = sum(1 for ok, _, _ in self.results if ok)
+            self.stdout.write(
+                f'最近 {elapsed:.0f}s: 完成 {succeeded} 个，失败 {len(self.results) - succeeded} 个；'
+                f'等待 p50 {_percentile(waits, 0.5):.2f}s / p95 {_percentile(waits, 0.95):.2f}s，'
+                f'执行 p50 {_percentile(durations, 0.5) * 1000:.1f}ms / p95 {_percentile(durations, 0.95) * 1000:.1f}ms'
+            )
+        self.results = []
+        self.last_report = time.monotonic()
+
+    def write_stats(self, stats):
+        self.stdout.write(
+            f'队列: 排队 {stats["queued"]}（已到期 {stats["due"]}，最早到期已等待 {stats["lag"]:.1f}s），'
+            f'执行中 {stats["running"]}，失败 {stats["failed"]}'
+        )
+        for name, counts in sorted(stats['by_name'].items()):
+            self.stdout.write(f'  {name}: 排队 {counts["queued"]}，执行中 {counts["running"]}，失败 {counts["failed"]}')
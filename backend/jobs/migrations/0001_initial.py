@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='任务名')),
+                ('payload', models.JSONField(default=dict, verbose_name='参数')),
+                ('status', models.CharField(choices=[('queued', '排队中'), ('running', '执行中'), ('failed', '失败')], default='queued', max_length=20, verbose_name='状态')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='优先级')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='计划执行时间')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='执行次数')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='最大执行次数')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='执行的 worker')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='领取时间')),
+                ('last_error', models.TextField(blank=True, verbose_name='最近一次错误')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '后台任务',
+                'verbose_name_plural': '后台任务',
+                'ordering': ['-priority', 'run_at', 'id'],
+                'indexes': [models.Index(fields=['status', '-priority', 'run_at'], name='jobs_job_status_66c96c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    后台任务（见 jobs/queue.py）
+    由 runworker 命令领取执行，成功后删除；失败按指数退避重试，超过最大次数保留为 failed
+    """
+    STATUS_CHOICES = [
+        ('queued', '排队中'),
+        ('running', '执行中'),
+        ('failed', '失败'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name="任务名")
+    payload = models.JSONField(default=dict, verbose_name="参数")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name="状态")
+    priority = models.SmallIntegerField(default=0, verbose_name="优先级")  # 越大越先执行
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="计划执行时间")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="执行次数")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="最大执行次数")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="执行的 worker")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="领取时间")
+    last_error = models.TextField(blank=True, verbose_name="最近一次错误")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "后台任务"
+        verbose_name_plural = "后台任务"
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at']),  # worker 领取到期任务
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id}"
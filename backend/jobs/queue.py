@@ -0,0 +1,197 @@
+"""
+数据库任务队列
+- task: 注册任务处理函数（写在各应用的 tasks.py 中，启动时由 JobsConfig 自动导入）
+- enqueue: 写入一条 Job；在事务中调用时随事务一起提交，事务回滚时任务也不会出现，
+  worker 只能看到已提交的任务，效果等同于 transaction.on_commit 后入队，且提交后进程退出也不会丢任务
+- manage.py runworker 循环调用 claim_jobs / run_job：
+  用 SELECT ... FOR UPDATE SKIP LOCKED 领取到期任务并标记为 running（短事务，多个 worker 互不阻塞），再逐个执行；
+  处理函数和删除任务行在同一个事务中提交，失败时回滚并按指数退避重试，超过最大次数标记为 failed；
+  worker 异常退出后，running 超过 JOB_LOCK_TIMEOUT 的任务重新排队
+- 任务最终失败时调用注册时传入的 on_failure，用于同步业务记录的状态（如标记为处理失败）
+处理函数的参数必须能序列化为 JSON；涉及文件等数据库之外的操作时需要允许重复执行
+"""
+import os
+import socket
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 30  # 秒，第 n 次失败后等待 30 * 2^(n-1) 秒
+RETRY_MAX_DELAY = 60 * 60
+
+# 执行结果；wait: 从计划执行时间到开始执行的秒数，duration: 执行耗时（秒）
+JobResult = namedtuple('JobResult', ['job', 'ok', 'error', 'wait', 'duration'])
+
+_registry = {}
+_failure_handlers = {}
+
+
+class JobLockLost(Exception):
+    """任务执行超时后已被重新排队，本次结果作废"""
+
+
+def task(name, priority=0, max_attempts=MAX_ATTEMPTS, on_failure=None):
+    """
+    注册任务处理函数，被装饰的函数增加 enqueue(**kwargs) 方法：
+        @task('shopping.restore_orders_stock', priority=10)
+        def restore_orders_stock(order_ids): ...
+
+        restore_orders_stock.enqueue(order_ids=[1, 2])
+    on_failure: 任务超过最大次数标记为 failed 后以 on_failure(error, **kwargs) 调用（单独的事务）
+    """
+    def decorator(func):
+        registered = _registry.get(name)
+        if registered is not None and registered.__qualname__ != func.__qualname__:
+            raise ValueError(f'任务名重复: {name}')
+        _registry[name] = func
+        if on_failure is not None:
+            _failure_handlers[name] = on_failure
+
+        def enqueue_task(run_at=None, delay=None, **kwargs):
+            return enqueue(name, kwargs, priority=priority, run_at=run_at, delay=delay, max_attempts=max_attempts)
+
+        func.enqueue = enqueue_task
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, priority=0, run_at=None, delay=None, max_attempts=MAX_ATTEMPTS):
+    """
+    添加任务，返回 Job
+    run_at: 计划执行时间，默认立即；delay: 在 run_at 基础上延后的秒数
+    """
+    if name not in _registry:
+        raise ValueError(f'未注册的任务: {name}')
+    run_at = run_at or timezone.now()
+    if delay:
+        run_at += timedelta(seconds=delay)
+    return Job.objects.create(
+        name=name, payload=payload or {}, priority=priority, run_at=run_at, max_attempts=max_attempts,
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def worker_name():
+    """worker 标识，写入 locked_by"""
+    return f'{socket.gethostname()}:{os.getpid()}'[:100]
+
+
+# ==================== 领取与执行 ====================
+
+def claim_jobs(worker, limit=10):
+    """领取最多 limit 个到期任务（按优先级、计划时间排序），标记为 running 后返回"""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='queued', run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # 带上 status 条件，不支持 SKIP LOCKED 的数据库上也不会重复领取
+        Job.objects.filter(id__in=ids, status='queued').update(
+            status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(id__in=ids, status='running', locked_by=worker, locked_at=now))
+
+
+def release_jobs(jobs, worker):
+    """把已领取但未执行的任务放回队列（worker 退出时调用）"""
+    return Job.objects.filter(id__in=[job.id for job in jobs], status='running', locked_by=worker).update(
+        status='queued', locked_by='', locked_at=None, attempts=F('attempts') - 1,
+    )
+
+
+def run_job(job, worker):
+    """执行一个已领取的任务，返回 JobResult"""
+    started = timezone.now()
+    clock = time.monotonic()
+    handler = _registry.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f'未注册的任务: {job.name}')
+        with transaction.atomic():
+            handler(**job.payload)
+            # 与处理结果在同一事务中删除任务；任务已被重新排队时回滚，避免重复生效
+            if not Job.objects.filter(pk=job.pk, status='running', locked_by=worker).delete()[0]:
+                raise JobLockLost(f'任务 {job.pk} 已被重新排队')
+    except Exception as exc:
+        error = f'{exc.__class__.__name__}: {exc}'
+        if not isinstance(exc, JobLockLost):
+            if handler is None or job.attempts >= job.max_attempts:
+                changes = {'status': 'failed'}
+            else:
+                changes = {'status': 'queued', 'run_at': timezone.now() + retry_delay(job.attempts)}
+            updated = Job.objects.filter(pk=job.pk, locked_by=worker).update(
+                locked_by='', locked_at=None, last_error=error, **changes,
+            )
+            if updated and changes['status'] == 'failed':
+                notify_failed(job, error)
+    else:
+        error = ''
+    return JobResult(job, not error, error, (started - job.run_at).total_seconds(), time.monotonic() - clock)
+
+
+def requeue_stale_jobs():
+    """
+    把 running 超过 JOB_LOCK_TIMEOUT 的任务重新排队（执行它的 worker 已退出或卡住），
+    已达到最大次数的标记为 failed，返回处理的任务数
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    stale = Job.objects.filter(status='running', locked_at__lt=cutoff)
+    failed = 0
+    for job in stale.filter(attempts__gte=F('max_attempts')):
+        # 逐个更新，只通知本次标记为 failed 的任务
+        if stale.filter(pk=job.pk).update(status='failed', locked_by='', locked_at=None, last_error='执行超时'):
+            failed += 1
+            notify_failed(job, '执行超时')
+    requeued = stale.update(status='queued', locked_by='', locked_at=None, last_error='执行超时，重新排队')
+    return failed + requeued
+
+
+def notify_failed(job, error):
+    """调用任务的 on_failure；回调本身出错时把错误追加到任务的 last_error，不影响 worker"""
+    handler = _failure_handlers.get(job.name)
+    if handler is None:
+        return
+    try:
+        with transaction.atomic():
+            handler(error, **job.payload)
+    except Exception as exc:
+        Job.objects.filter(pk=job.pk).update(
+            last_error=f'{error}\non_failure 出错 {exc.__class__.__name__}: {exc}',
+        )
+
+
+# ==================== 监控 ====================
+
+def queue_stats():
+    """
+    队列状态：
+    {queued: 排队数, due: 已到期数, running: 执行中, failed: 失败数, lag: 最早到期任务已等待的秒数,
+     by_name: {任务名: {queued, running, failed}}}
+    """
+    now = timezone.now()
+    stats = {'queued': 0, 'due': 0, 'running': 0, 'failed': 0, 'lag': 0.0, 'by_name': {}}
+    for row in Job.objects.order_by().values('name', 'status').annotate(count=Count('id')):
+        stats[row['status']] += row['count']
+        counts = stats['by_name'].setdefault(row['name'], {'queued': 0, 'running': 0, 'failed': 0})
+        counts[row['status']] = row['count']
+    due = Job.objects.filter(status='queued', run_at__lte=now).aggregate(count=Count('id'), oldest=Min('run_at'))
+    stats['due'] = due['count']
+    if due['oldest'] is not None:
+        stats['lag'] = (now - due['oldest']).total_seconds()
+    return stats
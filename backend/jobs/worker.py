@@ -0,0 +1,71 @@
+"""
+runworker 的执行循环
+- work: 单个 worker 的领取 / 执行循环，runworker 单进程运行时直接调用
+- worker_process: 进程池中子进程的入口，执行结果放入队列交给主进程汇总
+本模块不在顶层导入模型，子进程以 spawn 方式启动时可以先初始化 Django
+"""
+import signal
+import time
+
+# 定期检查执行超时任务的间隔（秒）
+STALE_CHECK_INTERVAL = 60
+
+
+def work(stop=None, once=False, batch_size=10, interval=1.0, on_result=None, on_tick=None):
+    """
+    循环领取并执行到期任务，直到 stop 被设置
+    once: 没有到期任务时退出
+    on_result: 每个任务执行后以 JobResult 调用；on_tick: 每轮循环调用一次
+    """
+    from django.db import DatabaseError, close_old_connections
+
+    from .queue import claim_jobs, release_jobs, requeue_stale_jobs, run_job, worker_name
+
+    worker = worker_name()
+    last_stale_check = 0.0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        try:
+            if time.monotonic() - last_stale_check > STALE_CHECK_INTERVAL:
+                requeue_stale_jobs()
+                last_stale_check = time.monotonic()
+            jobs = claim_jobs(worker, batch_size)
+        except DatabaseError:
+            # 数据库暂时不可用（连接断开、锁等待超时等），稍后重试
+            jobs = None
+        for index, job in enumerate(jobs or []):
+            if stop is not None and stop.is_set():
+                release_jobs(jobs[index:], worker)
+                break
+            try:
+                result = run_job(job, worker)
+            except DatabaseError:
+                # 无法写回执行结果，任务保持 running，超时后重新排队
+                continue
+            if on_result is not None:
+                on_result(result)
+        if on_tick is not None:
+            on_tick()
+
+        if not jobs:
+            if once and jobs is not None:
+                return
+            if stop is not None:
+                stop.wait(interval)
+            else:
+                time.sleep(interval)
+
+
+def worker_process(stop, results, batch_size, interval):
+    """进程池子进程入口：Ctrl+C 由主进程统一处理，通过 stop 通知退出"""
+    import django
+
+    django.setup()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    def report(result):
+        results.put((result.job.id, result.job.name, result.job.attempts, result.ok, result.error,
+                     result.wait, result.duration))
+
+    work(stop=stop, batch_size=batch_size, interval=interval, on_result=report)
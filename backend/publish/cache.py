@@ -0,0 +1,97 @@
+"""
+publish 公开列表接口的响应缓存
+艺术家、专辑、音乐、视频、公告列表均为匿名访问且很少变化，
+序列化结果按 "接口 + 查询参数 + 站点地址" 缓存，并附带 ETag / Last-Modified 支持条件请求（304）。
+Artist / Album / Music / Video / Notice 以及专辑关联商品变更时，由信号递增版本号使全部缓存失效（见 models.py）。
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+PUBLISH_CACHE_VERSION_KEY = 'publish:list_cache:version'
+
+
+def _new_version():
+    # 版本号键被缓存淘汰后以当前时间重新开始，不会命中旧版本的缓存
+    return time.time_ns()
+
+
+def _current_version():
+    version = cache.get(PUBLISH_CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(PUBLISH_CACHE_VERSION_KEY, _new_version(), None)
+        version = cache.get(PUBLISH_CACHE_VERSION_KEY)
+    return version
+
+
+def invalidate_publish_cache():
+    """使所有 publish 列表缓存失效，在事务提交后执行"""
+    def bump():
+        try:
+            cache.incr(PUBLISH_CACHE_VERSION_KEY)
+        except ValueError:
+            cache.set(PUBLISH_CACHE_VERSION_KEY, _new_version(), None)
+
+    transaction.on_commit(bump)
+
+
+def _cache_key(name, request):
+    # 图片等字段包含完整 URL，站点地址不同时需分别缓存
+    params = sorted(request.GET.lists())
+    raw = json.dumps([request.build_absolute_uri('/'), params], ensure_ascii=False)
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'publish:{name}:{_current_version()}:{digest}'
+
+
+def _last_modified(models):
+    """取相关模型 updated_at 的最大值，作为 Last-Modified"""
+    timestamps = [
+        model.objects.aggregate(last_modified=Max('updated_at'))['last_modified']
+        for model in models
+    ]
+    timestamps = [timestamp for timestamp in timestamps if timestamp]
+    return max(timestamps).timestamp() if timestamps else None
+
+
+def cached_list_response(name, models):
+    """
+    缓存列表接口的响应数据，放在 @api_view 之后使用
+    name: 缓存键前缀
+    models: 响应内容依赖的模型，Last-Modified 取它们 updated_at 的最大值
+    删除数据不会推进 Last-Modified，但会改变 ETag；客户端同时携带两者时以 If-None-Match 为准。
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = _cache_key(name, request)
+            cached = cache.get(key)
+            if cached is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                raw = json.dumps(response.data, sort_keys=True, ensure_ascii=False, default=str)
+                etag = quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+                cached = (response.data, etag, _last_modified(models))
+                cache.set(key, cached, settings.PUBLISH_CACHE_TIMEOUT)
+
+            data, etag, last_modified = cached
+            last_modified = int(last_modified) if last_modified is not None else None
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = Response(data, status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,51 @@
+"""
+把音乐 / 视频文件从 MEDIA_ROOT 移到 PROTECTED_MEDIA_ROOT
+升级后执行一次：旧文件在 MEDIA_ROOT 下可以通过 MEDIA_URL 直接下载，绕过购买检查。
+文件相对路径不变，不需要修改数据库；已移动的文件会跳过，可重复执行。
+用法:
+    python manage.py move_protected_media
+    python manage.py move_protected_media --dry-run      # 只列出需要移动的文件
+"""
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from publish.cache import invalidate_publish_cache
+from publish.models import Music, Video
+from publish.storage import protected_storage
+
+
+class Command(BaseCommand):
+    help = '把音乐 / 视频文件移出公开的 MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只列出需要移动的文件')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Music, Video):
+            names.update(model.objects.exclude(file='').exclude(file=None).values_list('file', flat=True))
+
+        moved = missing = 0
+        for name in sorted(names):
+            source = os.path.join(settings.MEDIA_ROOT, name)
+            target = protected_storage.path(name)
+            if not os.path.exists(source):
+                if not os.path.exists(target):
+                    missing += 1
+                    self.stderr.write(f'文件不存在: {name}')
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+                moved += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(source, target)
+            moved += 1
+
+        # 缓存的列表可能包含旧的文件地址
+        invalidate_publish_cache()
+        action = '需要移动' if options['dry_run'] else '已移动'
+        self.stdout.write(self.style.SUCCESS(f'{action} {moved} 个文件，缺失 {missing} 个'))
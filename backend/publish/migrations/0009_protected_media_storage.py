@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:31
+
+import publish.models
+import publish.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publish', '0008_album_product'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='music',
+            name='file',
+            field=models.FileField(blank=True, storage=publish.storage.ProtectedMediaStorage(), upload_to=publish.models.music_upload_path, verbose_name='音乐文件'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=publish.storage.ProtectedMediaStorage(), upload_to='videos/', verbose_name='视频文件'),
+        ),
+    ]
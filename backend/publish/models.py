@@ -1,4 +1,8 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .storage import protected_storage
 
 # 动态图片上传路径函数
 def album_upload_path(instance, filename):
@@ -63,7 +67,7 @@ class Music(models.Model):
     album = models.ForeignKey(Album, on_delete=models.SET_NULL, related_name='tracks', blank=True, null=True, verbose_name="所属专辑")
     track_number = models.PositiveIntegerField(blank=True, null=True, verbose_name="轨道号")
     duration = models.DurationField(blank=True, null=True, verbose_name="时长")
-    file = models.FileField(upload_to=music_upload_path, blank=True, verbose_name="音乐文件")
+    file = models.FileField(upload_to=music_upload_path, storage=protected_storage, blank=True, verbose_name="音乐文件")
     is_active = models.BooleanField(default=True, verbose_name="是否发布")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
@@ -91,7 +95,7 @@ class Video(models.Model):
     title = models.CharField(max_length=200, verbose_name="视频标题")
     description = models.TextField(blank=True, verbose_name="描述")
     video_type = models.CharField(max_length=20, choices=[('live', 'Live'), ('interview', 'Interview'), ('documentary', 'Documentary')], default='live', verbose_name="视频类型")
-    file = models.FileField(upload_to='videos/', blank=True, null=True, verbose_name="视频文件")
+    file = models.FileField(upload_to='videos/', storage=protected_storage, blank=True, null=True, verbose_name="视频文件")
     bilibili_url = models.URLField(blank=True, null=True, verbose_name="B站外链")
     thumbnail = models.ImageField(upload_to='videos/thumbnails/', blank=True, verbose_name="缩略图")
     duration = models.DurationField(blank=True, null=True, verbose_name="时长")
@@ -126,4 +130,19 @@ class Notice(models.Model):
         ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+
+# ==================== 列表缓存失效 ====================
+# 公开列表的内容（含专辑关联商品的名称和图片）变更时，使 publish 响应缓存失效
+
+@receiver([post_save, post_delete], sender=Artist)
+@receiver([post_save, post_delete], sender=Album)
+@receiver([post_save, post_delete], sender=Music)
+@receiver([post_save, post_delete], sender=Video)
+@receiver([post_save, post_delete], sender=Notice)
+@receiver([post_save, post_delete], sender='shopping.ProductSPU')
+@receiver([post_save, post_delete], sender='shopping.ProductImage')
+def invalidate_publish_list_cache(sender, **kwargs):
+    from .cache import invalidate_publish_cache
+    invalidate_publish_cache()
@@ -0,0 +1,24 @@
+from rest_framework.pagination import PageNumberPagination
+
+from shopping.pagination import KeysetPaginationMixin
+
+
+class PublishPagination(KeysetPaginationMixin, PageNumberPagination):
+    """
+    音乐 / 专辑列表分页类，默认每页50条
+    只有请求带 page、page_size 或 pagination=cursor 参数时才分页，
+    否则保持原来的完整数组响应，兼容现有前端
+    游标分页按 id 排序（专辑和音乐没有 created_at，track_number 等字段可能为空）
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_ordering = ('id',)
+
+    def is_requested(self, request):
+        params = request.query_params
+        return (
+            self.page_query_param in params
+            or self.page_size_query_param in params
+            or self.is_cursor_mode(request)
+        )
@@ -1,12 +1,14 @@
+from django.urls import reverse
 from rest_framework import serializers
 from .models import Artist, Album, Music, Video, Notice
+from backend.thumbnails import DerivativeImageModelSerializer, image_url, requested_variant
 
-class ArtistSerializer(serializers.ModelSerializer):
+class ArtistSerializer(DerivativeImageModelSerializer):
     class Meta:
         model = Artist
         fields = '__all__'
 
-class AlbumSerializer(serializers.ModelSerializer):
+class AlbumSerializer(DerivativeImageModelSerializer):
     artist = ArtistSerializer(read_only=True)
     product_info = serializers.SerializerMethodField()
     
@@ -16,31 +18,70 @@ class AlbumSerializer(serializers.ModelSerializer):
     
     def get_product_info(self, obj):
         if obj.product:
-            # 获取主图
-            main_image = obj.product.images.filter(is_main=True).first()
-            if not main_image:
-                # 如果没有主图，获取第一张图片
-                main_image = obj.product.images.first()
+            # 获取主图，没有主图则取第一张图片（视图已预加载 product__images，不再逐个查询）
+            images = sorted(obj.product.images.all(), key=lambda image: image.id)
+            main_image = next((image for image in images if image.is_main), images[0] if images else None)
+            size, fmt = requested_variant(self.context.get('request'))
             
             return {
                 'id': obj.product.id,
                 'name': obj.product.name,
                 'description': obj.product.description,
-                'image': main_image.image.url if main_image else None,
+                # 保持相对路径，尺寸按 image_size 参数选择
+                'image': image_url(main_image.image, size=size, fmt=fmt) if main_image else None,
             }
         return None
 
+def stream_url(kind, media):
+    """
+    播放地址接口（stream-url，返回带签名凭证的地址），不返回文件地址：
+    关联商品的音乐需要购买后才能播放，列表匿名访问且会被缓存
+    """
+    return reverse(f'{kind}-stream-url', kwargs={'media_id': media.id}) if media.file else None
+
+
 class MusicSerializer(serializers.ModelSerializer):
     artist = ArtistSerializer(read_only=True)
     album = AlbumSerializer(read_only=True)
+    stream_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Music
+        exclude = ['file']
+
+    def get_stream_url(self, obj):
+        return stream_url('music', obj)
+
+class AlbumListSerializer(DerivativeImageModelSerializer):
+    """分页列表中的专辑，artist 只返回 id，艺术家在响应的 artists 中单独返回一次"""
+    product_info = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Album
         fields = '__all__'
 
-class VideoSerializer(serializers.ModelSerializer):
+    get_product_info = AlbumSerializer.get_product_info
+
+
+class MusicListSerializer(serializers.ModelSerializer):
+    """分页列表中的音乐，artist / album 只返回 id，在响应的 artists / albums 中单独返回一次"""
+    stream_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Music
+        exclude = ['file']
+
+    get_stream_url = MusicSerializer.get_stream_url
+
+class VideoSerializer(DerivativeImageModelSerializer):
+    stream_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Video
-        fields = '__all__'
+        exclude = ['file']
+
+    def get_stream_url(self, obj):
+        return stream_url('video', obj)
 
 class NoticeSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField()
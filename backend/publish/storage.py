@@ -0,0 +1,35 @@
+"""
+音乐 / 视频文件的存储
+文件保存在 PROTECTED_MEDIA_ROOT（不在 MEDIA_ROOT 下），不能通过 MEDIA_URL 直接下载，
+只能经 stream 接口检查权限后播放（见 streaming.py）。
+文件 URL 为 Web 服务器的内部路径 MEDIA_SENDFILE_URL_PREFIX（Nginx internal location），外部无法直接访问。
+"""
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+@deconstructible(path='publish.storage.ProtectedMediaStorage')
+class ProtectedMediaStorage(FileSystemStorage):
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.PROTECTED_MEDIA_ROOT)
+
+    @cached_property
+    def base_url(self):
+        base_url = self._value_or_setting(self._base_url, settings.MEDIA_SENDFILE_URL_PREFIX)
+        return base_url if base_url.endswith('/') else f'{base_url}/'
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        if setting == 'PROTECTED_MEDIA_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+        elif setting == 'MEDIA_SENDFILE_URL_PREFIX':
+            self.__dict__.pop('base_url', None)
+        elif setting not in ('MEDIA_ROOT', 'MEDIA_URL'):
+            super()._clear_cached_properties(setting, **kwargs)
+
+
+protected_storage = ProtectedMediaStorage()
@@ -0,0 +1,136 @@
+"""
+音乐 / 视频文件的流式传输
+- 支持 HTTP Range（206 Partial Content），播放器可以拖动进度
+- 按固定大小分块读取文件，内存占用与文件大小无关
+- 配置 MEDIA_SENDFILE_BACKEND 后交给 Web 服务器发送（Nginx X-Accel-Redirect / Apache X-Sendfile），
+  Django 只负责权限检查；文件不在 MEDIA_ROOT 下，只能经这里访问（见 storage.py）
+- 关联了商品的专辑中的音乐需要购买（UserProduct）后才能播放
+<audio> / <video> 标签无法携带 JWT 请求头，可先调用 stream-url 接口获取带签名的临时地址。
+"""
+import mimetypes
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_TOKEN_SALT = 'publish.media_stream'
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Range 超出文件范围"""
+
+
+def parse_range(header, size):
+    """
+    解析单段 Range 请求头，返回 (start, end)（包含 end），不需要分段时返回 None
+    多段 Range（bytes=0-1,5-6）按规范可以忽略，返回完整文件
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500：最后 500 字节
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+def iter_file(file, start, length, chunk_size=STREAM_CHUNK_SIZE):
+    """从 start 开始分块读取 length 字节，读完后关闭文件"""
+    try:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def make_stream_token(kind, object_id, user_id):
+    """生成带签名的临时播放凭证"""
+    return signing.dumps({'kind': kind, 'id': object_id, 'user': user_id}, salt=STREAM_TOKEN_SALT, compress=True)
+
+
+def read_stream_token(token, kind, object_id):
+    """校验播放凭证，返回 user_id；无效或过期返回 None"""
+    try:
+        payload = signing.loads(token, salt=STREAM_TOKEN_SALT, max_age=settings.MEDIA_STREAM_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if payload.get('kind') != kind or payload.get('id') != object_id:
+        return None
+    return payload.get('user')
+
+
+def _sendfile_response(field_file, content_type):
+    """交给 Web 服务器发送文件，Range 由服务器处理"""
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    response = HttpResponse(content_type=content_type)
+    if backend == 'x-accel-redirect':
+        # 受保护存储的 URL 即 Nginx 的内部路径
+        response['X-Accel-Redirect'] = field_file.url
+    else:
+        response['X-Sendfile'] = field_file.path
+    return response
+
+
+def stream_file_response(request, field_file):
+    """
+    返回文件的流式响应
+    field_file: Music.file / Video.file
+    """
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    if settings.MEDIA_SENDFILE_BACKEND:
+        return _sendfile_response(field_file, content_type)
+
+    storage = field_file.storage
+    size = field_file.size
+    try:
+        last_modified = int(storage.get_modified_time(field_file.name).timestamp())
+    except (NotImplementedError, OSError):
+        last_modified = None
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # If-Range 与当前文件不一致时忽略 Range，返回完整文件
+    if range_header and (not if_range or parse_http_date_safe(if_range) == last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(
+        iter_file(storage.open(field_file.name, 'rb'), start, length),
+        status=206 if byte_range else 200,
+        content_type=content_type,
+    )
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -1,3 +1,171 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from urllib.parse import quote
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from shopping.models import Category, ProductImage, ProductSKU, ProductSPU
+from user.models import User, UserProduct
+from .models import Album, Artist, Music
+
+AUDIO = bytes(range(256)) * 4  # 1024 字节
+
+
+class ProtectedMediaTestCase(TestCase):
+    """音乐文件写入临时的 PROTECTED_MEDIA_ROOT"""
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(PROTECTED_MEDIA_ROOT=self.media_root, MEDIA_SENDFILE_BACKEND=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.client = APIClient()
+        self.artist = Artist.objects.create(name='歌手')
+        self.spu = ProductSPU.objects.create(name='数字专辑', category=Category.objects.create(name='音乐'))
+        self.sku = ProductSKU.objects.create(spu=self.spu, title='数字版', price=10)
+        self.album = Album.objects.create(name='专辑', artist=self.artist, product=self.spu)
+        self.track = self.create_track(self.album)
+
+    def create_track(self, album, title='歌曲'):
+        track = Music.objects.create(title=title, artist=self.artist, album=album)
+        track.file.save('track.mp3', ContentFile(AUDIO))
+        return track
+
+    def stream(self, track, **headers):
+        return self.client.get(f'/api/music/{track.id}/stream/', **headers)
+
+
+class MusicStreamTests(ProtectedMediaTestCase):
+    """Range 流式播放和购买检查"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='owner', password='x')
+        UserProduct.objects.create(user=self.owner, sku=self.sku)
+
+    def test_full_file(self):
+        self.client.force_authenticate(self.owner)
+        response = self.stream(self.track)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), AUDIO)
+
+    def test_partial_content(self):
+        self.client.force_authenticate(self.owner)
+        response = self.stream(self.track, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(AUDIO)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), AUDIO[100:200])
+
+    def test_suffix_and_open_ended_ranges(self):
+        self.client.force_authenticate(self.owner)
+        response = self.stream(self.track, HTTP_RANGE='bytes=-24')
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1023/{len(AUDIO)}')
+        self.assertEqual(b''.join(response.streaming_content), AUDIO[-24:])
+
+        response = self.stream(self.track, HTTP_RANGE='bytes=1000-5000')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1023/{len(AUDIO)}')
+
+    def test_unsatisfiable_range(self):
+        self.client.force_authenticate(self.owner)
+        response = self.stream(self.track, HTTP_RANGE=f'bytes={len(AUDIO)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(AUDIO)}')
+
+    def test_non_owner_forbidden(self):
+        self.client.force_authenticate(User.objects.create_user(username='guest', password='x'))
+        self.assertEqual(self.stream(self.track, HTTP_RANGE='bytes=0-9').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.stream(self.track).status_code, 403)
+
+    def test_signed_url(self):
+        self.client.force_authenticate(self.owner)
+        url = self.client.get(f'/api/music/{self.track.id}/stream-url/').data['url']
+        self.client.force_authenticate(None)
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), AUDIO[:10])
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='x-accel-redirect', MEDIA_SENDFILE_URL_PREFIX='/protected-media/')
+    def test_x_accel_redirect_uses_internal_location(self):
+        self.client.force_authenticate(self.owner)
+        response = self.stream(self.track)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{quote(self.track.file.name)}')
+
+
+class ProtectedMediaListTests(ProtectedMediaTestCase):
+    """公开列表不包含文件地址，文件不在 MEDIA_ROOT 下"""
+
+    def test_list_exposes_stream_url_only(self):
+        for url in ('/api/music/', '/api/music/?page=1'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            results = response.data['results'] if 'results' in response.data else response.data
+            self.assertNotIn('file', results[0])
+            self.assertEqual(results[0]['stream_url'], f'/api/music/{self.track.id}/stream-url/')
+            self.assertNotIn('track.mp3', response.content.decode())
+
+    def test_file_stored_outside_media_root(self):
+        self.assertTrue(self.track.file.path.startswith(self.media_root))
+
+
+class PublishListQueryCountTests(TestCase):
+    """音乐 / 专辑列表的查询数与条数无关，分页模式下艺术家、专辑只序列化一次"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='音乐')
+        for index in range(4):
+            artist = Artist.objects.create(name=f'歌手{index}')
+            spu = ProductSPU.objects.create(name=f'专辑商品{index}', category=category)
+            ProductImage.objects.create(spu=spu, image=f'products/{spu.id}.jpg', is_main=True)
+            for number in range(2):
+                album = Album.objects.create(name=f'专辑{index}-{number}', artist=artist, product=spu)
+                for track in range(5):
+                    Music.objects.create(title=f'歌曲{track}', artist=artist, album=album, track_number=track)
+
+    def count_queries(self, url):
+        # 每次清空响应缓存，统计实际生成响应的查询
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def assert_constant(self, small_url, large_url):
+        small, _ = self.count_queries(small_url)
+        large, response = self.count_queries(large_url)
+        self.assertEqual(small, large)
+        return response
+
+    def test_music_pages(self):
+        response = self.assert_constant('/api/music/?page_size=2', '/api/music/?page_size=40')
+        self.assertEqual(len(response.data['results']), 40)
+        self.assertEqual(len(response.data['albums']), 8)
+        self.assertEqual(len(response.data['artists']), 4)
+        self.assertIsInstance(response.data['results'][0]['album'], int)
+
+    def test_music_cursor_pages(self):
+        self.assert_constant('/api/music/?pagination=cursor&page_size=2', '/api/music/?pagination=cursor&page_size=40')
+
+    def test_album_pages(self):
+        response = self.assert_constant('/api/albums/?page_size=2', '/api/albums/?page_size=8')
+        self.assertEqual(len(response.data['artists']), 4)
+        self.assertTrue(response.data['results'][0]['product_info']['image'].endswith('.jpg'))
+
+    def test_full_lists(self):
+        small, _ = self.count_queries('/api/music/?album=%d' % Album.objects.first().id)
+        large, response = self.count_queries('/api/music/')
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data), 40)
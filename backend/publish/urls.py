@@ -1,6 +1,7 @@
 from django.urls import path
 
 from .views import get_artist_list, get_album_list, get_music_list, get_video_list, get_notice_list
+from .views import stream_media, get_stream_url
 
 urlpatterns = [
 
@@ -9,4 +10,10 @@ urlpatterns = [
     path('music/', get_music_list, name='music-list'),
     path('videos/', get_video_list, name='video-list'),
     path('notices/', get_notice_list, name='notice-list'),
+
+    # 流式播放（支持 Range），stream-url 返回带签名凭证的播放地址
+    path('music/<int:media_id>/stream/', stream_media, {'kind': 'music'}, name='music-stream'),
+    path('music/<int:media_id>/stream-url/', get_stream_url, {'kind': 'music'}, name='music-stream-url'),
+    path('videos/<int:media_id>/stream/', stream_media, {'kind': 'video'}, name='video-stream'),
+    path('videos/<int:media_id>/stream-url/', get_stream_url, {'kind': 'video'}, name='video-stream-url'),
 ]
\ No newline at end of file
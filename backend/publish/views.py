@@ -1,4 +1,5 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
@@ -7,11 +8,23 @@ from rest_framework import status
 
 from .models import Artist, Album, Music, Video, Notice
 from .serializers import ArtistSerializer, AlbumSerializer, MusicSerializer, VideoSerializer, NoticeSerializer
+from .serializers import AlbumListSerializer, MusicListSerializer
+from .cache import cached_list_response
+from .pagination import PublishPagination
+from .streaming import make_stream_token, read_stream_token, stream_file_response
 
 # Create your views here.
 
+def serialize_unique(serializer_class, instances, request):
+    """按 id 去重后序列化，保持首次出现的顺序"""
+    unique = {}
+    for instance in instances:
+        unique.setdefault(instance.id, instance)
+    return serializer_class(list(unique.values()), many=True, context={'request': request}).data
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_list_response('artists', [Artist])
 def get_artist_list(request):
     
     artist_queryset = Artist.objects.all()
@@ -21,34 +34,67 @@ def get_artist_list(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_list_response('albums', [Album, Artist])
 def get_album_list(request):
     
-    album_queryset = Album.objects.filter(is_active=True)
+    album_queryset = Album.objects.filter(is_active=True).select_related('artist', 'product').prefetch_related(
+        'product__images'
+    )
     
     # 添加查询参数过滤
     artist_id = request.GET.get('artist')
     if artist_id:
         album_queryset = album_queryset.filter(artist_id=artist_id)
     
+    # 分页模式：每个艺术家只序列化一次，专辑中以 id 引用
+    paginator = PublishPagination()
+    if paginator.is_requested(request):
+        albums = paginator.paginate_queryset(album_queryset.order_by('id'), request)
+        response = paginator.get_paginated_response(
+            AlbumListSerializer(albums, many=True, context={'request': request}).data
+        )
+        response.data['artists'] = serialize_unique(
+            ArtistSerializer, [album.artist for album in albums], request
+        )
+        return response
+    
     serializer = AlbumSerializer(album_queryset, many=True, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_list_response('music', [Music, Album, Artist])
 def get_music_list(request):
     
-    music_queryset = Music.objects.filter(is_active=True)
+    music_queryset = Music.objects.filter(is_active=True).select_related(
+        'artist', 'album__artist', 'album__product'
+    ).prefetch_related('album__product__images')
     
     # 添加查询参数过滤
     album_id = request.GET.get('album')
     if album_id:
         music_queryset = music_queryset.filter(album_id=album_id)
     
+    # 分页模式：每个艺术家、专辑只序列化一次，音乐中以 id 引用
+    paginator = PublishPagination()
+    if paginator.is_requested(request):
+        tracks = paginator.paginate_queryset(music_queryset.order_by('id'), request)
+        albums = [track.album for track in tracks if track.album]
+        response = paginator.get_paginated_response(
+            MusicListSerializer(tracks, many=True, context={'request': request}).data
+        )
+        response.data['albums'] = serialize_unique(AlbumListSerializer, albums, request)
+        response.data['artists'] = serialize_unique(
+            ArtistSerializer, [track.artist for track in tracks] + [album.artist for album in albums], request
+        )
+        return response
+    
     serializer = MusicSerializer(music_queryset, many=True, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_list_response('videos', [Video])
 def get_video_list(request):
     
     video_queryset = Video.objects.filter(is_active=True)
@@ -58,9 +104,98 @@ def get_video_list(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_list_response('notices', [Notice])
 def get_notice_list(request):
    
-    notice_queryset = Notice.objects.filter(is_active=True)
+    notice_queryset = Notice.objects.filter(is_active=True).select_related('author')
     
     serializer = NoticeSerializer(notice_queryset, many=True, context={'request': request})
-    return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# ==================== 音乐 / 视频流式播放 ====================
+
+STREAM_MODELS = {
+    'music': Music,
+    'video': Video,
+}
+
+
+def can_stream(user, media):
+    """
+    检查用户能否播放
+    未发布的内容仅管理员可播放；关联了商品的专辑中的音乐需要拥有该商品的任一 SKU
+    """
+    if user is not None and user.is_staff:
+        return True
+    if not media.is_active:
+        return False
+    album = getattr(media, 'album', None)
+    if album is None or album.product_id is None:
+        return True
+    if user is None:
+        return False
+    from user.models import UserProduct
+    return UserProduct.objects.filter(user=user, sku__spu_id=album.product_id).exists()
+
+
+def _get_media(kind, media_id):
+    queryset = STREAM_MODELS[kind].objects.all()
+    if kind == 'music':
+        queryset = queryset.select_related('album')
+    return get_object_or_404(queryset, id=media_id)
+
+
+def _check_stream_access(user, media):
+    """无权播放时返回错误响应，否则返回 None"""
+    if not media.file:
+        return Response({'error': '文件不存在'}, status=status.HTTP_404_NOT_FOUND)
+    if not can_stream(user, media):
+        if not media.is_active:
+            return Response({'error': '文件不存在'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'error': '购买后才能播放'}, status=status.HTTP_403_FORBIDDEN)
+    return None
+
+
+def _get_stream_user(request, kind, media_id):
+    """JWT 认证的用户，或签名链接中的用户"""
+    if request.user.is_authenticated:
+        return request.user
+    token = request.GET.get('token')
+    if token:
+        user_id = read_stream_token(token, kind, media_id)
+        if user_id is not None:
+            from user.models import User
+            return User.objects.filter(id=user_id, is_active=True).first()
+    return None
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def stream_media(request, kind, media_id):
+    """流式播放音乐 / 视频文件，支持 Range 请求"""
+    media = _get_media(kind, media_id)
+    user = _get_stream_user(request, kind, media_id)
+    error = _check_stream_access(user, media)
+    if error is not None:
+        return error
+    return stream_file_response(request, media.file)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_stream_url(request, kind, media_id):
+    """
+    获取播放地址，登录用户的地址附带签名凭证
+    <audio> / <video> 标签无法携带 JWT 请求头，需使用该地址播放
+    """
+    media = _get_media(kind, media_id)
+    user = request.user if request.user.is_authenticated else None
+    error = _check_stream_access(user, media)
+    if error is not None:
+        return error
+
+    url = request.build_absolute_uri(reverse(f'{kind}-stream', kwargs={'media_id': media_id}))
+    if user is not None:
+        url = f'{url}?token={make_stream_token(kind, media_id, user.id)}'
+    return Response({'url': url}, status=status.HTTP_200_OK)
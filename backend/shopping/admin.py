@@ -8,8 +8,11 @@ from django.utils.translation import gettext_lazy as _
 from .models import (
     Category, ProductSPU, ProductSKU, Attribute, AttributeValue,
     ProductSPUAttribute, ProductSKUAttributeValue, Inventory, ProductImage, ProductReview,
-    Order, OrderItem, RefundRequest, OrderItemReview
+    Order, OrderItem, RefundRequest, OrderItemReview, OrderItemReviewImage, StripeEvent
 )
+from .refunds import approve_refunds
+from .order_stats import bulk_transition
+from .category_tree import descendants_q
 
 class CategoryFilter(admin.SimpleListFilter):
     title = _('分类（层级）')  # 过滤器标题
@@ -27,15 +30,18 @@ class CategoryFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value():
-            category = Category.objects.get(pk=self.value())
-            descendants = category.get_descendants(include_self=True)
             # 根据模型调整字段路径
             if queryset.model == ProductSPU:
-                return queryset.filter(category__in=descendants)
+                field = 'category'
             elif queryset.model == ProductSKU:
-                return queryset.filter(spu__category__in=descendants)
+                field = 'spu__category'
             elif queryset.model == ProductSKUAttributeValue:
-                return queryset.filter(sku__spu__category__in=descendants)
+                field = 'sku__spu__category'
+            else:
+                return queryset
+            condition = descendants_q(self.value(), field)
+            if condition is not None:
+                return queryset.filter(condition)
             # 添加其他模型的逻辑
         return queryset
 
@@ -54,7 +60,8 @@ class ProductSPUAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'brand', 'series', 'is_active', 'created_at', 'updated_at']  
     list_filter = ['is_active', 'created_at', CategoryFilter]  
     search_fields = ['name', 'description']  
-    readonly_fields = ['created_at', 'updated_at']  # 只读字段：时间戳
+    # 只读字段：时间戳；评价统计和 SKU 编码序号由 UPDATE ... F() 维护，不能在表单中修改
+    readonly_fields = ['created_at', 'updated_at', 'review_count', 'rating_avg', 'sku_counter']
 
 # ProductSKU 模型的管理类
 @admin.register(ProductSKU)
@@ -184,10 +191,7 @@ class OrderAdmin(admin.ModelAdmin):
         """批量标记为已发货"""
         from django.utils import timezone
         
-        updated = queryset.filter(status='paid').update(
-            status='shipped',
-            shipped_at=timezone.now()
-        )
+        updated = bulk_transition(queryset, 'paid', 'shipped', shipped_at=timezone.now())
         
         self.message_user(request, f'成功发货 {updated} 个订单')
     mark_as_shipped.short_description = '标记为已发货'
@@ -230,28 +234,9 @@ class RefundRequestAdmin(admin.ModelAdmin):
     actions = ['approve_refund', 'reject_refund']
     
     def approve_refund(self, request, queryset):
-        """批量同意退款"""
-        from django.utils import timezone
-        
-        updated = 0
-        for refund in queryset.filter(status='pending'):
-            refund.status = 'approved'
-            refund.processed_at = timezone.now()
-            refund.save()
-            
-            # 更新订单状态
-            refund.order.status = 'refunded'
-            refund.order.save()
-            
-            # 恢复库存
-            for item in refund.order.items.all():
-                inventory = item.sku.inventory
-                inventory.quantity += item.quantity
-                inventory.save()
-            
-            updated += 1
-        
-        self.message_user(request, f'成功处理 {updated} 个退款申请')
+        """批量同意退款（订单改为已退款并恢复库存）"""
+        refund_ids, _ = approve_refunds(queryset, order_status='refunded')
+        self.message_user(request, f'成功处理 {len(refund_ids)} 个退款申请')
     approve_refund.short_description = '同意退款'
     
     def reject_refund(self, request, queryset):
@@ -273,12 +258,21 @@ class RefundRequestAdmin(admin.ModelAdmin):
 
 # ==================== 订单评价管理 ====================
 
+class OrderItemReviewImageInline(admin.TabularInline):
+    """评价图片内联显示（含后台处理状态）"""
+    model = OrderItemReviewImage
+    extra = 0
+    fields = ['image', 'status', 'last_error', 'created_at']
+    readonly_fields = ['status', 'last_error', 'created_at']
+
+
 @admin.register(OrderItemReview)
 class OrderItemReviewAdmin(admin.ModelAdmin):
     list_display = ['order_item', 'user', 'spu', 'rating', 'content_preview', 'created_at']
     list_filter = ['rating', 'created_at']
     search_fields = ['user__username', 'spu__name', 'content']
     readonly_fields = ['order_item', 'user', 'spu', 'created_at', 'updated_at']
+    inlines = [OrderItemReviewImageInline]
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
@@ -286,4 +280,24 @@ class OrderItemReviewAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         """禁止在admin中直接创建评价"""
-        return False
\ No newline at end of file
+        return False
+
+# ==================== Stripe 事件 ====================
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event_type', 'status', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type']
+    search_fields = ['event_id']
+    readonly_fields = ['event_id', 'event_type', 'payload', 'last_error', 'received_at', 'processed_at']
+    actions = ['retry_events']
+
+    def retry_events(self, request, queryset):
+        """把失败的事件重新放回待处理状态并添加后台任务（处理中的重试记录见后台任务）"""
+        from .stripe_events import retry_events
+        updated = retry_events(queryset)
+        self.message_user(request, f'已重新排队 {updated} 个事件')
+    retry_events.short_description = '重新处理失败的事件'
+
+    def has_add_permission(self, request):
+        return False
@@ -19,9 +19,14 @@ urlpatterns = [
     # SKU管理
     path('products/<int:spu_id>/skus/', admin_views.sku_management, name='sku_list'),
     path('products/<int:spu_id>/skus/create/', admin_views.sku_create, name='sku_create'),
+    path('products/<int:spu_id>/skus/generate/', admin_views.sku_generate, name='sku_generate'),
     path('skus/<str:sku_code>/edit/', admin_views.sku_edit, name='sku_edit'),
     path('skus/<str:sku_code>/delete/', admin_views.sku_delete, name='sku_delete'),
     
+    # 目录导入导出
+    path('catalog/import/', admin_views.catalog_import, name='catalog_import'),
+    path('catalog/export/', admin_views.catalog_export, name='catalog_export'),
+    
     # 属性管理
     path('attributes/', admin_views.attribute_management, name='attribute_list'),
     path('attributes/create/', admin_views.attribute_create, name='attribute_create'),
@@ -57,4 +62,8 @@ urlpatterns = [
     # 评价管理
     path('reviews/', order_views.review_management, name='review_list'),
     path('reviews/<int:review_id>/delete/', order_views.review_delete, name='review_delete'),
+    
+    # 销售分析
+    path('analytics/sales/', order_views.sales_analytics, name='sales_analytics'),
+    path('analytics/sales/data/', order_views.sales_analytics_data, name='sales_analytics_data'),
 ]
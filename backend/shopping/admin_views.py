@@ -1,8 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.db import transaction
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 import json
 
@@ -10,6 +11,14 @@ from .models import (
     ProductSPU, ProductSKU, Category, Attribute, AttributeValue,
     ProductSPUAttribute, ProductSKUAttributeValue, Inventory, ProductImage
 )
+from .search import search_products
+from .category_tree import descendants_q
+from .catalog_io import (
+    CATALOG_COLUMNS, CATALOG_FORMATS, catalog_queryset, detect_format, export_catalog, import_catalog
+)
+from .sku_codes import (
+    MAX_SKU_COMBINATIONS, create_skus, generate_sku_combinations, replace_sku_attribute_values
+)
 
 
 def is_staff(user):
@@ -42,21 +51,17 @@ def product_management(request):
     spus = ProductSPU.objects.all().select_related('category').order_by('-created_at')
     categories = get_categories_with_level()
     
-    # 搜索过滤
-    search = request.GET.get('search', '')
-    if search:
-        spus = spus.filter(name__icontains=search)
-    
     # 分类过滤（包含子分类）
     category_id = request.GET.get('category', '')
     if category_id:
-        try:
-            category = Category.objects.get(id=category_id)
-            # 获取该分类及其所有子分类
-            descendant_categories = category.get_descendants(include_self=True)
-            spus = spus.filter(category__in=descendant_categories)
-        except Category.DoesNotExist:
-            pass
+        condition = descendants_q(category_id)
+        if condition is not None:
+            spus = spus.filter(condition)
+    
+    # 全文搜索，结果按相关度排序
+    search = request.GET.get('search', '')
+    if search:
+        spus = search_products(spus, search)
     
     context = {
         'spus': spus,
@@ -124,7 +129,8 @@ def spu_edit(request, spu_id):
             spu.brand = request.POST.get('brand', '')
             spu.series = request.POST.get('series', '')
             spu.is_active = request.POST.get('is_active') == 'on'
-            spu.save()
+            # 只写回表单中的字段，sku_counter、评价统计等由 UPDATE ... F() 维护的字段不被旧值覆盖
+            spu.save(update_fields=['name', 'description', 'category', 'brand', 'series', 'is_active', 'updated_at'])
             
             # 处理新上传的主图（如果有）
             image = request.FILES.get('images')
@@ -190,7 +196,8 @@ def sku_management(request, spu_id):
     skus = ProductSKU.objects.filter(spu=spu).prefetch_related(
         'attribute_values__attribute',
         'attribute_values__attribute_value',
-        'inventory'
+        'inventory',
+        'images'
     )
     
     # 获取SPU的属性
@@ -218,31 +225,19 @@ def sku_create(request, spu_id):
                 stock = request.POST.get('stock', 0)
                 is_active = request.POST.get('is_active') == 'on'
                 
-                # 创建SKU
-                sku = ProductSKU.objects.create(
-                    spu=spu,
-                    title=title,
-                    price=price,
-                    is_active=is_active
-                )
-                
-                # 创建库存
-                Inventory.objects.create(
-                    sku=sku,
-                    quantity=int(stock)
-                )
-                
-                # 处理属性值
-                spu_attributes = ProductSPUAttribute.objects.filter(spu=spu)
-                for spu_attr in spu_attributes:
-                    attr_id = spu_attr.attribute.id
+                # 创建SKU、库存和属性值（属性值在内存中校验后批量写入）
+                attribute_values = {}
+                for attr_id in ProductSPUAttribute.objects.filter(spu=spu).values_list('attribute_id', flat=True):
                     attr_value_id = request.POST.get(f'attr_{attr_id}')
                     if attr_value_id:
-                        ProductSKUAttributeValue.objects.create(
-                            sku=sku,
-                            attribute_id=attr_id,
-                            attribute_value_id=attr_value_id
-                        )
+                        attribute_values[attr_id] = int(attr_value_id)
+                sku = create_skus(spu, [{
+                    'title': title,
+                    'price': price,
+                    'stock': stock,
+                    'is_active': is_active,
+                    'attribute_values': attribute_values,
+                }])[0]
                 
                 # 处理图片上传
                 images = request.FILES.getlist('images')
@@ -278,6 +273,51 @@ def sku_create(request, spu_id):
     return render(request, 'shopping/sku_form.html', context)
 
 
+@login_required
+@user_passes_test(is_staff)
+def sku_generate(request, spu_id):
+    """按所选属性值的全部组合批量生成SKU"""
+    spu = get_object_or_404(ProductSPU, id=spu_id)
+    spu_attributes = list(ProductSPUAttribute.objects.filter(spu=spu).select_related('attribute').order_by('id'))
+    values_by_attribute = {}
+    for value in AttributeValue.objects.filter(attribute_id__in=[spu_attr.attribute_id for spu_attr in spu_attributes]):
+        values_by_attribute.setdefault(value.attribute_id, []).append(value)
+    
+    if request.method == 'POST':
+        value_ids_by_attribute = {}
+        for spu_attr in spu_attributes:
+            selected = [int(value_id) for value_id in request.POST.getlist(f'attr_{spu_attr.attribute_id}') if value_id]
+            if selected:
+                value_ids_by_attribute[spu_attr.attribute_id] = selected
+        
+        try:
+            skus, skipped = generate_sku_combinations(
+                spu,
+                value_ids_by_attribute,
+                price=request.POST.get('price'),
+                stock=request.POST.get('stock') or 0,
+                is_active=request.POST.get('is_active') == 'on',
+                skip_existing=request.POST.get('skip_existing') == 'on',
+            )
+            message = f'成功生成 {len(skus)} 个SKU'
+            if skipped:
+                message += f'，跳过 {skipped} 个已存在的组合'
+            messages.success(request, message)
+            return redirect('shopping_manage:sku_list', spu_id=spu_id)
+        except Exception as e:
+            messages.error(request, f'生成失败: {str(e)}')
+    
+    context = {
+        'spu': spu,
+        'attributes_with_values': [
+            {'attribute': spu_attr.attribute, 'values': values_by_attribute.get(spu_attr.attribute_id, [])}
+            for spu_attr in spu_attributes
+        ],
+        'max_combinations': MAX_SKU_COMBINATIONS,
+    }
+    return render(request, 'shopping/sku_generate.html', context)
+
+
 @login_required
 @user_passes_test(is_staff)
 def sku_edit(request, sku_code):
@@ -300,17 +340,12 @@ def sku_edit(request, sku_code):
                 inventory.save()
                 
                 # 更新属性值
-                sku.attribute_values.all().delete()
-                spu_attributes = ProductSPUAttribute.objects.filter(spu=spu)
-                for spu_attr in spu_attributes:
-                    attr_id = spu_attr.attribute.id
+                attribute_values = {}
+                for attr_id in ProductSPUAttribute.objects.filter(spu=spu).values_list('attribute_id', flat=True):
                     attr_value_id = request.POST.get(f'attr_{attr_id}')
                     if attr_value_id:
-                        ProductSKUAttributeValue.objects.create(
-                            sku=sku,
-                            attribute_id=attr_id,
-                            attribute_value_id=attr_value_id
-                        )
+                        attribute_values[attr_id] = int(attr_value_id)
+                replace_sku_attribute_values(sku, attribute_values)
                 
                 # 处理新上传的图片
                 images = request.FILES.getlist('images')
@@ -372,6 +407,66 @@ def sku_delete(request, sku_code):
     return redirect('shopping_manage:sku_list', spu_id=spu_id)
 
 
+# ==================== 目录导入导出 ====================
+
+@login_required
+@user_passes_test(is_staff)
+def catalog_export(request):
+    """导出商品目录（CSV / JSONL），流式输出，可按分类（含子分类）过滤"""
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in CATALOG_FORMATS:
+        messages.error(request, f'不支持的格式: {file_format}')
+        return redirect('shopping_manage:catalog_import')
+
+    queryset = catalog_queryset()
+    category_id = request.GET.get('category', '')
+    if category_id:
+        condition = descendants_q(category_id, field='spu__category')
+        if condition is not None:
+            queryset = queryset.filter(condition)
+
+    content_type = 'application/x-ndjson' if file_format == 'jsonl' else 'text/csv'
+    response = StreamingHttpResponse(
+        export_catalog(file_format, queryset),
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    filename = f"catalog-{timezone.localtime():%Y%m%d-%H%M%S}.{file_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@user_passes_test(is_staff)
+def catalog_import(request):
+    """上传 CSV / JSONL 文件导入商品目录，大文件建议使用 manage.py import_catalog"""
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, '请选择要导入的文件')
+        else:
+            file_format = request.POST.get('format') or detect_format(upload.name)
+            if file_format not in CATALOG_FORMATS:
+                messages.error(request, f'不支持的格式: {file_format}')
+            else:
+                try:
+                    result = import_catalog(upload, file_format)
+                except Exception as e:
+                    messages.error(request, f'导入失败：{str(e)}')
+                else:
+                    if result.error_count:
+                        messages.warning(request, f'导入完成，{result.error_count} 行有错误已跳过')
+                    else:
+                        messages.success(request, '导入完成！')
+
+    context = {
+        'result': result,
+        'columns': CATALOG_COLUMNS,
+        'categories': get_categories_with_level(),
+    }
+    return render(request, 'shopping/catalog_import.html', context)
+
+
 # ==================== 属性管理 ====================
 
 @login_required
@@ -0,0 +1,636 @@
+"""
+商品目录批量导入 / 导出（CSV / JSONL）
+每行一个 SKU，同时带上所属 SPU、库存和属性值：
+    sku_code, spu_id, spu_name, category_id, brand, series, spu_description, spu_is_active,
+    title, price, is_active, stock, attributes
+- CSV 的 attributes 写为 "颜色=红色;尺寸=L"（属性值中不能包含 ; 和 =），JSONL 为 {"颜色": "红色", "尺寸": "L"}
+- 导入按 sku_code 更新已有 SKU；sku_code 为空时创建新 SKU 并分配编码，
+  sku_code 不存在但符合 "{spu_id}-{序号}" 格式且序号大于 SPU 已分配的序号（sku_counter）时按该编码创建
+  （用于在环境之间迁移数据）；已分配过的序号（包括已删除 SKU 的编码）不能再次使用
+- spu_id 为空时按 (spu_name, category_id) 查找 SPU，找不到则创建
+- 空单元格表示不修改该字段；attributes 有值时替换 SKU 的全部属性值，缺少的属性 / 属性值自动创建
+- 输入逐行解析，每 batch_size 行在一个事务中写入（新行 bulk_create，变化的字段按新值分组 UPDATE），
+  导出用 iterator() 分块读取并逐块生成，内存占用与文件行数无关
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import (
+    Attribute, AttributeValue, Category, Inventory, ProductSKU, ProductSKUAttributeValue, ProductSPU,
+    ProductSPUAttribute
+)
+from .search import InvertedIndexSearchBackend
+from .sku_codes import allocate_sku_codes
+from .sku_matrix import invalidate_sku_matrix
+
+CATALOG_COLUMNS = [
+    'sku_code', 'spu_id', 'spu_name', 'category_id', 'brand', 'series', 'spu_description', 'spu_is_active',
+    'title', 'price', 'is_active', 'stock', 'attributes',
+]
+CATALOG_FORMATS = ('csv', 'jsonl')
+
+# 导入结果中最多保留的错误行数（只计数不保留其余错误，避免大文件出错时占用大量内存）
+MAX_REPORTED_ERRORS = 100
+EXPORT_CHUNK_SIZE = 2000
+
+_SPU_FIELDS = {
+    'spu_name': 'name',
+    'category_id': 'category_id',
+    'brand': 'brand',
+    'series': 'series',
+    'spu_description': 'description',
+    'spu_is_active': 'is_active',
+}
+_SKU_FIELDS = ('title', 'price', 'is_active')
+_TRUE_VALUES = {'1', 'true', 'yes', 'y', '是'}
+_FALSE_VALUES = {'0', 'false', 'no', 'n', '否'}
+
+
+class CatalogImportResult:
+    """导入结果统计"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []  # [(行号, 错误信息)]，最多 MAX_REPORTED_ERRORS 条
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def detect_format(filename, default='csv'):
+    """按文件扩展名判断格式"""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+# ==================== 解析 ====================
+
+def _text_stream(file):
+    """二进制文件包装为文本流（兼容 Excel 保存的带 BOM 的 UTF-8）"""
+    if isinstance(file, io.TextIOBase):
+        return file
+    return io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+
+def parse_attributes(text):
+    """解析 CSV 中的 "颜色=红色;尺寸=L"，返回 {属性名: 属性值}"""
+    attributes = {}
+    for part in text.split(';'):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition('=')
+        if not sep or not name.strip() or not value.strip():
+            raise ValueError(f'属性格式错误: {part}，应为 属性名=属性值')
+        attributes[name.strip()] = value.strip()
+    return attributes
+
+
+def format_attributes(attributes):
+    return ';'.join(f'{name}={value}' for name, value in attributes.items())
+
+
+def iter_csv_rows(file):
+    """逐行读取 CSV，返回 (行号, dict)"""
+    reader = csv.DictReader(_text_stream(file))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_jsonl_rows(file):
+    """逐行读取 JSONL，返回 (行号, dict)，无法解析的行返回 (行号, ValueError)"""
+    for line_number, line in enumerate(_text_stream(file), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, ValueError(f'JSON 解析失败: {exc}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ValueError('每行应为一个 JSON 对象')
+            continue
+        yield line_number, row
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE_VALUES:
+        return True
+    if text in _FALSE_VALUES:
+        return False
+    raise ValueError(f'无法识别的布尔值: {value}')
+
+
+def _parse_int(value, name):
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f'{name} 应为整数: {value}')
+    if number < 0:
+        raise ValueError(f'{name} 不能为负数: {value}')
+    return number
+
+
+def _parse_price(value):
+    try:
+        price = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f'价格格式错误: {value}')
+    if price < 0 or not price.is_finite():
+        raise ValueError(f'价格格式错误: {value}')
+    return price.quantize(Decimal('0.01'))
+
+
+def clean_row(raw):
+    """
+    校验并转换一行数据，只保留有值的字段（空值表示不修改）
+    格式错误时抛出 ValueError
+    """
+    row = {}
+    for column in CATALOG_COLUMNS:
+        value = raw.get(column)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if column in ('spu_id', 'category_id'):
+            row[column] = _parse_int(value, column)
+        elif column == 'stock':
+            row[column] = _parse_int(value, '库存')
+        elif column == 'price':
+            row[column] = _parse_price(value)
+        elif column in ('spu_is_active', 'is_active'):
+            row[column] = _parse_bool(value)
+        elif column == 'attributes':
+            if isinstance(value, dict):
+                row[column] = {str(name).strip(): str(item).strip() for name, item in value.items()}
+            else:
+                row[column] = parse_attributes(str(value))
+        elif column == 'spu_description':
+            row[column] = str(value)
+        else:
+            row[column] = str(value).strip()
+    return row
+
+
+# ==================== 导入 ====================
+
+class _RowError(Exception):
+    pass
+
+
+class _AttributeCache:
+    """属性名 / 属性值到 id 的映射，在整个导入过程中复用（大小与属性数量相关，与行数无关）"""
+
+    def __init__(self):
+        self.attribute_ids = {}
+        self.value_ids = {}
+
+    def resolve(self, attribute_maps):
+        """attribute_maps: 可迭代的 {属性名: 属性值}，缺少的属性和属性值批量创建"""
+        names = set()
+        pairs = set()
+        for attributes in attribute_maps:
+            names.update(attributes)
+            pairs.update(attributes.items())
+
+        missing = names - self.attribute_ids.keys()
+        if missing:
+            self._load_attributes(missing)
+            new_names = missing - self.attribute_ids.keys()
+            if new_names:
+                # 不依赖 bulk_create 回填主键（MySQL 不支持），创建后重新查询
+                Attribute.objects.bulk_create([Attribute(name=name) for name in sorted(new_names)])
+                self._load_attributes(new_names)
+
+        missing_pairs = {
+            (self.attribute_ids[name], value) for name, value in pairs
+        } - self.value_ids.keys()
+        if missing_pairs:
+            self._load_values(missing_pairs)
+            new_pairs = missing_pairs - self.value_ids.keys()
+            if new_pairs:
+                AttributeValue.objects.bulk_create(
+                    [AttributeValue(attribute_id=attribute_id, value=value) for attribute_id, value in new_pairs],
+                    ignore_conflicts=True,
+                )
+                self._load_values(new_pairs)
+
+    def _load_attributes(self, names):
+        # 属性名不唯一，同名时使用最早创建的属性
+        for attribute_id, name in Attribute.objects.filter(name__in=names).order_by('-id').values_list('id', 'name'):
+            self.attribute_ids[name] = attribute_id
+
+    def _load_values(self, pairs):
+        attribute_ids = {attribute_id for attribute_id, _ in pairs}
+        values = {value for _, value in pairs}
+        for value_id, attribute_id, value in AttributeValue.objects.filter(
+            attribute_id__in=attribute_ids, value__in=values
+        ).values_list('id', 'attribute_id', 'value'):
+            self.value_ids[(attribute_id, value)] = value_id
+
+    def value_map(self, attributes):
+        """{属性名: 属性值} 转为 {attribute_id: value_id}"""
+        result = {}
+        for name, value in attributes.items():
+            attribute_id = self.attribute_ids[name]
+            result[attribute_id] = self.value_ids[(attribute_id, value)]
+        return result
+
+
+def _apply_changes(model, changes, key='pk', now=None):
+    """
+    写入字段变化 changes: {主键: {字段: 新值}}
+    按 (字段, 新值) 分组，每组一条 UPDATE ... WHERE key IN (...)；同价、同库存的行很多，
+    比 bulk_update 生成的大段 CASE WHEN 快得多。now 不为空时同时更新 updated_at
+    """
+    groups = defaultdict(list)
+    for pk, fields in changes.items():
+        for field, value in fields.items():
+            groups[(field, value)].append(pk)
+    for (field, value), pks in groups.items():
+        model.objects.filter(**{f'{key}__in': pks}).update(**{field: value})
+    if changes and now is not None:
+        model.objects.filter(**{f'{key}__in': list(changes)}).update(updated_at=now)
+
+
+def _resolve_spus(rows, skus):
+    """
+    确定每行所属的 SPU，写入 row['spu']，并收集行中 SPU 字段的变化
+    返回 {spu_id: {字段: 新值}}
+    """
+    category_ids = {row['category_id'] for _, row in rows if 'category_id' in row}
+    known_categories = set(Category.objects.filter(id__in=category_ids).values_list('id', flat=True))
+
+    spu_ids = set()
+    lookups = set()
+    for line, row in rows:
+        sku = skus.get(row.get('sku_code'))
+        if 'spu_id' in row:
+            spu_ids.add(row['spu_id'])
+        elif sku is not None:
+            spu_ids.add(sku.spu_id)
+        elif 'spu_name' in row and 'category_id' in row:
+            lookups.add((row['spu_name'], row['category_id']))
+    spus = ProductSPU.objects.in_bulk(spu_ids)
+
+    by_name = {}
+    if lookups:
+        for spu in ProductSPU.objects.filter(name__in={name for name, _ in lookups}).order_by('-id'):
+            by_name[(spu.name, spu.category_id)] = spu
+
+    changes = {}
+    for line, row in rows:
+        try:
+            if 'category_id' in row and row['category_id'] not in known_categories:
+                raise _RowError(f"分类 {row['category_id']} 不存在")
+            sku = skus.get(row.get('sku_code'))
+            if 'spu_id' in row:
+                spu = spus.get(row['spu_id'])
+                if spu is None:
+                    raise _RowError(f"SPU {row['spu_id']} 不存在")
+                if sku is not None and sku.spu_id != spu.id:
+                    raise _RowError(f"SKU {sku.sku_code} 属于 SPU {sku.spu_id}，不能移动到 SPU {spu.id}")
+            elif sku is not None:
+                spu = spus[sku.spu_id]
+            else:
+                if 'spu_name' not in row or 'category_id' not in row:
+                    raise _RowError('新商品需要 spu_id，或同时提供 spu_name 和 category_id')
+                key = (row['spu_name'], row['category_id'])
+                spu = by_name.get(key)
+                if spu is None:
+                    # 新 SPU 数量远少于行数，逐个创建以获得主键（同时触发搜索索引等信号）
+                    spu = ProductSPU.objects.create(
+                        name=row['spu_name'],
+                        category_id=row['category_id'],
+                        brand=row.get('brand', ''),
+                        series=row.get('series', ''),
+                        description=row.get('spu_description', ''),
+                        is_active=row.get('spu_is_active', True),
+                    )
+                    by_name[key] = spus[spu.id] = spu
+        except _RowError as exc:
+            row['error'] = str(exc)
+            continue
+
+        row['spu'] = spu
+        for column, field in _SPU_FIELDS.items():
+            if column in row and getattr(spu, field) != row[column]:
+                setattr(spu, field, row[column])
+                changes.setdefault(spu.id, {})[field] = row[column]
+    return changes
+
+
+def _sync_sku_attribute_values(targets):
+    """
+    targets: {sku_code: {attribute_id: value_id}}，替换这些 SKU 的全部属性值
+    只写入有变化的部分，返回有变化的 SKU 编码集合（重复导入相同数据时不产生写操作）
+    """
+    current = {}
+    for row_id, sku_id, attribute_id, value_id in ProductSKUAttributeValue.objects.filter(
+        sku_id__in=targets.keys()
+    ).values_list('id', 'sku_id', 'attribute_id', 'attribute_value_id'):
+        current.setdefault(sku_id, {})[attribute_id] = (row_id, value_id)
+
+    to_create, to_delete = [], []
+    updates = {}
+    changed = set()
+    for sku_id, values in targets.items():
+        existing = current.get(sku_id, {})
+        for attribute_id, value_id in values.items():
+            if attribute_id not in existing:
+                to_create.append(ProductSKUAttributeValue(
+                    sku_id=sku_id, attribute_id=attribute_id, attribute_value_id=value_id
+                ))
+                changed.add(sku_id)
+            elif existing[attribute_id][1] != value_id:
+                updates[existing[attribute_id][0]] = {'attribute_value_id': value_id}
+                changed.add(sku_id)
+        for attribute_id, (row_id, _) in existing.items():
+            if attribute_id not in values:
+                to_delete.append(row_id)
+                changed.add(sku_id)
+
+    if to_delete:
+        ProductSKUAttributeValue.objects.filter(id__in=to_delete).delete()
+    _apply_changes(ProductSKUAttributeValue, updates)
+    ProductSKUAttributeValue.objects.bulk_create(to_create)
+    return changed
+
+
+def _import_chunk(rows, result, attribute_cache):
+    """在一个事务中写入一批行，rows: [(行号, 已校验的 dict)]"""
+    seen = set()
+    for line, row in rows:
+        code = row.get('sku_code')
+        if code:
+            if code in seen:
+                row['error'] = f'SKU {code} 在同一批次中重复出现'
+            seen.add(code)
+
+    now = timezone.now()
+    with transaction.atomic():
+        skus = ProductSKU.objects.in_bulk([row['sku_code'] for _, row in rows if 'sku_code' in row])
+        spu_changes = _resolve_spus([item for item in rows if 'error' not in item[1]], skus)
+        _apply_changes(ProductSPU, spu_changes, now=now)
+
+        # 指定新编码的 SPU：锁定并读取已分配的序号，并发导入同一 SPU 时排队执行
+        explicit_spu_ids = {
+            row['spu'].id for _, row in rows
+            if 'error' not in row and row.get('sku_code') and row['sku_code'] not in skus
+        }
+        allocated_numbers = dict(
+            ProductSPU.objects.select_for_update().filter(id__in=explicit_spu_ids).values_list('id', 'sku_counter')
+        ) if explicit_spu_ids else {}
+
+        new_rows = []
+        counters = {}
+        auto_codes = {}
+        sku_changes = {}
+        for line, row in rows:
+            if 'error' in row:
+                continue
+            spu = row['spu']
+            sku = skus.get(row.get('sku_code'))
+            if sku is None:
+                if 'title' not in row or 'price' not in row:
+                    row['error'] = '新 SKU 需要 title 和 price'
+                    continue
+                code = row.get('sku_code')
+                if code:
+                    prefix, _, number = code.rpartition('-')
+                    if prefix != str(spu.id) or not number.isdigit():
+                        row['error'] = f'SKU {code} 不存在，新编码应为 "{spu.id}-序号" 格式'
+                        continue
+                    allocated_number = allocated_numbers.get(spu.id, 0)
+                    if int(number) <= allocated_number:
+                        row['error'] = (
+                            f'SKU {code} 不存在，序号 {number} 已分配过（当前最大序号 {allocated_number}），'
+                            f'请留空 sku_code 自动分配'
+                        )
+                        continue
+                    counters[spu.id] = max(counters.get(spu.id, 0), int(number))
+                else:
+                    auto_codes[spu.id] = auto_codes.get(spu.id, 0) + 1
+                new_rows.append(row)
+                continue
+
+            for field in _SKU_FIELDS:
+                if field in row and getattr(sku, field) != row[field]:
+                    setattr(sku, field, row[field])
+                    sku_changes.setdefault(sku.sku_code, {})[field] = row[field]
+            row['sku'] = sku
+
+        # 指定编码创建时把计数推进到该序号，之后自动分配的编码不会与之冲突
+        for spu_id, number in counters.items():
+            ProductSPU.objects.filter(id=spu_id).update(sku_counter=Greatest(F('sku_counter'), number))
+        allocated = {spu_id: iter(allocate_sku_codes(spu_id, count)) for spu_id, count in auto_codes.items()}
+
+        new_skus = []
+        for row in new_rows:
+            code = row.get('sku_code') or next(allocated[row['spu'].id])
+            row['sku'] = ProductSKU(
+                sku_code=code,
+                spu=row['spu'],
+                title=row['title'],
+                price=row['price'],
+                is_active=row.get('is_active', True),
+            )
+            new_skus.append(row['sku'])
+        ProductSKU.objects.bulk_create(new_skus)
+        _apply_changes(ProductSKU, sku_changes, now=now)
+        new_codes = {sku.sku_code for sku in new_skus}
+
+        # 库存：新 SKU 总是创建库存记录（未提供 stock 时为 0）
+        stock_rows = {row['sku'].sku_code: row['stock'] for _, row in rows if 'sku' in row and 'stock' in row}
+        current_stock = dict(
+            Inventory.objects.filter(sku_id__in=stock_rows.keys() - new_codes).values_list('sku_id', 'quantity')
+        ) if stock_rows else {}
+        stock_changes = {
+            sku_code: {'quantity': quantity}
+            for sku_code, quantity in stock_rows.items()
+            if sku_code in current_stock and current_stock[sku_code] != quantity
+        }
+        _apply_changes(Inventory, stock_changes, key='sku_id', now=now)
+        Inventory.objects.bulk_create([
+            Inventory(sku_id=sku_code, quantity=quantity)
+            for sku_code, quantity in stock_rows.items()
+            if sku_code not in current_stock and sku_code not in new_codes
+        ] + [
+            Inventory(sku=sku, quantity=stock_rows.get(sku.sku_code, 0)) for sku in new_skus
+        ])
+
+        # 属性：确保属性关联到 SPU，再替换 SKU 的属性值
+        attribute_rows = [row for _, row in rows if 'sku' in row and 'attributes' in row]
+        attribute_changes = set()
+        if attribute_rows:
+            attribute_cache.resolve(row['attributes'] for row in attribute_rows)
+            targets = {}
+            links = set()
+            for row in attribute_rows:
+                values = attribute_cache.value_map(row['attributes'])
+                targets[row['sku'].sku_code] = values
+                links.update((row['spu'].id, attribute_id) for attribute_id in values)
+            links -= set(ProductSPUAttribute.objects.filter(
+                spu_id__in={spu_id for spu_id, _ in links}
+            ).values_list('spu_id', 'attribute_id'))
+            ProductSPUAttribute.objects.bulk_create(
+                [ProductSPUAttribute(spu_id=spu_id, attribute_id=attribute_id) for spu_id, attribute_id in links],
+                ignore_conflicts=True,
+            )
+            attribute_changes = _sync_sku_attribute_values(targets)
+
+        touched_spus = set(spu_changes)
+        for line, row in rows:
+            if 'error' in row:
+                result.add_error(line, row['error'])
+                continue
+            code = row['sku'].sku_code
+            if code in new_codes:
+                result.created += 1
+            elif code in sku_changes or code in stock_changes or code in attribute_changes:
+                result.updated += 1
+            else:
+                result.unchanged += 1
+                continue
+            touched_spus.add(row['spu'].id)
+
+        # 批量写入不触发信号，手动使缓存失效
+        invalidate_sku_matrix(*touched_spus)
+        if spu_changes:
+            transaction.on_commit(InvertedIndexSearchBackend.invalidate)
+
+
+def import_catalog(file, file_format='csv', batch_size=None):
+    """
+    从文件导入商品目录，返回 CatalogImportResult
+    file: 二进制或文本文件对象；file_format: 'csv' / 'jsonl'
+    batch_size: 每个事务处理的行数，默认 settings.CATALOG_IMPORT_BATCH_SIZE
+    单行格式错误只跳过该行并记录到结果中，数据库错误会中止导入（已提交的批次保留）
+    """
+    if file_format not in CATALOG_FORMATS:
+        raise ValueError(f'不支持的格式: {file_format}')
+    batch_size = batch_size or settings.CATALOG_IMPORT_BATCH_SIZE
+    rows = iter_jsonl_rows(file) if file_format == 'jsonl' else iter_csv_rows(file)
+    result = CatalogImportResult()
+    attribute_cache = _AttributeCache()
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        chunk = []
+        for line, raw in batch:
+            result.rows += 1
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                chunk.append((line, clean_row(raw)))
+            except ValueError as exc:
+                result.add_error(line, str(exc))
+        if chunk:
+            _import_chunk(chunk, result, attribute_cache)
+    return result
+
+
+# ==================== 导出 ====================
+
+def catalog_queryset():
+    """导出用的 SKU 查询，属性值按块预加载"""
+    return ProductSKU.objects.select_related('spu', 'inventory').prefetch_related(
+        Prefetch(
+            'attribute_values',
+            queryset=ProductSKUAttributeValue.objects.select_related('attribute', 'attribute_value').order_by('id'),
+        )
+    ).order_by('spu_id', 'created_at', 'sku_code')
+
+
+def iter_catalog_rows(queryset=None):
+    """逐个生成导出行（dict），iterator() 分块读取，不会一次加载全部 SKU"""
+    queryset = catalog_queryset() if queryset is None else queryset
+    for sku in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        spu = sku.spu
+        try:
+            stock = sku.inventory.quantity
+        except Inventory.DoesNotExist:
+            stock = 0
+        yield {
+            'sku_code': sku.sku_code,
+            'spu_id': spu.id,
+            'spu_name': spu.name,
+            'category_id': spu.category_id,
+            'brand': spu.brand,
+            'series': spu.series,
+            'spu_description': spu.description,
+            'spu_is_active': spu.is_active,
+            'title': sku.title,
+            'price': str(sku.price),
+            'is_active': sku.is_active,
+            'stock': stock,
+            'attributes': {
+                value.attribute.name: value.attribute_value.value for value in sku.attribute_values.all()
+            },
+        }
+
+
+class _Echo:
+    """csv.writer 的伪文件对象，writerow 直接返回格式化后的字符串"""
+
+    def write(self, value):
+        return value
+
+
+def _buffered(lines, size=EXPORT_CHUNK_SIZE):
+    """把多行合并后再输出，减少流式响应的分块数量"""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    # 带 BOM，Excel 可直接打开
+    yield '\ufeff' + writer.writerow(CATALOG_COLUMNS)
+    for row in rows:
+        row = dict(row, attributes=format_attributes(row['attributes']))
+        for column in ('spu_is_active', 'is_active'):
+            row[column] = int(row[column])
+        yield writer.writerow([row[column] for column in CATALOG_COLUMNS])
+
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def export_catalog(file_format='csv', queryset=None):
+    """生成导出内容（字符串块），可直接作为 StreamingHttpResponse 的内容或逐块写入文件"""
+    if file_format not in CATALOG_FORMATS:
+        raise ValueError(f'不支持的格式: {file_format}')
+    rows = iter_catalog_rows(queryset)
+    return _buffered(_jsonl_lines(rows) if file_format == 'jsonl' else _csv_lines(rows))
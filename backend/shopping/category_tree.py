@@ -0,0 +1,121 @@
+"""
+分类树快照
+分类数量少、读多写少，把整棵 MPTT 树（id → tree_id / lft / rght / level / 完整路径）
+构建为快照，存放在共享缓存中，并在进程内再缓存一份：
+- 子分类过滤只需一个 tree_id + lft__range 条件，不再先查 Category 再 get_descendants()
+- 分类完整名称（服装 > 上衣 > T恤）直接从快照读取，不再逐级查询 parent
+分类新增、修改、删除、移动时由信号使快照失效（见 models.py）；
+直接调用 Category.objects.rebuild() 等不触发信号的操作后需手动调用 invalidate_category_tree()。
+"""
+import threading
+import time
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+CATEGORY_TREE_VERSION_KEY = 'shopping:category_tree:version'
+CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60 * 24  # 旧版本快照不再被读取，设置过期时间让其自然淘汰
+
+
+class CategoryNode(NamedTuple):
+    id: int
+    name: str
+    parent_id: int
+    tree_id: int
+    lft: int
+    rght: int
+    level: int
+    full_name: str
+
+
+def _snapshot_cache_key(version):
+    return f'shopping:category_tree:snapshot:{version}'
+
+
+def build_category_tree():
+    """按树形顺序一次查询全部分类，返回 {id: CategoryNode}"""
+    from .models import Category
+
+    nodes = {}
+    rows = Category.objects.order_by('tree_id', 'lft').values_list(
+        'id', 'name', 'parent_id', 'tree_id', 'lft', 'rght', 'level'
+    )
+    for category_id, name, parent_id, tree_id, lft, rght, level in rows:
+        # 按 lft 排序，父分类一定先于子分类出现
+        parent = nodes.get(parent_id)
+        full_name = f'{parent.full_name} > {name}' if parent else name
+        nodes[category_id] = CategoryNode(category_id, name, parent_id, tree_id, lft, rght, level, full_name)
+    return nodes
+
+
+_lock = threading.Lock()
+_local = {'version': None, 'nodes': None}
+
+
+def _new_version():
+    # 版本号键被缓存淘汰后以当前时间重新开始，不会与旧快照的键冲突
+    return time.time_ns()
+
+
+def _current_version():
+    version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_TREE_VERSION_KEY, _new_version(), None)
+        version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    return version
+
+
+def get_category_tree():
+    """
+    获取分类树快照 {id: CategoryNode}
+    优先使用进程内副本，版本号变化后从共享缓存读取，缓存不存在时才查询数据库
+    """
+    version = _current_version()
+    if _local['version'] == version:
+        return _local['nodes']
+
+    with _lock:
+        if _local['version'] != version:
+            key = _snapshot_cache_key(version)
+            nodes = cache.get(key)
+            if nodes is None:
+                nodes = build_category_tree()
+                cache.set(key, nodes, CATEGORY_TREE_CACHE_TIMEOUT)
+            _local['nodes'], _local['version'] = nodes, version
+    return _local['nodes']
+
+
+def get_category_node(category_id):
+    """按 id 获取快照中的分类，不存在或 id 非法时返回 None"""
+    try:
+        category_id = int(category_id)
+    except (TypeError, ValueError):
+        return None
+    return get_category_tree().get(category_id)
+
+
+def descendants_q(category_id, field='category'):
+    """
+    返回"属于该分类或其子分类"的过滤条件，分类不存在时返回 None
+    field: 指向 Category 的外键路径，如 'category'、'spu__category'
+    """
+    node = get_category_node(category_id)
+    if node is None:
+        return None
+    return Q(**{
+        f'{field}__tree_id': node.tree_id,
+        f'{field}__lft__range': (node.lft, node.rght),
+    })
+
+
+def invalidate_category_tree():
+    """使分类树快照失效，事务提交后递增版本号，各进程下次读取时重建"""
+    def bump():
+        try:
+            cache.incr(CATEGORY_TREE_VERSION_KEY)
+        except ValueError:
+            cache.set(CATEGORY_TREE_VERSION_KEY, _new_version(), None)
+
+    transaction.on_commit(bump)
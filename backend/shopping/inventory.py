@@ -0,0 +1,97 @@
+"""
+库存服务
+所有库存变更（下单扣减、取消/退款/过期恢复）都通过本模块完成。
+扣减使用带条件的单条 UPDATE：
+    UPDATE ... SET quantity = quantity - n WHERE quantity >= n
+并用 CASE 表达式把一批 SKU 合并为一条语句，由数据库保证原子性，避免并发超卖。
+"""
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import Inventory, OrderItem
+from .sku_matrix import invalidate_sku_matrix_for_skus
+
+
+class InsufficientStock(Exception):
+    """库存不足"""
+
+    def __init__(self, sku_codes):
+        self.sku_codes = list(sku_codes)
+        super().__init__(f"库存不足: {', '.join(self.sku_codes)}")
+
+
+def _merge_quantities(items):
+    """
+    合并同一 SKU 的数量，并按 sku_code 排序，保证加锁顺序确定
+    items: 可迭代的 (sku_code, quantity)
+    """
+    merged = {}
+    for sku_code, quantity in items:
+        if quantity <= 0:
+            continue
+        merged[sku_code] = merged.get(sku_code, 0) + quantity
+    return OrderedDict(sorted(merged.items()))
+
+
+def _quantity_case(quantities):
+    """构建 CASE sku_id WHEN ... THEN n END 表达式"""
+    return Case(
+        *[When(sku_id=sku_code, then=Value(quantity)) for sku_code, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def reserve_stock(items):
+    """
+    扣减库存，一批 SKU 只执行一条条件 UPDATE
+    任意 SKU 库存不足时整体回滚并抛出 InsufficientStock
+    """
+    quantities = _merge_quantities(items)
+    if not quantities:
+        return
+
+    delta = _quantity_case(quantities)
+    try:
+        with transaction.atomic():
+            updated = Inventory.objects.filter(
+                sku_id__in=quantities.keys(),
+                quantity__gte=delta,
+            ).update(quantity=F('quantity') - delta)
+
+            # 有 SKU 未更新说明库存不足，抛出异常使本批扣减回滚
+            if updated != len(quantities):
+                raise InsufficientStock(quantities.keys())
+    except InsufficientStock:
+        available = dict(
+            Inventory.objects.filter(sku_id__in=quantities.keys()).values_list('sku_id', 'quantity')
+        )
+        short = [sku_code for sku_code, quantity in quantities.items() if available.get(sku_code, 0) < quantity]
+        raise InsufficientStock(short or quantities.keys())
+
+    invalidate_sku_matrix_for_skus(quantities.keys())
+
+
+def release_stock(items):
+    """恢复库存，一批 SKU 只执行一条 UPDATE"""
+    quantities = _merge_quantities(items)
+    if not quantities:
+        return 0
+
+    delta = _quantity_case(quantities)
+    updated = Inventory.objects.filter(sku_id__in=quantities.keys()).update(quantity=F('quantity') + delta)
+    invalidate_sku_matrix_for_skus(quantities.keys())
+    return updated
+
+
+def restore_orders_stock(order_ids):
+    """
+    恢复一组订单的库存（取消订单、同意退款、订单过期时调用）：先按 SKU 汇总数量（一条 GROUP BY 查询），再用一条 UPDATE 写回，
+    语句数与订单数无关
+    """
+    return release_stock(
+        OrderItem.objects.filter(order_id__in=order_ids).order_by().values('sku_id').annotate(
+            total_quantity=Sum('quantity'),
+        ).values_list('sku_id', 'total_quantity')
+    )
@@ -0,0 +1,76 @@
+"""
+订单号生成性能测试
+统计每秒生成的订单号数量，并检查唯一性和单调递增
+用法:
+    python manage.py benchmark_order_numbers                        # Snowflake，单线程生成 100 万个
+    python manage.py benchmark_order_numbers --threads 4            # 4 个线程共用一个生成器
+    python manage.py benchmark_order_numbers --batch 1000           # 每次 next_ids(1000) 批量生成
+    python manage.py benchmark_order_numbers --generator sequence --count 100000
+    python manage.py benchmark_order_numbers --legacy               # 同时测试原来的 时间戳+用户id 方案的重复率
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shopping.order_numbers import SequenceGenerator, SnowflakeGenerator
+
+
+class Command(BaseCommand):
+    help = '测试订单号生成器的吞吐量、唯一性和单调性'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generator', choices=['snowflake', 'sequence'], default='snowflake')
+        parser.add_argument('--count', type=int, default=1000000, help='每个线程生成的数量')
+        parser.add_argument('--threads', type=int, default=1, help='线程数')
+        parser.add_argument('--block-size', type=int, default=100, help='sequence 方式的号段大小')
+        parser.add_argument('--batch', type=int, default=0, help='snowflake 方式每次批量生成的数量（0 表示逐个生成）')
+        parser.add_argument('--legacy', action='store_true', help='对比原来 ORD{毫秒时间戳}{用户id} 方案的重复数量')
+
+    def handle(self, *args, **options):
+        if options['generator'] == 'snowflake':
+            generator = SnowflakeGenerator(worker_id=1)
+        else:
+            generator = SequenceGenerator(block_size=options['block_size'])
+
+        count, thread_count, batch = options['count'], options['threads'], options['batch']
+        if batch and options['generator'] != 'snowflake':
+            raise CommandError('--batch 只支持 snowflake')
+        results = [None] * thread_count
+
+        def worker(index):
+            if batch:
+                ids = []
+                while len(ids) < count:
+                    ids.extend(generator.next_ids(min(batch, count - len(ids))))
+                results[index] = ids
+            else:
+                next_id = generator.next_id
+                results[index] = [next_id() for _ in range(count)]
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = count * thread_count
+        unique = len(set().union(*results))
+        monotonic = all(all(a < b for a, b in zip(ids, ids[1:])) for ids in results)
+        self.stdout.write(
+            f'{options["generator"]}: {total} 个订单号，耗时 {elapsed:.3f}s，'
+            f'{total / elapsed:,.0f} 个/秒，重复 {total - unique} 个，'
+            f'各线程内单调递增: {"是" if monotonic else "否"}'
+        )
+        self.stdout.write(f'示例: {generator.next_order_number()}')
+
+        if options['legacy']:
+            # 原方案：同一用户在同一毫秒内下单会得到相同订单号
+            started = time.perf_counter()
+            legacy = [f'ORD{int(time.time() * 1000)}{1:06d}' for _ in range(count)]
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'legacy: {count} 个订单号，耗时 {elapsed:.3f}s，重复 {count - len(set(legacy))} 个'
+            )
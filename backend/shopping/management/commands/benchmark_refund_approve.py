@@ -0,0 +1,110 @@
+"""
+批量同意退款性能测试
+生成测试订单和待处理退款申请，统计 approve_refunds 的耗时和 SQL 语句数，全部数据在结束后回滚
+用法:
+    python manage.py benchmark_refund_approve                      # 1000 个退款申请，每单 3 行商品
+    python manage.py benchmark_refund_approve --count 5000 --items 5
+    python manage.py benchmark_refund_approve --legacy             # 同时测试原来逐单 save() 的方式
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from shopping.models import Inventory, Order, OrderItem, RefundRequest
+from shopping.refunds import approve_refunds
+
+BENCH_PREFIX = 'BENCHREFUND'
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = '测试批量同意退款（按 SKU 汇总恢复库存）的耗时和 SQL 语句数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='退款申请数')
+        parser.add_argument('--items', type=int, default=3, help='每个订单的商品行数')
+        parser.add_argument('--skus', type=int, default=20, help='使用的 SKU 数（越少重复越多）')
+        parser.add_argument('--legacy', action='store_true', help='对比原来逐单 save() 并逐行恢复库存的方式')
+
+    def handle(self, *args, **options):
+        inventories = list(Inventory.objects.order_by('sku_id')[:options['skus']])
+        if not inventories:
+            raise CommandError('没有库存记录，请先创建商品 SKU')
+
+        self.run('set-based', approve_refunds, inventories, options)
+        if options['legacy']:
+            self.run('legacy', self.legacy_approve, inventories, options)
+
+    def run(self, label, approve, inventories, options):
+        try:
+            with transaction.atomic():
+                refunds = self.seed(inventories, options)
+                before = dict(Inventory.objects.filter(id__in=[inv.id for inv in inventories]).values_list('id', 'quantity'))
+
+                queries = []
+
+                def count_query(execute, sql, params, many, context):
+                    queries.append(sql)
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(count_query):
+                    started = time.perf_counter()
+                    approve(refunds)
+                    elapsed = time.perf_counter() - started
+
+                after = dict(Inventory.objects.filter(id__in=before).values_list('id', 'quantity'))
+                expected = options['count'] * options['items']
+                restored = sum(after[key] - before[key] for key in before)
+                self.stdout.write(
+                    f'{label}: {options["count"]} 个退款申请，耗时 {elapsed:.3f}s，SQL {len(queries)} 条，'
+                    f'恢复库存 {restored} 件（应为 {expected}）'
+                )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def seed(self, inventories, options):
+        """生成已支付订单和待处理退款申请（bulk_create，不触发信号），返回退款申请查询集"""
+        user = get_user_model().objects.create(username=f'{BENCH_PREFIX.lower()}{time.time_ns()}')
+        now = timezone.now()
+        orders = Order.objects.bulk_create([
+            Order(
+                order_number=f'{BENCH_PREFIX}{time.time_ns()}{index:06d}', user=user, status='paid', paid_at=now,
+                receiver_name='benchmark', receiver_phone='0', receiver_province='-', receiver_city='-',
+                receiver_district='-', receiver_address='-', total_amount=options['items'],
+            )
+            for index in range(options['count'])
+        ], batch_size=1000)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, sku_id=inventories[(index + line) % len(inventories)].sku_id,
+                sku_title='benchmark', spu_name='benchmark', price=1, quantity=1, subtotal=1,
+            )
+            for index, order in enumerate(orders) for line in range(options['items'])
+        ], batch_size=1000)
+        RefundRequest.objects.bulk_create([
+            RefundRequest(order=order, reason='other', description='benchmark', refund_amount=order.total_amount)
+            for order in orders
+        ], batch_size=1000)
+        return RefundRequest.objects.filter(order__user=user)
+
+    @staticmethod
+    def legacy_approve(refunds):
+        """原实现：逐个保存退款和订单，逐行读取并保存库存"""
+        for refund in refunds.filter(status='pending'):
+            refund.status = 'approved'
+            refund.processed_at = timezone.now()
+            refund.save()
+            order = refund.order
+            order.status = 'cancelled'
+            order.save()
+            for item in order.items.all():
+                inventory = item.sku.inventory
+                inventory.quantity += item.quantity
+                inventory.save()
@@ -0,0 +1,100 @@
+"""
+商品搜索性能对比：icontains 扫描 vs 全文搜索后端
+用法:
+    python manage.py benchmark_search --seed 100000      # 先生成 10 万条测试 SPU
+    python manage.py benchmark_search -q 红色 -q T恤 --repeat 50
+    python manage.py benchmark_search --cleanup          # 删除生成的测试 SPU
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from shopping.models import Category, ProductSPU
+from shopping.search import InvertedIndexSearchBackend, get_search_backend
+
+BENCH_SERIES = '__search_benchmark__'
+SAMPLE_WORDS = ['红色', '蓝色', '黑色', '纯棉', 'T恤', '卫衣', '外套', '限定', '专辑', '签名', '海报', 'vinyl', 'limited', 'tour']
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+class Command(BaseCommand):
+    help = '对比 icontains 与全文搜索后端的查询延迟（p50 / p95）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-q', '--query', action='append', dest='queries', help='搜索词，可重复指定')
+        parser.add_argument('--repeat', type=int, default=20, help='每个搜索词重复次数')
+        parser.add_argument('--page-size', type=int, default=20, help='每次取回的结果数')
+        parser.add_argument('--seed', type=int, default=0, help='先生成指定数量的测试 SPU')
+        parser.add_argument('--cleanup', action='store_true', help='删除生成的测试 SPU 后退出')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = ProductSPU.objects.filter(series=BENCH_SERIES).delete()
+            InvertedIndexSearchBackend.invalidate()
+            self.stdout.write(self.style.SUCCESS(f'已删除 {deleted} 条测试数据'))
+            return
+
+        if options['seed']:
+            self.seed(options['seed'])
+
+        queries = options['queries'] or ['红色', 'T恤', '限定 专辑', 'vinyl']
+        backend = get_search_backend()
+        page_size = options['page_size']
+        total = ProductSPU.objects.count()
+        self.stdout.write(f'SPU 总数: {total}，搜索后端: {backend.__class__.__name__}')
+
+        # 预热（倒排索引首次使用时需要构建）
+        list(backend.search(ProductSPU.objects.all(), queries[0])[:page_size])
+
+        # 与分页接口一致：COUNT + 取第一页
+        def run_icontains(query):
+            condition = Q()
+            for word in query.split():
+                condition |= Q(name__icontains=word) | Q(description__icontains=word) | \
+                    Q(brand__icontains=word) | Q(series__icontains=word)
+            queryset = ProductSPU.objects.filter(condition)
+            return queryset.count(), list(queryset[:page_size])
+
+        def run_fulltext(query):
+            queryset = backend.search(ProductSPU.objects.all(), query)
+            return queryset.count(), list(queryset[:page_size])
+
+        for label, runner in (('icontains', run_icontains), ('fulltext', run_fulltext)):
+            samples = []
+            for _ in range(options['repeat']):
+                for query in queries:
+                    start = time.perf_counter()
+                    runner(query)
+                    samples.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{label:<10} p50={percentile(samples, 50):8.2f}ms  p95={percentile(samples, 95):8.2f}ms  '
+                f'n={len(samples)}'
+            )
+
+    def seed(self, count, batch_size=5000):
+        category = Category.objects.first() or Category.objects.create(name='Benchmark')
+        rng = random.Random(42)
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            ProductSPU.objects.bulk_create([
+                ProductSPU(
+                    name=' '.join(rng.sample(SAMPLE_WORDS, 3)),
+                    description=''.join(rng.sample(SAMPLE_WORDS, 6)),
+                    brand=rng.choice(SAMPLE_WORDS),
+                    series=BENCH_SERIES,
+                    category=category,
+                )
+                for _ in range(size)
+            ])
+            created += size
+        # bulk_create 不触发信号，手动使倒排索引失效
+        InvertedIndexSearchBackend.invalidate()
+        self.stdout.write(f'已生成 {created} 条测试 SPU')
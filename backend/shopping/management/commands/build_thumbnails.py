@@ -0,0 +1,66 @@
+"""
+为已上传的图片批量生成缩略图和 WebP 衍生图（商品、评价、头像、帖子、专辑封面等，见 backend/thumbnails.py）
+用法:
+    python manage.py build_thumbnails                         # 补全缺少的衍生图
+    python manage.py build_thumbnails --model shopping.ProductImage --size small --size medium
+    python manage.py build_thumbnails --overwrite --workers 8 # 调整尺寸或质量后全部重新生成
+已存在的衍生图会跳过，可以随时中断后重新运行。
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.thumbnails import (
+    IMAGE_FIELDS, THUMBNAIL_SIZES, DerivativeError, generate_derivatives, iter_image_names
+)
+
+
+class Command(BaseCommand):
+    help = '为已有图片生成缩略图和 WebP 衍生图'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', help='只处理指定模型（如 shopping.ProductImage），可重复')
+        parser.add_argument('--size', action='append', choices=list(THUMBNAIL_SIZES), help='只生成指定尺寸，可重复')
+        parser.add_argument('--overwrite', action='store_true', help='重新生成已存在的衍生图')
+        parser.add_argument('--workers', type=int, default=4, help='并行线程数（Pillow 缩放时会释放 GIL）')
+
+    def handle(self, *args, **options):
+        labels = {label for label, _ in IMAGE_FIELDS}
+        models = set(options['model'] or labels)
+        unknown = models - labels
+        if unknown:
+            raise CommandError(f'不支持的模型: {", ".join(sorted(unknown))}，可选: {", ".join(sorted(labels))}')
+        sizes = options['size'] or list(THUMBNAIL_SIZES)
+        overwrite = options['overwrite']
+
+        def build(name):
+            try:
+                generate_derivatives(name, sizes, overwrite=overwrite)
+            except DerivativeError as exc:
+                return name, str(exc)
+            return name, None
+
+        self.done = self.failed = 0
+        workers = max(options['workers'], 1)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _, name in iter_image_names(models):
+                # 限制排队的任务数，内存占用与图片总数无关
+                if len(pending) >= workers * 4:
+                    self.report(pending.popleft().result())
+                pending.append(executor.submit(build, name))
+            while pending:
+                self.report(pending.popleft().result())
+
+        self.stdout.write(self.style.SUCCESS(f'完成：{self.done} 张图片，失败 {self.failed} 张'))
+
+    def report(self, result):
+        name, error = result
+        if error:
+            self.failed += 1
+            self.stderr.write(f'{name}: {error}')
+        else:
+            self.done += 1
+        if (self.done + self.failed) % 500 == 0:
+            self.stdout.write(f'已处理 {self.done + self.failed} 张图片')
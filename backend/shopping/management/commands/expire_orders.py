@@ -0,0 +1,48 @@
+"""
+取消超过 ORDER_PENDING_TTL 未支付的订单并恢复库存（见 shopping/order_expiry.py）
+用法:
+    python manage.py expire_orders                    # 持续运行，每 60 秒检查一次
+    python manage.py expire_orders --once             # 处理完当前过期订单后退出（适合 cron）
+    python manage.py expire_orders --once --max-batches 10 --batch-size 200
+可同时运行多个进程，订单在处理期间被锁定（SKIP LOCKED），不会被重复取消。
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shopping.order_expiry import expire_order_batch, pending_order_cutoff
+
+
+class Command(BaseCommand):
+    help = '取消超时未支付的订单并恢复库存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='处理完当前过期订单后退出')
+        parser.add_argument('--interval', type=float, default=60, help='两轮检查之间的等待秒数')
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_EXPIRY_BATCH_SIZE, help='每个事务取消的订单数')
+        parser.add_argument('--max-batches', type=int, help='每轮最多处理的批数，默认不限')
+        parser.add_argument('--pause', type=float, default=0, help='两批之间的等待秒数，用于降低数据库压力')
+
+    def handle(self, *args, **options):
+        while True:
+            # 每轮固定截止时间，本轮执行期间新过期的订单留到下一轮
+            cutoff = pending_order_cutoff()
+            expired = batches = 0
+            while options['max_batches'] is None or batches < options['max_batches']:
+                started = time.monotonic()
+                order_ids = expire_order_batch(cutoff, options['batch_size'])
+                if not order_ids:
+                    break
+                expired += len(order_ids)
+                batches += 1
+                self.stdout.write(f'第 {batches} 批：取消 {len(order_ids)} 个订单，耗时 {time.monotonic() - started:.2f}s')
+                if options['pause']:
+                    time.sleep(options['pause'])
+
+            if expired or options['once']:
+                self.stdout.write(self.style.SUCCESS(f'共取消 {expired} 个过期订单（创建于 {timezone.localtime(cutoff):%Y-%m-%d %H:%M:%S} 之前）'))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+"""
+导出商品目录为 CSV / JSONL（每行一个 SKU），导出的文件可直接用 import_catalog 导入
+用法:
+    python manage.py export_catalog catalog.csv
+    python manage.py export_catalog catalog.jsonl
+    python manage.py export_catalog - --format jsonl > catalog.jsonl
+"""
+import sys
+
+from django.core.management.base import BaseCommand
+
+from shopping.catalog_io import CATALOG_FORMATS, detect_format, export_catalog
+
+
+class Command(BaseCommand):
+    help = '导出商品目录（SPU / SKU / 属性 / 库存 / 价格）为 CSV 或 JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='输出文件路径，- 表示输出到标准输出')
+        parser.add_argument('--format', choices=CATALOG_FORMATS, help='文件格式，默认按扩展名判断')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        if path == '-':
+            for chunk in export_catalog(file_format):
+                sys.stdout.write(chunk)
+            return
+
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            for chunk in export_catalog(file_format):
+                file.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f'已导出到 {path}'))
@@ -0,0 +1,45 @@
+"""
+从 CSV / JSONL 文件批量导入商品目录（SPU / SKU / 属性 / 库存 / 价格），按 sku_code 更新或创建
+用法:
+    python manage.py import_catalog catalog.csv
+    python manage.py import_catalog catalog.jsonl --batch-size 5000
+    cat catalog.jsonl | python manage.py import_catalog - --format jsonl
+文件格式见 shopping/catalog_io.py，可先用 export_catalog 导出作为模板。
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shopping.catalog_io import CATALOG_FORMATS, detect_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = '从 CSV / JSONL 文件批量导入商品目录，按 sku_code 更新或创建 SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='文件路径，- 表示从标准输入读取')
+        parser.add_argument('--format', choices=CATALOG_FORMATS, help='文件格式，默认按扩展名判断')
+        parser.add_argument('--batch-size', type=int, default=None, help='每个事务写入的行数')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        if options['batch_size'] is not None and options['batch_size'] <= 0:
+            raise CommandError('--batch-size 必须大于 0')
+
+        try:
+            file = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(f'无法打开文件: {exc}')
+        with file:
+            result = import_catalog(file, file_format, batch_size=options['batch_size'])
+
+        for line, message in result.errors:
+            self.stderr.write(f'第 {line} 行: {message}')
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'……另有 {result.error_count - len(result.errors)} 行错误未显示')
+        summary = (
+            f'共 {result.rows} 行：新建 {result.created}，更新 {result.updated}，'
+            f'未变化 {result.unchanged}，错误 {result.error_count}'
+        )
+        self.stdout.write(self.style.WARNING(summary) if result.error_count else self.style.SUCCESS(summary))
@@ -0,0 +1,16 @@
+"""
+按订单表重建订单状态汇总（OrderStatusStat）
+用法: python manage.py rebuild_order_stats
+"""
+from django.core.management.base import BaseCommand
+
+from shopping.order_stats import rebuild_order_status_stats
+
+
+class Command(BaseCommand):
+    help = '根据 Order 表重建各状态的订单数和金额汇总'
+
+    def handle(self, *args, **options):
+        counts = rebuild_order_status_stats()
+        summary = ', '.join(f'{status}={count}' for status, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'订单状态汇总重建完成：{summary}'))
@@ -0,0 +1,18 @@
+"""
+全量重建 SPU 评价统计
+用法: python manage.py rebuild_review_stats [--batch-size 1000]
+"""
+from django.core.management.base import BaseCommand
+
+from shopping.review_stats import rebuild_review_stats
+
+
+class Command(BaseCommand):
+    help = '根据 ProductReview 和 OrderItemReview 全量重建 SPU 的评价数和平均评分'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批 bulk_update 的 SPU 数量')
+
+    def handle(self, *args, **options):
+        updated = rebuild_review_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'评价统计重建完成，更新 {updated} 个 SPU'))
@@ -0,0 +1,44 @@
+"""
+汇总每日销售数据（DailySales / DailySkuSales / DailyCategorySales）
+用法:
+    python manage.py rollup_sales                       # 只汇总有变化的日期（适合每隔几分钟由 cron 调用）
+    python manage.py rollup_sales --full                # 重新汇总所有有销售或退款的日期
+    python manage.py rollup_sales --since 2025-01-01    # 重新汇总指定日期之后（含）的数据
+汇总表为空时（首次运行）自动按 --full 处理。
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shopping.models import DailySales
+from shopping.sales_rollup import mark_all_sales_days_dirty, mark_sales_day_dirty, rollup_dirty_days
+
+
+class Command(BaseCommand):
+    help = '按天汇总订单销售和退款数据，默认只处理有变化的日期'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='重新汇总所有日期')
+        parser.add_argument('--since', help='重新汇总该日期（YYYY-MM-DD）至今天的数据')
+        parser.add_argument('--limit', type=int, default=None, help='本次最多处理的天数')
+
+    def handle(self, *args, **options):
+        if options['full'] or not DailySales.objects.exists():
+            marked = mark_all_sales_days_dirty()
+            self.stdout.write(f'已标记 {marked} 天待汇总')
+        if options['since']:
+            try:
+                day = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since 格式应为 YYYY-MM-DD')
+            today = timezone.localdate()
+            while day <= today:
+                mark_sales_day_dirty(day)
+                day += timedelta(days=1)
+
+        days = rollup_dirty_days(limit=options['limit'])
+        if days:
+            self.stdout.write(self.style.SUCCESS(f'汇总完成，共 {len(days)} 天（{days[0]} ~ {days[-1]}）'))
+        else:
+            self.stdout.write(self.style.SUCCESS('没有需要汇总的日期'))
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:09
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_review_stats(apps, schema_editor):
+    """根据已有评价初始化 SPU 的评价统计"""
+    ProductSPU = apps.get_model('shopping', 'ProductSPU')
+    stats = {}
+    for model_name in ('ProductReview', 'OrderItemReview'):
+        model = apps.get_model('shopping', model_name)
+        rows = model.objects.order_by().values('spu_id').annotate(count=Count('id'), total=Sum('rating'))
+        for row in rows:
+            count, total = stats.get(row['spu_id'], (0, 0))
+            stats[row['spu_id']] = (count + row['count'], total + (row['total'] or 0))
+
+    spus = list(ProductSPU.objects.filter(id__in=stats.keys()))
+    for spu in spus:
+        spu.review_count, spu.rating_total = stats[spu.id]
+        spu.rating_avg = (Decimal(spu.rating_total) / spu.review_count).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP
+        )
+    ProductSPU.objects.bulk_update(spus, ['review_count', 'rating_total', 'rating_avg'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0009_alter_order_payment_method'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productspu',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3, verbose_name='平均评分'),
+        ),
+        migrations.AddField(
+            model_name='productspu',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='评分总和'),
+        ),
+        migrations.AddField(
+            model_name='productspu',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='评价数'),
+        ),
+        migrations.AddIndex(
+            model_name='productspu',
+            index=models.Index(fields=['is_active', 'rating_avg'], name='shopping_pr_is_acti_14be1e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productspu',
+            index=models.Index(fields=['is_active', 'review_count'], name='shopping_pr_is_acti_34d426_idx'),
+        ),
+        migrations.RunPython(backfill_review_stats, migrations.RunPython.noop),
+    ]
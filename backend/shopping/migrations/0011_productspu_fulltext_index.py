@@ -0,0 +1,31 @@
+# 商品全文索引（仅 MySQL）
+
+from django.db import migrations
+
+
+def create_fulltext_index(apps, schema_editor):
+    """MySQL 下创建 ngram 分词的全文索引，其他数据库使用进程内倒排索引，无需建索引"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE `shopping_productspu` '
+        'ADD FULLTEXT INDEX `spu_fulltext_idx` (`name`, `description`, `brand`, `series`) '
+        'WITH PARSER ngram'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('ALTER TABLE `shopping_productspu` DROP INDEX `spu_fulltext_idx`')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0010_productspu_review_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0011_productspu_fulltext_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='shopping_or_user_id_1806f2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productspu',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='shopping_pr_is_acti_294fcf_idx'),
+        ),
+    ]
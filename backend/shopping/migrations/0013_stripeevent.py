@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0012_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True, verbose_name='Stripe 事件ID')),
+                ('event_type', models.CharField(max_length=100, verbose_name='事件类型')),
+                ('payload', models.JSONField(verbose_name='事件内容')),
+                ('status', models.CharField(choices=[('pending', '待处理'), ('processed', '已处理'), ('failed', '处理失败')], default='pending', max_length=20, verbose_name='处理状态')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='处理次数')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次处理时间')),
+                ('last_error', models.TextField(blank=True, verbose_name='最近一次错误')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='接收时间')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='处理完成时间')),
+            ],
+            options={
+                'verbose_name': 'Stripe 事件',
+                'verbose_name_plural': 'Stripe 事件',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='shopping_st_status_35d9ce_idx')],
+            },
+        ),
+    ]
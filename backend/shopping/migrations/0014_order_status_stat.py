@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:28
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_order_status_stats(apps, schema_editor):
+    """根据已有订单初始化订单状态汇总"""
+    Order = apps.get_model('shopping', 'Order')
+    OrderStatusStat = apps.get_model('shopping', 'OrderStatusStat')
+    rows = Order.objects.order_by().values('status').annotate(order_count=Count('id'), total_amount=Sum('total_amount'))
+    OrderStatusStat.objects.bulk_create([
+        OrderStatusStat(status=row['status'], order_count=row['order_count'], total_amount=row['total_amount'] or 0)
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0013_stripeevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusStat',
+            fields=[
+                ('status', models.CharField(choices=[('pending', '待支付'), ('paid', '已支付'), ('shipped', '已发货'), ('completed', '已完成'), ('cancelled', '已取消'), ('refunded', '已退款')], max_length=20, primary_key=True, serialize=False, verbose_name='订单状态')),
+                ('order_count', models.BigIntegerField(default=0, verbose_name='订单数')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='订单金额')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '订单状态汇总',
+                'verbose_name_plural': '订单状态汇总',
+            },
+        ),
+        migrations.RunPython(backfill_order_status_stats, migrations.RunPython.noop),
+    ]
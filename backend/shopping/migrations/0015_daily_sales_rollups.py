@@ -0,0 +1,106 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0014_order_status_stat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='订单数')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='销售件数')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='销售额')),
+                ('refund_count', models.PositiveIntegerField(default=0, verbose_name='退款订单数')),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='退款金额')),
+            ],
+            options={
+                'verbose_name': '每日分类销售汇总',
+                'verbose_name_plural': '每日分类销售汇总',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False, verbose_name='日期')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='订单数')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='销售件数')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='销售额')),
+                ('refund_count', models.PositiveIntegerField(default=0, verbose_name='退款数')),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='退款金额')),
+                ('is_dirty', models.BooleanField(db_index=True, default=True, verbose_name='待重新汇总')),
+                ('built_at', models.DateTimeField(blank=True, null=True, verbose_name='汇总时间')),
+            ],
+            options={
+                'verbose_name': '每日销售汇总',
+                'verbose_name_plural': '每日销售汇总',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySkuSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='订单数')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='销售件数')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='销售额')),
+                ('refund_count', models.PositiveIntegerField(default=0, verbose_name='退款订单数')),
+                ('refund_quantity', models.PositiveIntegerField(default=0, verbose_name='退款件数')),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='退款金额')),
+            ],
+            options={
+                'verbose_name': '每日SKU销售汇总',
+                'verbose_name_plural': '每日SKU销售汇总',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['paid_at'], name='shopping_or_paid_at_43a3d7_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailycategorysales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shopping.category', verbose_name='分类'),
+        ),
+        migrations.AddField(
+            model_name='dailyskusales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shopping.category', verbose_name='分类'),
+        ),
+        migrations.AddField(
+            model_name='dailyskusales',
+            name='sku',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shopping.productsku', verbose_name='SKU'),
+        ),
+        migrations.AddIndex(
+            model_name='dailycategorysales',
+            index=models.Index(fields=['category', 'date'], name='shopping_da_categor_f916af_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('date', 'category'), name='unique_daily_category_sales'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyskusales',
+            index=models.Index(fields=['sku', 'date'], name='shopping_da_sku_id_8cd494_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyskusales',
+            index=models.Index(fields=['category', 'date'], name='shopping_da_categor_c159fc_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyskusales',
+            constraint=models.UniqueConstraint(fields=('date', 'sku'), name='unique_daily_sku_sales'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0015_daily_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberBlock',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('purpose', models.CharField(max_length=20, verbose_name='用途')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='分配时间')),
+            ],
+            options={
+                'verbose_name': '订单号分配记录',
+                'verbose_name_plural': '订单号分配记录',
+            },
+        ),
+    ]
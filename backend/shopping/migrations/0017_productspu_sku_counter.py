@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+def backfill_sku_counter(apps, schema_editor):
+    """计数器从已有 SKU 编码（{spu_id}-{序号}）的最大序号开始，不足时取 SKU 数量"""
+    ProductSPU = apps.get_model('shopping', 'ProductSPU')
+    ProductSKU = apps.get_model('shopping', 'ProductSKU')
+    counters = {}
+    for spu_id, sku_code in ProductSKU.objects.values_list('spu_id', 'sku_code').iterator():
+        prefix, _, number = sku_code.rpartition('-')
+        counters.setdefault(spu_id, [0, 0])
+        counters[spu_id][1] += 1
+        if prefix == str(spu_id) and number.isdigit():
+            counters[spu_id][0] = max(counters[spu_id][0], int(number))
+
+    spus = list(ProductSPU.objects.filter(id__in=counters.keys()).only('id'))
+    for spu in spus:
+        spu.sku_counter = max(counters[spu.id])
+    ProductSPU.objects.bulk_update(spus, ['sku_counter'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0016_order_number_block'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productspu',
+            name='sku_counter',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='SKU编码计数'),
+        ),
+        migrations.RunPython(backfill_sku_counter, migrations.RunPython.noop),
+    ]
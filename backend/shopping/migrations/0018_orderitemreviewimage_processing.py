@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0017_productspu_sku_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitemreviewimage',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='处理次数'),
+        ),
+        migrations.AddField(
+            model_name='orderitemreviewimage',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='最近一次错误'),
+        ),
+        migrations.AddField(
+            model_name='orderitemreviewimage',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次处理时间'),
+        ),
+        migrations.AddField(
+            model_name='orderitemreviewimage',
+            name='status',
+            field=models.CharField(choices=[('pending', '待处理'), ('ready', '已处理'), ('failed', '处理失败')], default='ready', max_length=20, verbose_name='处理状态'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitemreviewimage',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='shopping_or_status_ae8d25_idx'),
+        ),
+    ]
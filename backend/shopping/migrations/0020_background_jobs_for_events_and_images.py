@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0019_order_status_created_at_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderitemreviewimage',
+            name='shopping_or_status_ae8d25_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='stripeevent',
+            name='shopping_st_status_35d9ce_idx',
+        ),
+        migrations.RemoveField(
+            model_name='orderitemreviewimage',
+            name='attempts',
+        ),
+        migrations.RemoveField(
+            model_name='orderitemreviewimage',
+            name='next_attempt_at',
+        ),
+        migrations.RemoveField(
+            model_name='stripeevent',
+            name='attempts',
+        ),
+        migrations.RemoveField(
+            model_name='stripeevent',
+            name='next_attempt_at',
+        ),
+        migrations.AlterField(
+            model_name='orderitemreviewimage',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='失败原因'),
+        ),
+        migrations.AlterField(
+            model_name='stripeevent',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='失败原因'),
+        ),
+    ]
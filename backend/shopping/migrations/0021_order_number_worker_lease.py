@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0020_background_jobs_for_events_and_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberWorker',
+            fields=[
+                ('worker_id', models.PositiveSmallIntegerField(primary_key=True, serialize=False, verbose_name='worker id')),
+                ('holder', models.CharField(max_length=100, verbose_name='持有进程')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='租约到期时间')),
+            ],
+            options={
+                'verbose_name': '订单号 worker id 租约',
+                'verbose_name_plural': '订单号 worker id 租约',
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_order_status_stats(apps, schema_editor):
+    """汇总表改为分片后按已有订单重建（每个状态写入分片 0）"""
+    Order = apps.get_model('shopping', 'Order')
+    OrderStatusStat = apps.get_model('shopping', 'OrderStatusStat')
+    rows = Order.objects.order_by().values('status').annotate(order_count=Count('id'), total_amount=Sum('total_amount'))
+    OrderStatusStat.objects.bulk_create([
+        OrderStatusStat(status=row['status'], order_count=row['order_count'], total_amount=row['total_amount'] or 0)
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0021_order_number_worker_lease'),
+    ]
+
+    operations = [
+        # 主键从 status 改为自增 id，汇总数据可以按订单表重建，直接重建表
+        migrations.DeleteModel(
+            name='OrderStatusStat',
+        ),
+        migrations.CreateModel(
+            name='OrderStatusStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', '待支付'), ('paid', '已支付'), ('shipped', '已发货'), ('completed', '已完成'), ('cancelled', '已取消'), ('refunded', '已退款')], max_length=20, verbose_name='订单状态')),
+                ('shard', models.PositiveSmallIntegerField(default=0, verbose_name='分片')),
+                ('order_count', models.BigIntegerField(default=0, verbose_name='订单数')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='订单金额')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '订单状态汇总',
+                'verbose_name_plural': '订单状态汇总',
+                'constraints': [models.UniqueConstraint(fields=('status', 'shard'), name='uniq_order_status_stat_shard')],
+            },
+        ),
+        migrations.RunPython(backfill_order_status_stats, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
 from mptt.models import MPTTModel, TreeForeignKey
+from mptt.signals import node_moved
 
 # 动态图片上传路径函数
 def product_image_upload_path(instance, filename):
@@ -45,6 +48,14 @@ class ProductSPU(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
+    # 评价统计（冗余字段，由评价信号增量维护，见 review_stats.py）
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="评价数")
+    rating_total = models.PositiveIntegerField(default=0, editable=False, verbose_name="评分总和")
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False, verbose_name="平均评分")
+
+    # 已分配的 SKU 编码序号（只增不减，删除 SKU 后编码也不会被重复使用，见 sku_codes.py）
+    sku_counter = models.PositiveIntegerField(default=0, editable=False, verbose_name="SKU编码计数")
+
     class Meta:
         verbose_name = "SPU"
         verbose_name_plural = "SPU"
@@ -52,8 +63,33 @@ class ProductSPU(models.Model):
             models.Index(fields=['category', 'is_active']),  # 优化按分类和状态查询
             models.Index(fields=['brand']),  
             models.Index(fields=['series']),  
+            models.Index(fields=['is_active', 'rating_avg']),  # 优化按评分排序
+            models.Index(fields=['is_active', 'review_count']),  # 优化按评价数排序
+            models.Index(fields=['is_active', 'created_at', 'id']),  # 游标分页 (created_at, id)
         ]
 
+    # 由 UPDATE ... F() 增量维护的字段（评价统计、SKU 编码序号）：普通 save() 不写回，
+    # 避免用实例加载时的旧值覆盖期间的并发更新（sku_counter 回退会导致 SKU 编码重复）
+    MAINTAINED_FIELDS = ('review_count', 'rating_total', 'rating_avg', 'sku_counter')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的搜索字段，保存时只有这些字段变化才使搜索索引失效
+        from .search import loaded_search_values
+        instance._loaded_search_values = loaded_search_values(instance)
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # 与 Django 默认行为一致，延迟加载（only / defer）的字段也不写回
+            skipped = set(self.MAINTAINED_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -79,9 +115,9 @@ class ProductSKU(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.sku_code:
-            # 获取当前 SPU 下已存在的 SKU 数量
-            count = ProductSKU.objects.filter(spu=self.spu).count() + 1
-            self.sku_code = f"{self.spu.id}-{count}"
+            # 从 SPU 的计数器原子分配编码，并发创建不会冲突
+            from .sku_codes import allocate_sku_codes
+            self.sku_code = allocate_sku_codes(self.spu_id)[0]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -269,6 +305,9 @@ class Order(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['order_number']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['user', 'created_at', 'id']),  # 用户订单列表游标分页
+            models.Index(fields=['paid_at']),  # 按支付日期汇总销售
+            models.Index(fields=['status', 'created_at']),  # 查找超时未支付的订单
         ]
     
     def __str__(self):
@@ -279,11 +318,18 @@ class Order(models.Model):
         """组合收货地址"""
         return f"{self.receiver_name} {self.receiver_phone} | {self.receiver_province}{self.receiver_city}{self.receiver_district} {self.receiver_address}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的状态和金额，保存时据此增量更新 OrderStatusStat
+        instance._loaded_stats = (instance.__dict__.get('status'), instance.__dict__.get('total_amount'))
+        return instance
+
     def save(self, *args, **kwargs):
-        # 自动生成订单号
+        # 自动生成订单号（生成方式见 order_numbers.py）
         if not self.order_number:
-            import time
-            self.order_number = f"ORD{int(time.time() * 1000)}{self.user.id:06d}"
+            from .order_numbers import next_order_number
+            self.order_number = next_order_number()
         super().save(*args, **kwargs)
 
 
@@ -393,9 +439,21 @@ def review_image_upload_path(instance, filename):
 
 
 class OrderItemReviewImage(models.Model):
-    """评价图片"""
+    """
+    评价图片
+    用户上传的图片先原样存入临时目录（status=pending），接口立即返回；
+    由后台任务 shopping.process_review_image 校验、缩放、去除 EXIF 后写入正式路径（status=ready）
+    """
+    STATUS_CHOICES = [
+        ('pending', '待处理'),
+        ('ready', '已处理'),
+        ('failed', '处理失败'),
+    ]
+
     review = models.ForeignKey(OrderItemReview, on_delete=models.CASCADE, related_name='review_images', verbose_name="关联评价")
     image = models.ImageField(upload_to=review_image_upload_path, verbose_name="图片")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ready', verbose_name="处理状态")
+    last_error = models.TextField(blank=True, verbose_name="失败原因")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="上传时间")
     
     class Meta:
@@ -406,3 +464,283 @@ class OrderItemReviewImage(models.Model):
     def __str__(self):
         return f"评价图片 - {self.review.id}"
 
+
+class OrderNumberBlock(models.Model):
+    """
+    订单号分配记录，只使用自增 id：数据库序列生成器每插入一行获得一段订单号（id * 段大小 起的连续号段）
+    事务回滚后自增 id 可能被再次分配，生成器只在插入提交后才继续使用号段中剩余的号码（见 order_numbers.py）
+    """
+    id = models.BigAutoField(primary_key=True)
+    purpose = models.CharField(max_length=20, verbose_name="用途")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="分配时间")
+
+    class Meta:
+        verbose_name = "订单号分配记录"
+        verbose_name_plural = "订单号分配记录"
+
+    def __str__(self):
+        return f"{self.purpose} #{self.id}"
+
+
+class OrderNumberWorker(models.Model):
+    """
+    Snowflake worker id 租约（每个 worker id 一行，最多 1024 行）
+    进程租用一个过期的 worker id（没有时新增一行），生成订单号时在过期前续期；
+    进程退出后不再续期，租约过期后由其他进程回收
+    """
+    worker_id = models.PositiveSmallIntegerField(primary_key=True, verbose_name="worker id")
+    holder = models.CharField(max_length=100, verbose_name="持有进程")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="租约到期时间")
+
+    class Meta:
+        verbose_name = "订单号 worker id 租约"
+        verbose_name_plural = "订单号 worker id 租约"
+
+    def __str__(self):
+        return f"worker {self.worker_id} - {self.holder}"
+
+
+class OrderStatusStat(models.Model):
+    """
+    订单状态汇总（每个状态分为 ORDER_STATS_SHARDS 个分片：订单数、订单金额）
+    订单创建、状态变化、删除时在同一事务内增量更新随机一个分片（见 order_stats.py），
+    并发下单不会都排队等待同一行的行锁；统计时按状态求和，耗时不随订单表增长；
+    数据偏差时用 rebuild_order_stats 命令重建
+    """
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES, verbose_name="订单状态")
+    shard = models.PositiveSmallIntegerField(default=0, verbose_name="分片")
+    order_count = models.BigIntegerField(default=0, verbose_name="订单数")
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="订单金额")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "订单状态汇总"
+        verbose_name_plural = "订单状态汇总"
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'shard'], name='uniq_order_status_stat_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_status_display()} #{self.shard}: {self.order_count}"
+
+
+class DailySales(models.Model):
+    """
+    每日销售汇总（按支付日期统计订单数、件数、金额，按退款处理日期统计退款）
+    is_dirty 表示当天数据有变化需要重新汇总，由订单 / 退款信号标记，rollup_sales 命令处理
+    """
+    date = models.DateField(primary_key=True, verbose_name="日期")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="订单数")
+    quantity = models.PositiveIntegerField(default=0, verbose_name="销售件数")
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="销售额")
+    refund_count = models.PositiveIntegerField(default=0, verbose_name="退款数")
+    refund_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="退款金额")
+    is_dirty = models.BooleanField(default=True, db_index=True, verbose_name="待重新汇总")
+    built_at = models.DateTimeField(null=True, blank=True, verbose_name="汇总时间")
+
+    class Meta:
+        verbose_name = "每日销售汇总"
+        verbose_name_plural = "每日销售汇总"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.date} 销售额 {self.amount}"
+
+
+class DailySkuSales(models.Model):
+    """每日 SKU 销售汇总，退款按订单中该 SKU 的小计计算"""
+    date = models.DateField(verbose_name="日期")
+    sku = models.ForeignKey(ProductSKU, on_delete=models.CASCADE, related_name='daily_sales', verbose_name="SKU")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', verbose_name="分类")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="订单数")
+    quantity = models.PositiveIntegerField(default=0, verbose_name="销售件数")
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="销售额")
+    refund_count = models.PositiveIntegerField(default=0, verbose_name="退款订单数")
+    refund_quantity = models.PositiveIntegerField(default=0, verbose_name="退款件数")
+    refund_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="退款金额")
+
+    class Meta:
+        verbose_name = "每日SKU销售汇总"
+        verbose_name_plural = "每日SKU销售汇总"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'sku'], name='unique_daily_sku_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['sku', 'date']),
+            models.Index(fields=['category', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.sku_id}"
+
+
+class DailyCategorySales(models.Model):
+    """每日分类销售汇总（SPU 直属分类，上级分类的数据在查询时按分类树合并）"""
+    date = models.DateField(verbose_name="日期")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales', verbose_name="分类")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="订单数")
+    quantity = models.PositiveIntegerField(default=0, verbose_name="销售件数")
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="销售额")
+    refund_count = models.PositiveIntegerField(default=0, verbose_name="退款订单数")
+    refund_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="退款金额")
+
+    class Meta:
+        verbose_name = "每日分类销售汇总"
+        verbose_name_plural = "每日分类销售汇总"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_category_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.category_id}"
+
+
+class StripeEvent(models.Model):
+    """
+    Stripe Webhook 事件记录
+    Webhook 只负责验签并写入本表后立即返回，由后台任务 shopping.process_stripe_event 处理；
+    event_id 唯一，Stripe 重试推送同一事件时不会重复处理
+    """
+    STATUS_CHOICES = [
+        ('pending', '待处理'),
+        ('processed', '已处理'),
+        ('failed', '处理失败'),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True, verbose_name="Stripe 事件ID")
+    event_type = models.CharField(max_length=100, verbose_name="事件类型")
+    payload = models.JSONField(verbose_name="事件内容")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="处理状态")
+    last_error = models.TextField(blank=True, verbose_name="失败原因")
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="接收时间")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="处理完成时间")
+
+    class Meta:
+        verbose_name = "Stripe 事件"
+        verbose_name_plural = "Stripe 事件"
+        ordering = ['-received_at']
+
+    def __str__(self):
+        return f"{self.event_type} - {self.event_id}"
+
+
+# ==================== 分类树快照失效 ====================
+# 分类新增、修改、删除、移动都会改变 MPTT 的 lft/rght 区间，需重建快照
+
+@receiver([post_save, post_delete, node_moved], sender=Category)
+def invalidate_category_tree_snapshot(sender, **kwargs):
+    from .category_tree import invalidate_category_tree
+    invalidate_category_tree()
+
+
+# ==================== SKU 矩阵缓存失效 ====================
+# SKU、SKU属性值、库存、商品图片、SPU属性变更时，使所属 SPU 的 SKU 矩阵缓存失效
+
+@receiver([post_save, post_delete], sender=ProductSPU)
+def invalidate_spu_sku_matrix(sender, instance, **kwargs):
+    from .sku_matrix import invalidate_sku_matrix
+    invalidate_sku_matrix(instance.id)
+
+
+# 搜索索引只在搜索字段变化时失效（上下架、评价统计等不影响索引），提交后再失效，避免其他进程按未提交的数据重建
+@receiver(post_save, sender=ProductSPU)
+def invalidate_spu_search_index(sender, instance, created, update_fields=None, **kwargs):
+    from .search import InvertedIndexSearchBackend, search_fields_changed
+    changed = search_fields_changed(instance, update_fields)  # 同时记录本次保存后的值
+    if created or changed:
+        transaction.on_commit(InvertedIndexSearchBackend.invalidate)
+
+
+@receiver(post_delete, sender=ProductSPU)
+def invalidate_deleted_spu_search_index(sender, instance, **kwargs):
+    from .search import InvertedIndexSearchBackend
+    transaction.on_commit(InvertedIndexSearchBackend.invalidate)
+
+
+@receiver([post_save, post_delete], sender=ProductSKU)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductSPUAttribute)
+def invalidate_related_sku_matrix(sender, instance, **kwargs):
+    from .sku_matrix import invalidate_sku_matrix
+    invalidate_sku_matrix(instance.spu_id)
+
+
+@receiver([post_save, post_delete], sender=ProductSKUAttributeValue)
+@receiver([post_save, post_delete], sender=Inventory)
+def invalidate_sku_child_sku_matrix(sender, instance, **kwargs):
+    from .sku_matrix import invalidate_sku_matrix
+    sku = ProductSKU.objects.filter(sku_code=instance.sku_id).only('spu_id').first()
+    if sku:
+        invalidate_sku_matrix(sku.spu_id)
+
+
+# ==================== 订单状态汇总 ====================
+# 订单创建、状态或金额变化、删除时增量更新 OrderStatusStat
+# 批量 queryset.update() 不触发信号，改状态请使用 order_stats.bulk_transition()
+
+@receiver([pre_save, pre_delete], sender=Order)
+def remember_order_status_stat(sender, instance, **kwargs):
+    from .order_stats import loaded_order_stats
+    if not instance._state.adding:
+        instance._previous_stats = loaded_order_stats(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_order_status_stat_on_save(sender, instance, created, **kwargs):
+    from .order_stats import apply_order_change
+    old = (None, None) if created else getattr(instance, '_previous_stats', (None, None))
+    apply_order_change(old, (instance.status, instance.total_amount))
+    instance._loaded_stats = (instance.status, instance.total_amount)
+
+
+@receiver(post_delete, sender=Order)
+def update_order_status_stat_on_delete(sender, instance, **kwargs):
+    from .order_stats import apply_order_change
+    apply_order_change(getattr(instance, '_previous_stats', (None, None)), (None, None))
+
+
+# ==================== 每日销售汇总 ====================
+# 订单支付、支付后状态变化、退款变化时把对应日期标记为待重新汇总
+
+@receiver(post_save, sender=Order)
+def mark_sales_day_on_order_save(sender, instance, created, **kwargs):
+    from .sales_rollup import mark_sales_day_dirty
+    old_status = None if created else getattr(instance, '_previous_stats', (None, None))[0]
+    if instance.paid_at and old_status != instance.status:
+        mark_sales_day_dirty(instance.paid_at)
+
+
+@receiver(post_delete, sender=Order)
+def mark_sales_day_on_order_delete(sender, instance, **kwargs):
+    from .sales_rollup import mark_sales_day_dirty
+    if instance.paid_at:
+        mark_sales_day_dirty(instance.paid_at)
+
+
+@receiver([post_save, post_delete], sender=RefundRequest)
+def mark_sales_day_on_refund_change(sender, instance, **kwargs):
+    from .sales_rollup import mark_sales_day_dirty
+    mark_sales_day_dirty(instance.processed_at or instance.created_at)
+
+
+# ==================== SPU 评价统计 ====================
+# 新增/删除评价时增量更新 SPU 的评价数和评分，修改评价时重新计算该 SPU
+
+@receiver(post_save, sender=ProductReview)
+@receiver(post_save, sender=OrderItemReview)
+def update_review_stats_on_save(sender, instance, created, **kwargs):
+    from .review_stats import apply_review_delta, recompute_review_stats
+    if created:
+        apply_review_delta(instance.spu_id, 1, instance.rating)
+    else:
+        recompute_review_stats([instance.spu_id])
+
+
+@receiver(post_delete, sender=ProductReview)
+@receiver(post_delete, sender=OrderItemReview)
+def update_review_stats_on_delete(sender, instance, **kwargs):
+    from .review_stats import apply_review_delta
+    apply_review_delta(instance.spu_id, -1, -instance.rating)
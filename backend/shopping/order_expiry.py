@@ -0,0 +1,43 @@
+"""
+未支付订单自动过期
+- 待支付（pending）超过 ORDER_PENDING_TTL 秒的订单自动取消，并恢复下单时扣减的库存
+- 按创建时间从早到晚分批处理，每批最多 ORDER_EXPIRY_BATCH_SIZE 个订单，一批一个事务：
+  锁定订单（SKIP LOCKED，正在支付或取消的订单留到下一轮）→ 批量改为 cancelled（同时更新状态汇总表）
+  → 按 SKU 汇总数量后一条 UPDATE 恢复库存
+  锁的持有时间只与批大小有关，积压再多也不会长时间锁表；已提交的批次不会重复处理，中断后重新运行即可继续
+- 查询使用 Order 的 (status, created_at) 索引
+- 由 manage.py expire_orders 定时运行
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import restore_orders_stock
+from .models import Order
+from .order_stats import transition_orders
+
+
+def pending_order_cutoff(now=None):
+    """早于该时间创建的待支付订单视为过期"""
+    return (now or timezone.now()) - timedelta(seconds=settings.ORDER_PENDING_TTL)
+
+
+def pending_order_expires_at(order):
+    """订单的过期时间"""
+    return order.created_at + timedelta(seconds=settings.ORDER_PENDING_TTL)
+
+
+def expire_order_batch(cutoff, batch_size):
+    """取消一批过期订单并恢复库存，返回取消的订单 id 列表"""
+    with transaction.atomic():
+        order_ids = transition_orders(
+            Order.objects.filter(created_at__lt=cutoff).order_by('created_at', 'id'),
+            'pending', 'cancelled',
+            limit=batch_size, skip_locked=True,
+        )
+        if order_ids:
+            restore_orders_stock(order_ids)
+    return order_ids
+
@@ -0,0 +1,267 @@
+"""
+订单号生成
+订单号格式为 ORD + 19 位十进制数字（左侧补零），数值单调递增，字符串顺序与数值顺序一致，
+新订单总是追加在 order_number 索引的末尾。通过 ORDER_NUMBER_GENERATOR 选择生成方式：
+
+- snowflake（默认）: 64 位 Snowflake id，不访问数据库
+      41 位毫秒时间戳（自 2024-01-01 起） | 10 位 worker id | 12 位序列号
+  worker id 取 ORDER_NUMBER_WORKER_ID；未配置时每个进程从 OrderNumberWorker 租用一个
+  （gunicorn 的各个 worker 进程 fork 后各自租用，互不相同）。租约有效期为 ORDER_NUMBER_WORKER_LEASE_TTL，
+  生成订单号时剩余不到一半就续期；进程退出后租约过期，worker id 由新进程回收，1024 个都在租期内时报错。
+  同一毫秒内序列号用完或系统时钟回拨时不等待，直接借用下一毫秒，保证进程内单调递增。
+- sequence: 数据库序列，每次从 OrderNumberBlock 插入一行取得一段连续号码（默认 100 个），
+  号码跨进程唯一，但不同进程交替使用各自的号段，整体只是大致按时间排序。
+
+订单号通常在下单事务中生成，号段和租约的写入会随事务回滚：回滚后自增 id 可能被再次分配（SQLite、MySQL 8 以前），
+租约也会失效。因此事务中分配的号段只用于本次生成的号码，剩余号码在事务提交后才使用；
+事务中取得或续期的租约在提交前不算生效，下次生成时重新检查。
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+ORDER_NUMBER_PREFIX = 'ORD'
+
+SNOWFLAKE_EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = WORKER_ID_BITS + SEQUENCE_BITS
+
+
+def format_order_number(number):
+    return f'{ORDER_NUMBER_PREFIX}{number:019d}'
+
+
+def _allocate_block(purpose):
+    """插入一行 OrderNumberBlock，返回数据库分配的自增 id"""
+    from .models import OrderNumberBlock
+    return OrderNumberBlock.objects.create(purpose=purpose).id
+
+
+def acquire_worker_id(holder, ttl):
+    """
+    为 holder 租用一个 worker id，返回 worker id
+    优先回收最早过期的租约（条件 UPDATE，并发时只有一个进程成功），没有过期的再新增一行，都在租期内时报错
+    """
+    from .models import OrderNumberWorker
+    # 被其他进程抢先的 worker id 不再尝试（可重复读事务中重新查询仍会看到旧数据）
+    taken, next_new = set(), 0
+    while True:
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=ttl)
+        expired = (
+            OrderNumberWorker.objects.filter(expires_at__lte=now).exclude(worker_id__in=taken)
+            .order_by('expires_at', 'worker_id').values_list('worker_id', flat=True).first()
+        )
+        if expired is not None:
+            claimed = OrderNumberWorker.objects.filter(worker_id=expired, expires_at__lte=now).update(
+                holder=holder, expires_at=expires_at,
+            )
+            if claimed:
+                return expired
+            taken.add(expired)
+            continue
+        last = OrderNumberWorker.objects.aggregate(last=Max('worker_id'))['last']
+        worker_id = max(next_new, 0 if last is None else last + 1)
+        if worker_id > MAX_WORKER_ID:
+            raise RuntimeError(f'{MAX_WORKER_ID + 1} 个 worker id 都在租期内，无法再分配')
+        try:
+            with transaction.atomic():
+                OrderNumberWorker.objects.create(worker_id=worker_id, holder=holder, expires_at=expires_at)
+        except IntegrityError:
+            next_new = worker_id + 1
+            continue
+        return worker_id
+
+
+def renew_worker_id(worker_id, holder, ttl):
+    """续期 holder 持有的租约，租约已被其他进程回收时返回 False"""
+    from .models import OrderNumberWorker
+    return OrderNumberWorker.objects.filter(worker_id=worker_id, holder=holder).update(
+        expires_at=timezone.now() + timedelta(seconds=ttl),
+    ) > 0
+
+
+class SnowflakeGenerator:
+    """
+    Snowflake id 生成器
+    进程内只在锁内做几次整数运算（锁没有竞争时开销可以忽略），不访问数据库；
+    (毫秒, 序列号) 被当作一个连续的 22 位计数器，序列号溢出时自然进位到下一毫秒
+    """
+
+    def __init__(self, worker_id, epoch_ms=SNOWFLAKE_EPOCH_MS, clock=time.time_ns):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker id 必须在 0 ~ {MAX_WORKER_ID} 之间')
+        self.worker_id = worker_id
+        self.epoch_ms = epoch_ms
+        self.clock = clock  # 返回纳秒时间戳
+        self._worker_bits = worker_id << SEQUENCE_BITS
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, count):
+        """
+        预留 count 个连续 (毫秒, 序列号)，返回第一个的 (毫秒, 序列号)
+        时间戳未前进（同一毫秒或时钟回拨）时沿用上次的时间戳，序列号用完则借用下一毫秒，不等待
+        """
+        now_ms = self.clock() // 1000000 - self.epoch_ms
+        with self._lock:
+            if now_ms > self._last_ms:
+                start_ms, start_sequence = now_ms, 0
+            else:
+                start_ms, start_sequence = self._last_ms, self._sequence + 1
+            end = (start_ms << SEQUENCE_BITS) + start_sequence + count - 1
+            self._last_ms, self._sequence = end >> SEQUENCE_BITS, end & MAX_SEQUENCE
+        return start_ms, start_sequence
+
+    def _current_worker_bits(self):
+        return self._worker_bits
+
+    def next_id(self):
+        worker_bits = self._current_worker_bits()
+        timestamp, sequence = self._reserve(1)
+        return (timestamp << TIMESTAMP_SHIFT) | worker_bits | sequence
+
+    def next_ids(self, count):
+        """一次生成 count 个递增的 id（只加锁一次，用于批量生成）"""
+        worker_bits = self._current_worker_bits()
+        timestamp, sequence = self._reserve(count)
+        slot = (timestamp << SEQUENCE_BITS) + sequence
+        return [
+            ((slot >> SEQUENCE_BITS) << TIMESTAMP_SHIFT) | worker_bits | (slot & MAX_SEQUENCE)
+            for slot in range(slot, slot + count)
+        ]
+
+    def next_order_number(self):
+        return format_order_number(self.next_id())
+
+
+class LeasedSnowflakeGenerator(SnowflakeGenerator):
+    """
+    worker id 从 OrderNumberWorker 租用的 Snowflake 生成器
+    租约剩余不到一半时在生成前续期（每个租期只访问一两次数据库），租约已被回收时重新租用一个 worker id；
+    续期在事务中执行时提交后才算生效，回滚后下次生成时再次续期
+    """
+
+    def __init__(self, ttl, holder=None, clock=time.time_ns, monotonic=time.monotonic):
+        self.ttl = ttl
+        self.holder = holder or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.monotonic = monotonic
+        self._renew_at = float('-inf')  # 下次需要续期的时刻（monotonic）
+        self._lease_lock = threading.Lock()
+        super().__init__(acquire_worker_id(self.holder, ttl), clock=clock)
+        self._confirm_lease(self.monotonic())
+
+    def _confirm_lease(self, renewed_at):
+        # 不在事务中时立即生效，否则在事务提交后生效
+        transaction.on_commit(lambda: setattr(self, '_renew_at', renewed_at + self.ttl / 2))
+
+    def _current_worker_bits(self):
+        if self.monotonic() >= self._renew_at:
+            with self._lease_lock:
+                if self.monotonic() >= self._renew_at:
+                    renewed_at = self.monotonic()
+                    if not renew_worker_id(self.worker_id, self.holder, self.ttl):
+                        self.worker_id = acquire_worker_id(self.holder, self.ttl)
+                        self._worker_bits = self.worker_id << SEQUENCE_BITS
+                    self._confirm_lease(renewed_at)
+        return self._worker_bits
+
+
+class SequenceGenerator:
+    """
+    数据库序列生成器，每 block_size 个号码插入一次 OrderNumberBlock
+    在事务中分配的号段提交前只用于本次生成的号码，提交后剩余号码才供后续使用，回滚的号段不会在进程内继续使用
+    """
+
+    def __init__(self, block_size=100):
+        if block_size < 1:
+            raise ValueError('号段大小必须大于 0')
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            if self._next < self._end:
+                number = self._next
+                self._next += 1
+                return number
+            block = _allocate_block('sequence')
+            number, end = block * self.block_size, (block + 1) * self.block_size
+            if not transaction.get_connection().in_atomic_block:
+                self._next, self._end = number + 1, end
+                return number
+        transaction.on_commit(lambda: self._adopt(number + 1, end))
+        return number
+
+    def _adopt(self, start, end):
+        """事务提交后使用号段中剩余的号码（当前号段还没用完时丢弃）"""
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = start, end
+
+    def next_order_number(self):
+        return format_order_number(self.next_id())
+
+
+def _create_snowflake_generator():
+    if settings.ORDER_NUMBER_WORKER_ID is None:
+        return LeasedSnowflakeGenerator(settings.ORDER_NUMBER_WORKER_LEASE_TTL)
+    return SnowflakeGenerator(settings.ORDER_NUMBER_WORKER_ID)
+
+
+def _create_sequence_generator():
+    return SequenceGenerator(block_size=settings.ORDER_NUMBER_SEQUENCE_BLOCK)
+
+
+GENERATORS = {
+    'snowflake': _create_snowflake_generator,
+    'sequence': _create_sequence_generator,
+}
+
+_generator_lock = threading.Lock()
+_state = {'generator': None}
+
+
+def _reset_after_fork():
+    # fork 出的子进程（如 gunicorn --preload 的 worker）不能沿用父进程的 worker id 和号段
+    global _generator_lock
+    _generator_lock = threading.Lock()
+    _state['generator'] = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_order_number_generator():
+    """当前进程的订单号生成器（首次调用时按 ORDER_NUMBER_GENERATOR 创建）"""
+    generator = _state['generator']
+    if generator is None:
+        with _generator_lock:
+            generator = _state['generator']
+            if generator is None:
+                try:
+                    factory = GENERATORS[settings.ORDER_NUMBER_GENERATOR]
+                except KeyError:
+                    raise ValueError(f'未知的订单号生成方式: {settings.ORDER_NUMBER_GENERATOR}') from None
+                generator = _state['generator'] = factory()
+    return generator
+
+
+def next_order_number():
+    """生成一个新订单号"""
+    return get_order_number_generator().next_order_number()
@@ -0,0 +1,202 @@
+"""
+管理后台订单 / 退款 / 评价统计
+- 订单按状态的数量和金额保存在 OrderStatusStat 汇总表中，订单变化时增量更新随机一个分片
+  （ORDER_STATS_SHARDS 个），并发事务很少争用同一行；
+  仪表盘读取汇总表（按状态求和，几十行数据）加上一次按 created_at 索引范围的今日订单计数
+- 汇总表为空时（如尚未初始化）退回单次条件聚合查询 Count(filter=Q(...))
+- 统计结果缓存 ORDER_STATS_CACHE_TIMEOUT 秒（设为 0 关闭），多个管理员同时刷新时只计算一次
+"""
+import random
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order, OrderItemReview, OrderStatusStat, RefundRequest
+
+ORDER_STATS_CACHE_KEY = 'shopping:order_stats'
+REFUND_STATS_CACHE_KEY = 'shopping:refund_stats'
+REVIEW_STATS_CACHE_KEY = 'shopping:review_stats'
+
+# 计入销售额的订单状态
+REVENUE_STATUSES = ('paid', 'shipped', 'completed')
+
+_ZERO_AMOUNT = Value(0, output_field=DecimalField(max_digits=16, decimal_places=2))
+
+
+def _cached(key, compute):
+    timeout = settings.ORDER_STATS_CACHE_TIMEOUT
+    if timeout <= 0:
+        return compute()
+    return cache.get_or_set(key, compute, timeout)
+
+
+def _today_start():
+    """当前时区今天 0 点，按范围过滤可以使用 created_at 索引（__date 查询无法使用）"""
+    return timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+
+
+# ==================== 汇总表维护 ====================
+
+def loaded_order_stats(order):
+    """返回订单当前在数据库中的 (status, total_amount)，优先使用加载时记录的值"""
+    loaded = getattr(order, '_loaded_stats', (None, None))
+    if None not in loaded:
+        return loaded
+    row = Order.objects.filter(pk=order.pk).values_list('status', 'total_amount').first()
+    return row or (None, None)
+
+
+def _apply_delta(status, count, amount, shard=None):
+    if not count and not amount:
+        return
+    if shard is None:
+        shard = random.randrange(settings.ORDER_STATS_SHARDS)
+    updated = OrderStatusStat.objects.filter(status=status, shard=shard).update(
+        order_count=F('order_count') + count,
+        total_amount=F('total_amount') + amount,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        OrderStatusStat.objects.get_or_create(status=status, shard=shard)
+        _apply_delta(status, count, amount, shard)
+
+
+def apply_order_change(old, new):
+    """
+    订单从 old 变为 new 时更新汇总表
+    old / new: (status, total_amount)，新建订单 old 为 (None, None)，删除订单 new 为 (None, None)
+    """
+    if old == new:
+        return
+    old_status, old_amount = old
+    new_status, new_amount = new
+    if old_status is not None:
+        _apply_delta(old_status, -1, -(old_amount or 0))
+    if new_status is not None:
+        _apply_delta(new_status, 1, new_amount or 0)
+
+
+def bulk_transition(queryset, from_status, to_status, **fields):
+    """
+    批量修改订单状态（代替 queryset.update(status=...)，同时更新汇总表）
+    只处理当前状态为 from_status 的订单，返回修改的订单数
+    """
+    return len(transition_orders(queryset, from_status, to_status, **fields))
+
+
+def transition_orders(queryset, from_status, to_status, limit=None, skip_locked=False, **fields):
+    """
+    同 bulk_transition，返回修改的订单 id 列表
+    from_status: 状态或状态元组（如退款时 ('paid', 'shipped')）
+    limit: 最多修改的订单数（按 queryset 的排序）；skip_locked: 跳过被其他事务锁定的订单
+    """
+    from_statuses = (from_status,) if isinstance(from_status, str) else tuple(from_status)
+    with transaction.atomic():
+        rows = queryset.filter(status__in=from_statuses).select_for_update(skip_locked=skip_locked).values_list(
+            'id', 'status', 'total_amount'
+        )
+        rows = list(rows[:limit] if limit else rows)
+        if not rows:
+            return []
+        order_ids = [order_id for order_id, _, _ in rows]
+        Order.objects.filter(id__in=order_ids).update(status=to_status, **fields)
+        for status in from_statuses:
+            amounts = [total_amount for _, row_status, total_amount in rows if row_status == status]
+            _apply_delta(status, -len(amounts), -sum(amounts))
+        _apply_delta(to_status, len(rows), sum(total_amount for _, _, total_amount in rows))
+    return order_ids
+
+
+def rebuild_order_status_stats():
+    """按订单表重建汇总表（一次 GROUP BY，每个状态写入分片 0），返回 {status: order_count}"""
+    rows = Order.objects.order_by().values('status').annotate(
+        order_count=Count('id'),
+        total_amount=Coalesce(Sum('total_amount'), _ZERO_AMOUNT),
+    )
+    counts = {status: (0, 0) for status, _ in Order.ORDER_STATUS_CHOICES}
+    for row in rows:
+        counts[row['status']] = (row['order_count'], row['total_amount'])
+
+    with transaction.atomic():
+        OrderStatusStat.objects.all().delete()
+        OrderStatusStat.objects.bulk_create([
+            OrderStatusStat(status=status, order_count=count, total_amount=amount)
+            for status, (count, amount) in counts.items()
+        ])
+    cache.delete(ORDER_STATS_CACHE_KEY)
+    return {status: count for status, (count, _) in counts.items()}
+
+
+# ==================== 统计查询 ====================
+
+def _status_totals_from_rollup():
+    rows = list(OrderStatusStat.objects.order_by().values('status').annotate(
+        count=Sum('order_count'), amount=Sum('total_amount'),
+    ).values_list('status', 'count', 'amount'))
+    if not rows:
+        return None
+    return {status: (count, amount) for status, count, amount in rows}
+
+
+def _status_totals_from_orders():
+    """单次条件聚合查询各状态的订单数和金额"""
+    aggregates = {}
+    for status, _ in Order.ORDER_STATUS_CHOICES:
+        aggregates[f'{status}_count'] = Count('id', filter=Q(status=status))
+        aggregates[f'{status}_amount'] = Coalesce(Sum('total_amount', filter=Q(status=status)), _ZERO_AMOUNT)
+    row = Order.objects.aggregate(**aggregates)
+    return {
+        status: (row[f'{status}_count'], row[f'{status}_amount'])
+        for status, _ in Order.ORDER_STATUS_CHOICES
+    }
+
+
+def compute_order_stats():
+    totals = _status_totals_from_rollup() or _status_totals_from_orders()
+
+    def count(status):
+        return totals.get(status, (0, 0))[0]
+
+    return {
+        'total_orders': sum(order_count for order_count, _ in totals.values()),
+        'pending_orders': count('pending'),
+        'paid_orders': count('paid'),
+        'shipped_orders': count('shipped'),
+        'completed_orders': count('completed'),
+        'cancelled_orders': count('cancelled'),
+        'today_orders': Order.objects.filter(created_at__gte=_today_start()).count(),
+        'total_amount': sum(totals.get(status, (0, 0))[1] for status in REVENUE_STATUSES),
+    }
+
+
+def compute_refund_stats():
+    aggregates = {'total': Count('id')}
+    for status, _ in RefundRequest.REFUND_STATUS_CHOICES:
+        aggregates[status] = Count('id', filter=Q(status=status))
+    # 页面上还展示“处理中”，该状态不在 choices 中，保持原有统计口径
+    aggregates.setdefault('processing', Count('id', filter=Q(status='processing')))
+    return RefundRequest.objects.aggregate(**aggregates)
+
+
+def compute_review_stats():
+    return {'total': OrderItemReview.objects.count()}
+
+
+def get_order_stats():
+    """订单管理页统计"""
+    return _cached(ORDER_STATS_CACHE_KEY, compute_order_stats)
+
+
+def get_refund_stats():
+    """退款管理页统计"""
+    return _cached(REFUND_STATS_CACHE_KEY, compute_refund_stats)
+
+
+def get_review_stats():
+    """评价管理页统计"""
+    return _cached(REVIEW_STATS_CACHE_KEY, compute_review_stats)
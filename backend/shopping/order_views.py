@@ -4,12 +4,17 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.db import transaction
 from django.views.decorators.http import require_http_methods
-from django.db.models import Q, Count, Sum
+from django.db.models import Q
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
 import json
 
-from .models import Order, OrderItem, RefundRequest, OrderItemReview
+from .models import Order, OrderItem, RefundRequest, OrderItemReview, DailySales
+from .refunds import approve_refunds
+from .tasks import restore_orders_stock
+from .order_stats import bulk_transition, get_order_stats, get_refund_stats, get_review_stats
+from .sales_rollup import sales_report
+from .category_tree import get_category_tree
 from user.models import UserProduct
 
 
@@ -54,18 +59,7 @@ def order_management(request):
             orders = orders.filter(created_at__date__gte=month_ago)
     
     # 统计数据
-    stats = {
-        'total_orders': Order.objects.count(),
-        'pending_orders': Order.objects.filter(status='pending').count(),
-        'paid_orders': Order.objects.filter(status='paid').count(),
-        'shipped_orders': Order.objects.filter(status='shipped').count(),
-        'completed_orders': Order.objects.filter(status='completed').count(),
-        'cancelled_orders': Order.objects.filter(status='cancelled').count(),
-        'today_orders': Order.objects.filter(created_at__date=timezone.now().date()).count(),
-        'total_amount': Order.objects.filter(status__in=['paid', 'shipped', 'completed']).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0,
-    }
+    stats = get_order_stats()
     
     context = {
         'orders': orders,
@@ -193,9 +187,9 @@ def order_batch_ship(request):
     
     try:
         with transaction.atomic():
-            orders = Order.objects.filter(id__in=order_ids, status='paid')
-            count = orders.count()
-            orders.update(status='shipped', shipped_at=timezone.now())
+            count = bulk_transition(
+                Order.objects.filter(id__in=order_ids), 'paid', 'shipped', shipped_at=timezone.now()
+            )
         
         return JsonResponse({
             'success': True,
@@ -232,14 +226,7 @@ def refund_management(request):
         )
     
     # 统计
-    stats = {
-        'total': RefundRequest.objects.count(),
-        'pending': RefundRequest.objects.filter(status='pending').count(),
-        'approved': RefundRequest.objects.filter(status='approved').count(),
-        'rejected': RefundRequest.objects.filter(status='rejected').count(),
-        'processing': RefundRequest.objects.filter(status='processing').count(),
-        'completed': RefundRequest.objects.filter(status='completed').count(),
-    }
+    stats = get_refund_stats()
     
     context = {
         'refunds': refunds,
@@ -285,25 +272,12 @@ def refund_approve(request, refund_id):
     admin_note = request.POST.get('admin_note', '')
     
     try:
-        with transaction.atomic():
-            # 更新退款状态
-            refund.status = 'approved'
-            refund.admin_note = admin_note
-            refund.processed_at = timezone.now()
-            refund.save()
-            
-            # 更新订单状态为已取消
-            order = refund.order
-            order.status = 'cancelled'
-            order.save()
-            
-            # 恢复库存
-            for item in order.items.all():
-                inventory = item.sku.inventory
-                inventory.quantity += item.quantity  # 使用 quantity 而不是 stock
-                inventory.save()
-            
+        # 更新退款状态，订单改为已取消并恢复库存
+        refund_ids, _ = approve_refunds(RefundRequest.objects.filter(id=refund.id), admin_remark=admin_note)
+        if refund_ids:
             messages.success(request, '退款已批准，订单已取消，库存已恢复')
+        else:
+            messages.error(request, '只能批准待审核的退款申请')
     except Exception as e:
         messages.error(request, f'批准退款失败：{str(e)}')
     
@@ -328,7 +302,7 @@ def refund_reject(request, refund_id):
         return redirect('shopping_manage:refund_detail', refund_id=refund_id)
     
     refund.status = 'rejected'
-    refund.admin_note = admin_note
+    refund.admin_remark = admin_note
     refund.processed_at = timezone.now()
     refund.save()
     
@@ -348,25 +322,18 @@ def refund_batch_approve(request):
     
     try:
         with transaction.atomic():
-            refunds = RefundRequest.objects.filter(id__in=refund_ids, status='pending')
-            count = 0
+            # 批量更新退款和订单状态（订单改为已取消，与单个批准一致）
+            approved_ids, order_ids = approve_refunds(
+                RefundRequest.objects.filter(id__in=refund_ids), restore_stock=False,
+            )
             
-            for refund in refunds:
-                # 更新退款状态
-                refund.status = 'approved'
-                refund.save()
-                
-                # 恢复库存
-                for item in refund.order.items.all():
-                    inventory = item.sku.inventory
-                    inventory.stock += item.quantity
-                    inventory.save()
-                
-                count += 1
+            # 库存由后台任务恢复，任务随本事务提交
+            if order_ids:
+                restore_orders_stock.enqueue(order_ids=order_ids)
         
         return JsonResponse({
             'success': True,
-            'message': f'成功批准 {count} 个退款申请'
+            'message': f'成功批准 {len(approved_ids)} 个退款申请'
         })
     except Exception as e:
         return JsonResponse({
@@ -397,9 +364,7 @@ def review_management(request):
         )
     
     # 统计
-    stats = {
-        'total': OrderItemReview.objects.count(),
-    }
+    stats = get_review_stats()
     
     context = {
         'reviews': reviews,
@@ -434,3 +399,64 @@ def review_delete(request, review_id):
             'success': False,
             'message': f'删除失败：{str(e)}'
         })
+
+
+# ==================== 销售分析 ====================
+
+SALES_REPORT_DEFAULT_DAYS = 30
+SALES_REPORT_MAX_DAYS = 366
+
+
+def _parse_report_range(request):
+    """解析 start / end 参数（YYYY-MM-DD），默认最近 30 天，返回 (start, end) 或错误信息"""
+    today = timezone.localdate()
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+        start = (
+            date.fromisoformat(request.GET['start']) if request.GET.get('start')
+            else end - timedelta(days=SALES_REPORT_DEFAULT_DAYS - 1)
+        )
+    except ValueError:
+        return None, '日期格式应为 YYYY-MM-DD'
+    if start > end:
+        return None, '开始日期不能晚于结束日期'
+    if (end - start).days >= SALES_REPORT_MAX_DAYS:
+        return None, f'日期范围不能超过 {SALES_REPORT_MAX_DAYS} 天'
+    return (start, end), None
+
+
+@login_required
+@user_passes_test(is_staff)
+def sales_analytics(request):
+    """销售分析页面（图表数据由 sales_analytics_data 接口提供）"""
+    categories = sorted(get_category_tree().values(), key=lambda node: (node.tree_id, node.lft))
+    last_built = DailySales.objects.filter(built_at__isnull=False).order_by('-built_at').values_list(
+        'built_at', flat=True
+    ).first()
+    context = {
+        'categories': categories,
+        'last_built': last_built,
+        'pending_days': DailySales.objects.filter(is_dirty=True).count(),
+    }
+    return render(request, 'shopping/sales_analytics.html', context)
+
+
+@login_required
+@user_passes_test(is_staff)
+def sales_analytics_data(request):
+    """
+    销售分析数据（只读取每日汇总表）
+    参数: start / end（YYYY-MM-DD，默认最近 30 天）、category（分类 id，含子分类）、top（热销 SKU 数量，默认 10）
+    """
+    date_range, error = _parse_report_range(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    try:
+        top = min(max(int(request.GET.get('top', 10)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'top 必须是整数'}, status=400)
+
+    report = sales_report(*date_range, category_id=request.GET.get('category') or None, top=top)
+    if report is None:
+        return JsonResponse({'error': '分类不存在'}, status=404)
+    return JsonResponse(report)
@@ -0,0 +1,26 @@
+"""
+商品拥有权发放
+订单支付 / 确认收货后，把订单中的 SKU 加入用户拥有列表（UserProduct）。
+按 sku_id 去重后用一条 bulk_create(ignore_conflicts=True) 写入，
+已拥有的 (user, sku) 由唯一约束忽略，不再逐条 get_or_create。
+"""
+from django.utils import timezone
+
+
+def grant_skus(user, sku_ids):
+    """把一组 SKU 加入用户拥有列表，已拥有的跳过"""
+    from user.models import UserProduct
+
+    sku_ids = list(dict.fromkeys(sku_ids))
+    if not sku_ids:
+        return
+    now = timezone.now()
+    UserProduct.objects.bulk_create(
+        [UserProduct(user_id=getattr(user, 'pk', user), sku_id=sku_id, purchased_at=now) for sku_id in sku_ids],
+        ignore_conflicts=True,
+    )
+
+
+def grant_order_products(order):
+    """把订单中的全部 SKU 加入下单用户的拥有列表（只读取 sku_id，不加载 SKU 对象）"""
+    grant_skus(order.user_id, order.items.values_list('sku_id', flat=True))
@@ -1,10 +1,166 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPaginationMixin:
+    """
+    可选的游标（keyset）分页模式，混入 PageNumberPagination 子类使用
+    客户端传 ?pagination=cursor 开启，之后沿响应中的 next 链接翻页（?cursor=...）。
+    按 (created_at, id) 等复合键排序，下一页条件为
+        created_at < 上一页末条 OR (created_at = 上一页末条 AND id < 上一页末条 id)
+    可直接利用对应的联合索引，不执行 COUNT(*)，翻到多深的页耗时都一样。
+    排序键取查询集当前的 order_by（OrderingFilter 的 ?ordering=、搜索相关度等），
+    查询集未显式排序时使用视图的 cursor_ordering 属性或默认值；末尾自动补上 id 保证唯一。
+    排序键只能是非空字段或注解，否则返回 400。
+    """
+    cursor_mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-created_at', '-id')
+    invalid_cursor_message = '无效的游标'
+    invalid_ordering_message = '游标分页不支持按 {field} 排序'
+
+    def is_cursor_mode(self, request):
+        return (
+            request.query_params.get(self.cursor_mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def get_cursor_ordering(self, queryset, view):
+        """当前排序 + 唯一的 id，保证与普通分页模式顺序一致且翻页不重复"""
+        ordering = tuple(queryset.query.order_by) or tuple(getattr(view, 'cursor_ordering', None) or self.cursor_ordering)
+        ordering = tuple(self.check_ordering(queryset, item) for item in ordering)
+        fields = [item.lstrip('-') for item in ordering]
+        if 'id' in fields:
+            # id 之后的排序键不影响结果
+            return ordering[:fields.index('id') + 1]
+        return ordering + ('-id' if ordering and ordering[-1].startswith('-') else 'id',)
+
+    def check_ordering(self, queryset, item):
+        """排序键必须是模型的非空字段或查询集的注解（不支持随机排序、跨表字段和表达式）"""
+        if not isinstance(item, str) or item == '?' or '__' in item:
+            raise ParseError(self.invalid_ordering_message.format(field=item))
+        name = item.lstrip('-')
+        if name == 'pk':
+            return item.replace('pk', 'id')
+        if name in queryset.query.annotations:
+            return item
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        # 外键按关联模型的排序展开为多列，只支持 xxx_id
+        if field is None or not field.concrete or field.null or (field.is_relation and name != field.attname):
+            raise ParseError(self.invalid_ordering_message.format(field=name))
+        return item
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_mode(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = self.get_cursor_ordering(queryset, view)
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset)
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(position))
+
+        # 多取一条用于判断是否还有下一页
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        self.next_position = self.get_position(self.page[-1]) if self.has_next else None
+        return self.page
 
+    def position_filter(self, position):
+        """构建 "排在 position 之后" 的条件（多列字典序比较）"""
+        condition = Q()
+        equal = Q()
+        for ordering, value in zip(self.ordering, position):
+            field = ordering.lstrip('-')
+            lookup = 'lt' if ordering.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
 
-class ProductPagination(PageNumberPagination):
+    def get_position(self, instance):
+        return [getattr(instance, ordering.lstrip('-')) for ordering in self.ordering]
+
+    @staticmethod
+    def encode_value(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        # Decimal 转为字符串保留精度，解码时由字段的 to_python 还原
+        return str(value) if isinstance(value, Decimal) else value
+
+    def encode_cursor(self, position):
+        raw = json.dumps([self.encode_value(value) for value in position])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.get_ordering_field(queryset, ordering.lstrip('-')).to_python(value)
+                for ordering, value in zip(self.ordering, values)
+            ]
+        except (binascii.Error, UnicodeError, ValueError, TypeError, ValidationError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+    @staticmethod
+    def get_ordering_field(queryset, name):
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.cursor_mode_query_param, 'cursor')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class ProductPagination(KeysetPaginationMixin, PageNumberPagination):
     """
     商品分页类，默认每页20个SPU
     """
     page_size = 20  # 默认每页20条
     page_size_query_param = 'page_size'  # 允许客户端通过 page_size 参数指定
     max_page_size = 100  # 最大每页100条
+
+
+class OrderPagination(KeysetPaginationMixin, PageNumberPagination):
+    """
+    订单分页类，每页10条（与全局默认分页一致），支持游标分页模式
+    """
+    page_size = 10
@@ -0,0 +1,49 @@
+"""
+退款审核
+approve_refunds: 同意一批退款申请（单个批准、批量批准、Admin 操作共用），语句数与申请数、订单行数无关：
+  锁定待处理的申请 → 一条 UPDATE 改为 approved → 订单批量改状态（order_stats.transition_orders，同时更新汇总表）
+  → 按 SKU 汇总数量后一条 UPDATE 恢复库存（inventory.restore_orders_stock）
+queryset.update() 不触发信号，由本模块把处理日期标记为待重新汇总（见 sales_rollup）
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import restore_orders_stock
+from .models import Order, RefundRequest
+from .order_stats import transition_orders
+from .sales_rollup import mark_sales_day_dirty
+
+# 可以退款的订单状态（与申请退款接口一致）
+REFUNDABLE_ORDER_STATUSES = ('paid', 'shipped')
+
+
+def approve_refunds(refunds, order_status='cancelled', admin_remark=None, restore_stock=True):
+    """
+    同意 refunds（RefundRequest 查询集）中待处理的退款申请，返回 (退款申请 id 列表, 状态被修改的订单 id 列表)
+    order_status: 订单改为的状态；admin_remark: 不为 None 时写入管理员备注
+    restore_stock: 为 False 时不恢复库存，由调用方处理（如放入后台任务）；
+    只恢复本次状态被修改的订单，已取消的订单不会重复恢复
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            refunds.filter(status='pending').select_for_update().order_by('id').values_list('id', 'order_id')
+        )
+        if not rows:
+            return [], []
+        refund_ids = [refund_id for refund_id, _ in rows]
+        fields = {'status': 'approved', 'processed_at': now}
+        if admin_remark is not None:
+            fields['admin_remark'] = admin_remark
+        RefundRequest.objects.filter(id__in=refund_ids).update(**fields)
+
+        order_ids = transition_orders(
+            Order.objects.filter(id__in=[order_id for _, order_id in rows]),
+            REFUNDABLE_ORDER_STATUSES, order_status,
+        )
+        if order_ids and restore_stock:
+            restore_orders_stock(order_ids)
+
+        # 退款按处理日期汇总；销售按支付日期汇总且与订单状态无关，不需要标记
+        mark_sales_day_dirty(now)
+    return refund_ids, order_ids
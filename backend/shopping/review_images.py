@@ -0,0 +1,122 @@
+"""
+评价图片的暂存与后台处理
+- stage_review_image: 评价接口中调用，只把上传文件原样存入临时目录并创建 pending 记录，不解码图片；
+  超过 FILE_UPLOAD_MAX_MEMORY_SIZE 的上传已由 Django 写入临时文件，存储时直接移动，
+  请求耗时与图片大小、数量基本无关
+- process_staged_image: 后台任务 shopping.process_review_image 的处理函数（见 tasks.py），
+  校验像素数、按 EXIF 方向旋转、缩放到 REVIEW_IMAGE_MAX_DIMENSION 以内并重新编码（不保留 EXIF）后写入正式路径；
+  无法解码或超出限制的图片直接标记为 failed，存储等临时错误由任务队列按指数退避重试，
+  超过最大次数后 mark_image_failed 标记为 failed
+"""
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from backend.thumbnails import DerivativeError, encode_image, open_image
+from .models import OrderItemReviewImage
+from .tasks import process_review_image as process_review_image_task
+
+# 待处理图片的临时目录
+STAGING_DIR = '_uploads/reviews'
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+
+class ReviewImageRejected(Exception):
+    """图片无法解码或超出限制，不再重试"""
+
+
+def stage_review_image(review, file):
+    """保存上传文件到临时目录，创建待处理的评价图片记录，并添加后台处理任务（随调用方的事务提交）"""
+    ext = posixpath.splitext(file.name)[1].lower()
+    name = default_storage.save(posixpath.join(STAGING_DIR, f'{uuid.uuid4().hex}{ext}'), file)
+    review_image = OrderItemReviewImage.objects.create(review=review, image=name, status='pending')
+    process_review_image_task.enqueue(image_id=review_image.id)
+    return review_image
+
+
+# ==================== 后台处理 ====================
+
+def convert_review_image(file):
+    """
+    校验并重新编码图片，返回 (内容, 扩展名)
+    带透明通道的保存为 PNG，其余统一保存为 JPEG；重新编码时不写入 EXIF（拍摄位置、设备等信息）
+    """
+    from PIL import Image
+
+    try:
+        # 只读取文件头获取尺寸，超限的图片不解码
+        with Image.open(file) as probe:
+            width, height = probe.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ReviewImageRejected('无法识别的图片')
+    if width * height > settings.REVIEW_IMAGE_MAX_PIXELS:
+        raise ReviewImageRejected(f'图片像素过多: {width}x{height}')
+
+    file.seek(0)
+    max_dimension = settings.REVIEW_IMAGE_MAX_DIMENSION
+    try:
+        image = open_image(file)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        ext = '.png' if has_alpha else '.jpg'
+        return encode_image(image, 'original', ext), ext
+    except DerivativeError as exc:
+        raise ReviewImageRejected(str(exc))
+
+
+def process_review_image(review_image):
+    """处理一张待处理图片，写入正式路径（不保存记录）"""
+    with default_storage.open(review_image.image.name, 'rb') as file:
+        content, ext = convert_review_image(file)
+    # 文件名由 review_image_upload_path 生成
+    review_image.image.save(f'review{ext}', ContentFile(content), save=False)
+    review_image.status = 'ready'
+    return f'已处理: {review_image.image.name}'
+
+
+def _discard_staged(name):
+    """事务提交后删除临时文件，回滚时保留（图片仍为待处理）"""
+    transaction.on_commit(lambda: default_storage.delete(name))
+
+
+def _lock_pending(image_id):
+    return OrderItemReviewImage.objects.select_for_update().filter(id=image_id, status='pending').first()
+
+
+def process_staged_image(image_id):
+    """
+    处理一张待处理图片，返回处理结果；已处理或已删除的图片直接跳过
+    在任务的事务中执行，存储等临时错误抛出异常，随任务一起回滚，图片保持 pending 等待重试
+    """
+    review_image = _lock_pending(image_id)
+    if review_image is None:
+        return None
+    staged = review_image.image.name
+    try:
+        message = process_review_image(review_image)
+    except ReviewImageRejected as exc:
+        # 无法解码或超出限制，重试也不会成功
+        message = str(exc)
+        review_image.status = 'failed'
+        review_image.image = ''
+        review_image.last_error = message
+    review_image.save()
+    _discard_staged(staged)
+    return message
+
+
+def mark_image_failed(image_id, error):
+    """任务超过最大次数后调用，图片标记为 failed 并删除临时文件"""
+    review_image = _lock_pending(image_id)
+    if review_image is None:
+        return
+    staged = review_image.image.name
+    review_image.status = 'failed'
+    review_image.image = ''
+    review_image.last_error = error
+    review_image.save(update_fields=['status', 'image', 'last_error'])
+    _discard_staged(staged)
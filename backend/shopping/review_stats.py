@@ -0,0 +1,108 @@
+"""
+SPU 评价统计（评价数、评分总和、平均分）
+ProductReview 和 OrderItemReview 的评分都计入 ProductSPU 上的冗余字段，
+新增/删除评价时通过信号增量更新（见 models.py），
+全量重建使用 manage.py rebuild_review_stats。
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import (
+    Case, Count, DecimalField, Exists, ExpressionWrapper, F, FloatField, OuterRef, Sum, Value, When
+)
+from django.db.models.functions import Cast
+
+from .models import OrderItemReview, ProductReview, ProductSPU
+
+# 参与统计的评价模型
+REVIEW_MODELS = (ProductReview, OrderItemReview)
+
+
+def _average(rating_total, review_count):
+    """计算平均分，保留两位小数"""
+    if not review_count:
+        return Decimal('0.00')
+    return (Decimal(rating_total) / review_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _update_average(spu_ids):
+    """根据评价数和评分总和，在数据库中重新计算平均分"""
+    ProductSPU.objects.filter(id__in=spu_ids).update(
+        rating_avg=Case(
+            When(review_count=0, then=Value(Decimal('0.00'))),
+            default=ExpressionWrapper(
+                Cast('rating_total', FloatField()) / F('review_count'),
+                output_field=DecimalField(max_digits=3, decimal_places=2),
+            ),
+            output_field=DecimalField(max_digits=3, decimal_places=2),
+        )
+    )
+
+
+def apply_review_delta(spu_id, count_delta, rating_delta):
+    """增量更新单个 SPU 的评价统计（新增评价传 +1，删除评价传 -1）"""
+    ProductSPU.objects.filter(id=spu_id).update(
+        review_count=F('review_count') + count_delta,
+        rating_total=F('rating_total') + rating_delta,
+    )
+    _update_average([spu_id])
+
+
+def aggregate_review_stats(spu_ids=None):
+    """
+    按 SPU 分组汇总所有评价表，返回 {spu_id: (review_count, rating_total)}
+    每张评价表只执行一次 GROUP BY 查询
+    """
+    stats = {}
+    for model in REVIEW_MODELS:
+        queryset = model.objects.all()
+        if spu_ids is not None:
+            queryset = queryset.filter(spu_id__in=spu_ids)
+        rows = queryset.order_by().values('spu_id').annotate(count=Count('id'), total=Sum('rating'))
+        for row in rows:
+            count, total = stats.get(row['spu_id'], (0, 0))
+            stats[row['spu_id']] = (count + row['count'], total + (row['total'] or 0))
+    return stats
+
+
+def recompute_review_stats(spu_ids):
+    """重新计算指定 SPU 的评价统计（评价内容或评分被修改时调用）"""
+    stats = aggregate_review_stats(spu_ids)
+    spus = list(ProductSPU.objects.filter(id__in=spu_ids).only('id'))
+    for spu in spus:
+        spu.review_count, spu.rating_total = stats.get(spu.id, (0, 0))
+        spu.rating_avg = _average(spu.rating_total, spu.review_count)
+    ProductSPU.objects.bulk_update(spus, ['review_count', 'rating_total', 'rating_avg'])
+
+
+def rebuild_review_stats(batch_size=1000):
+    """
+    全量重建所有 SPU 的评价统计
+    先将有变化的 SPU 分批 bulk_update，再把已没有任何评价的 SPU 清零
+    返回更新的 SPU 数量
+    """
+    stats = aggregate_review_stats()
+    updated = 0
+
+    spu_ids = sorted(stats)
+    for start in range(0, len(spu_ids), batch_size):
+        batch_ids = spu_ids[start:start + batch_size]
+        spus = list(ProductSPU.objects.filter(id__in=batch_ids).only(
+            'id', 'review_count', 'rating_total', 'rating_avg'
+        ))
+        changed = []
+        for spu in spus:
+            review_count, rating_total = stats[spu.id]
+            rating_avg = _average(rating_total, review_count)
+            if (spu.review_count, spu.rating_total, spu.rating_avg) != (review_count, rating_total, rating_avg):
+                spu.review_count, spu.rating_total, spu.rating_avg = review_count, rating_total, rating_avg
+                changed.append(spu)
+        if changed:
+            ProductSPU.objects.bulk_update(changed, ['review_count', 'rating_total', 'rating_avg'])
+            updated += len(changed)
+
+    # 没有任何评价但统计不为零的 SPU
+    stale = ProductSPU.objects.exclude(review_count=0, rating_total=0)
+    for model in REVIEW_MODELS:
+        stale = stale.exclude(Exists(model.objects.filter(spu_id=OuterRef('pk'))))
+    updated += stale.update(review_count=0, rating_total=0, rating_avg=Decimal('0.00'))
+    return updated
@@ -0,0 +1,285 @@
+"""
+每日销售汇总
+- 销售按订单支付日期（paid_at）统计，支付后即计入，之后的取消 / 退款单独记为退款
+- 退款按处理日期统计（未记录处理时间的按申请时间），只统计已同意 / 已完成的退款
+- 订单 / 退款变化时由信号把对应日期标记为待汇总（见 models.py，事务提交后标记），
+  rollup_sales 命令只重新汇总这些日期，每天的数据先删除再整体写入
+- 分析接口和图表只读取汇总表，不查询订单表
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .category_tree import get_category_node, get_category_tree
+from .models import DailyCategorySales, DailySales, DailySkuSales, Order, OrderItem, RefundRequest
+
+REFUNDED_STATUSES = ('approved', 'completed')
+
+_ZERO_AMOUNT = Value(0, output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _local_date(value):
+    """datetime 转为当前时区的日期"""
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _day_bounds(day):
+    """当天 [0 点, 次日 0 点)，按范围过滤可以使用时间索引"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _refunded_at():
+    return Coalesce('processed_at', 'created_at')
+
+
+def mark_sales_day_dirty(value):
+    """
+    把某天标记为待重新汇总
+    在事务中调用时等事务提交后再标记：当天的 DailySales 行是所有订单共用的热点行，
+    不在下单事务中更新就不会持有它的行锁直到提交；提交后才标记也保证汇总时能读到本次的变化
+    （进程在提交后、标记前退出时，用 rollup_sales --full 补齐）
+    """
+    day = _local_date(value)
+    transaction.on_commit(lambda: _mark_day_dirty(day))
+
+
+def _mark_day_dirty(day):
+    # 已经是待汇总的日期不再写入
+    if not DailySales.objects.filter(date=day, is_dirty=False).update(is_dirty=True):
+        DailySales.objects.get_or_create(date=day, defaults={'is_dirty': True})
+
+
+def mark_all_sales_days_dirty():
+    """
+    把所有有销售或退款的日期标记为待汇总（首次汇总或全量重建时使用）
+    返回标记的天数
+    """
+    tz = timezone.get_current_timezone()
+    days = set(
+        Order.objects.filter(paid_at__isnull=False).order_by()
+        .annotate(day=TruncDate('paid_at', tzinfo=tz)).values_list('day', flat=True).distinct()
+    )
+    days.update(
+        RefundRequest.objects.order_by()
+        .annotate(day=TruncDate(_refunded_at(), tzinfo=tz)).values_list('day', flat=True).distinct()
+    )
+    existing = set(DailySales.objects.filter(date__in=days).values_list('date', flat=True))
+    DailySales.objects.filter(date__in=existing).update(is_dirty=True)
+    DailySales.objects.bulk_create([DailySales(date=day) for day in days - existing], ignore_conflicts=True)
+    return len(days)
+
+
+def build_sales_day(day):
+    """重新汇总某一天（全部写入在一个事务中完成）"""
+    start, end = _day_bounds(day)
+
+    sold_items = OrderItem.objects.filter(order__paid_at__gte=start, order__paid_at__lt=end)
+    refunded_items = OrderItem.objects.annotate(
+        refunded_at=Coalesce('order__refund_request__processed_at', 'order__refund_request__created_at'),
+    ).filter(
+        order__refund_request__status__in=REFUNDED_STATUSES,
+        refunded_at__gte=start,
+        refunded_at__lt=end,
+    )
+
+    sku_rows = {}
+    for row in sold_items.order_by().values('sku_id', 'sku__spu__category_id').annotate(
+        order_count=Count('order_id', distinct=True),
+        quantity_total=Sum('quantity'),
+        amount_total=Sum('subtotal'),
+    ):
+        sku_rows[row['sku_id']] = DailySkuSales(
+            date=day, sku_id=row['sku_id'], category_id=row['sku__spu__category_id'],
+            order_count=row['order_count'], quantity=row['quantity_total'], amount=row['amount_total'],
+        )
+    for row in refunded_items.order_by().values('sku_id', 'sku__spu__category_id').annotate(
+        refund_count=Count('order_id', distinct=True),
+        refund_quantity=Sum('quantity'),
+        refund_amount=Sum('subtotal'),
+    ):
+        sku_row = sku_rows.setdefault(row['sku_id'], DailySkuSales(
+            date=day, sku_id=row['sku_id'], category_id=row['sku__spu__category_id'],
+        ))
+        sku_row.refund_count = row['refund_count']
+        sku_row.refund_quantity = row['refund_quantity']
+        sku_row.refund_amount = row['refund_amount']
+
+    # 分类的订单数需要按分类去重（同一订单可能包含同一分类的多个 SKU），单独聚合
+    category_rows = {}
+    for row in sold_items.order_by().values('sku__spu__category_id').annotate(
+        order_count=Count('order_id', distinct=True),
+        quantity_total=Sum('quantity'),
+        amount_total=Sum('subtotal'),
+    ):
+        category_rows[row['sku__spu__category_id']] = DailyCategorySales(
+            date=day, category_id=row['sku__spu__category_id'],
+            order_count=row['order_count'], quantity=row['quantity_total'], amount=row['amount_total'],
+        )
+    for row in refunded_items.order_by().values('sku__spu__category_id').annotate(
+        refund_count=Count('order_id', distinct=True),
+        refund_amount=Sum('subtotal'),
+    ):
+        category_row = category_rows.setdefault(row['sku__spu__category_id'], DailyCategorySales(
+            date=day, category_id=row['sku__spu__category_id'],
+        ))
+        category_row.refund_count = row['refund_count']
+        category_row.refund_amount = row['refund_amount']
+
+    orders = Order.objects.filter(paid_at__gte=start, paid_at__lt=end).aggregate(
+        order_count=Count('id'),
+        amount=Coalesce(Sum('total_amount'), _ZERO_AMOUNT),
+    )
+    refunds = RefundRequest.objects.annotate(refunded_at=_refunded_at()).filter(
+        status__in=REFUNDED_STATUSES, refunded_at__gte=start, refunded_at__lt=end,
+    ).aggregate(
+        refund_count=Count('id'),
+        refund_amount=Coalesce(Sum('refund_amount'), _ZERO_AMOUNT),
+    )
+
+    with transaction.atomic():
+        DailySkuSales.objects.filter(date=day).delete()
+        DailyCategorySales.objects.filter(date=day).delete()
+        DailySkuSales.objects.bulk_create(sku_rows.values(), batch_size=1000)
+        DailyCategorySales.objects.bulk_create(category_rows.values(), batch_size=1000)
+        summary = {
+            'order_count': orders['order_count'],
+            'quantity': sum(row.quantity for row in sku_rows.values()),
+            'amount': orders['amount'],
+            'refund_count': refunds['refund_count'],
+            'refund_amount': refunds['refund_amount'],
+            'built_at': timezone.now(),
+        }
+        # 不修改已有行的 is_dirty，汇总期间被重新标记的日期保持待汇总
+        DailySales.objects.update_or_create(date=day, defaults=summary, create_defaults={**summary, 'is_dirty': False})
+
+
+def rollup_dirty_days(limit=None):
+    """
+    重新汇总所有待汇总的日期，返回处理的日期列表
+    limit: 本次最多处理的天数，None 不限制
+    """
+    days = list(DailySales.objects.filter(is_dirty=True).order_by('date').values_list('date', flat=True)[:limit])
+    for day in days:
+        # 先清除标记再汇总，汇总期间的新变化会重新打上标记
+        DailySales.objects.filter(date=day).update(is_dirty=False)
+        try:
+            build_sales_day(day)
+        except Exception:
+            DailySales.objects.filter(date=day).update(is_dirty=True)
+            raise
+    return days
+
+
+# ==================== 查询（只读取汇总表） ====================
+
+def _category_ids(category_id):
+    """分类及其全部子分类的 id（从分类树快照中取，不查询数据库）"""
+    node = get_category_node(category_id)
+    if node is None:
+        return None
+    return [
+        other.id for other in get_category_tree().values()
+        if other.tree_id == node.tree_id and node.lft <= other.lft <= node.rght
+    ]
+
+
+def _refund_rate(refund_count, order_count):
+    return round(refund_count / order_count, 4) if order_count else 0
+
+
+def sales_report(start, end, category_id=None, top=10):
+    """
+    汇总 [start, end] 日期范围内的销售数据
+    category_id: 只统计该分类（含子分类）
+    返回 {series: 每日数据, top_skus: 销售额最高的 SKU, categories: 各分类合计, totals: 合计}
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    category_filter = Q()
+    if category_id is not None:
+        category_ids = _category_ids(category_id)
+        if category_ids is None:
+            return None
+        category_filter = Q(category_id__in=category_ids)
+
+    if category_id is None:
+        daily_rows = DailySales.objects.filter(date__range=(start, end)).values(
+            'date', 'order_count', 'quantity', 'amount', 'refund_count', 'refund_amount'
+        )
+    else:
+        daily_rows = DailyCategorySales.objects.filter(category_filter, date__range=(start, end)).order_by().values(
+            'date'
+        ).annotate(
+            order_count=Sum('order_count'),
+            quantity=Sum('quantity'),
+            amount=Sum('amount'),
+            refund_count=Sum('refund_count'),
+            refund_amount=Sum('refund_amount'),
+        )
+    by_day = {row['date']: row for row in daily_rows}
+
+    series = []
+    totals = {'order_count': 0, 'quantity': 0, 'amount': Decimal('0'), 'refund_count': 0, 'refund_amount': Decimal('0')}
+    for day in days:
+        row = by_day.get(day, {})
+        point = {key: row.get(key) or 0 for key in totals}
+        for key in totals:
+            totals[key] += point[key]
+        series.append({
+            'date': day.isoformat(),
+            **{key: float(value) if isinstance(value, Decimal) else value for key, value in point.items()},
+            'refund_rate': _refund_rate(point['refund_count'], point['order_count']),
+        })
+
+    top_skus = [
+        {
+            'sku_code': row['sku_id'],
+            'title': row['sku__title'],
+            'quantity': row['quantity_total'],
+            'amount': float(row['amount_total']),
+            'refund_count': row['refund_total'],
+        }
+        for row in DailySkuSales.objects.filter(category_filter, date__range=(start, end)).order_by().values(
+            'sku_id', 'sku__title'
+        ).annotate(
+            quantity_total=Sum('quantity'),
+            amount_total=Sum('amount'),
+            refund_total=Sum('refund_count'),
+        ).order_by('-amount_total')[:top]
+    ]
+
+    tree = get_category_tree()
+    categories = [
+        {
+            'id': row['category_id'],
+            'name': tree[row['category_id']].full_name if row['category_id'] in tree else str(row['category_id']),
+            'quantity': row['quantity_total'],
+            'amount': float(row['amount_total']),
+            'refund_count': row['refund_total'],
+        }
+        for row in DailyCategorySales.objects.filter(category_filter, date__range=(start, end)).order_by().values(
+            'category_id'
+        ).annotate(
+            quantity_total=Sum('quantity'),
+            amount_total=Sum('amount'),
+            refund_total=Sum('refund_count'),
+        ).order_by('-amount_total')
+    ]
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': series,
+        'top_skus': top_skus,
+        'categories': categories,
+        'totals': {
+            **{key: float(value) if isinstance(value, Decimal) else value for key, value in totals.items()},
+            'refund_rate': _refund_rate(totals['refund_count'], totals['order_count']),
+        },
+    }
@@ -0,0 +1,199 @@
+"""
+商品全文搜索
+通过 settings.PRODUCT_SEARCH_BACKEND 选择搜索后端：
+- MySQLFullTextSearchBackend: MySQL FULLTEXT 索引（ngram 分词，支持中文），按相关度排序
+- InvertedIndexSearchBackend: 纯 Python 倒排索引，用于 SQLite 等不支持全文索引的数据库（如测试环境）
+未配置时根据数据库类型自动选择。
+"""
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import FloatField, IntegerField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# 参与搜索的字段及权重
+SEARCH_FIELDS = {
+    'name': 3,
+    'brand': 2,
+    'series': 2,
+    'description': 1,
+}
+
+# 与 MySQL ngram_token_size 默认值保持一致
+NGRAM_SIZE = 2
+
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_WORD_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+')
+
+
+def tokenize(text):
+    """
+    分词：英文/数字按单词切分，中文按 ngram 切分（与 MySQL ngram parser 行为一致）
+    """
+    tokens = []
+    for word in _WORD_RE.findall((text or '').lower()):
+        if _CJK_RE.fullmatch(word) and len(word) > NGRAM_SIZE:
+            tokens.extend(word[i:i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class BaseSearchBackend:
+    """搜索后端基类"""
+
+    def search(self, queryset, query):
+        """返回按相关度排序的 queryset"""
+        raise NotImplementedError
+
+
+class MySQLFullTextSearchBackend(BaseSearchBackend):
+    """
+    MySQL FULLTEXT 搜索
+    依赖迁移 0011 创建的 spu_fulltext_idx 索引（WITH PARSER ngram）
+    """
+    match_sql = (
+        'MATCH (`shopping_productspu`.`name`, `shopping_productspu`.`description`, '
+        '`shopping_productspu`.`brand`, `shopping_productspu`.`series`) '
+        'AGAINST (%s IN NATURAL LANGUAGE MODE)'
+    )
+
+    def search(self, queryset, query):
+        score = RawSQL(self.match_sql, (query,), output_field=FloatField())
+        return queryset.annotate(search_score=score).filter(search_score__gt=0).order_by('-search_score', '-id')
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    进程内倒排索引（TF-IDF 打分）
+    SPU 新增、删除或 SEARCH_FIELDS 中的字段变化时递增共享缓存中的版本号，各进程发现版本变化后重建索引；
+    上下架、评价统计等其他字段的变化不影响索引（搜索结果由调用方的 queryset 过滤）
+    """
+    version_cache_key = 'shopping:search:index_version'
+    max_results = 1000  # 结果上限，控制排序表达式长度
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}  # token -> {spu_id: weighted_tf}
+        self._doc_count = 0
+
+    def _current_version(self):
+        version = cache.get(self.version_cache_key)
+        if version is None:
+            version = 1
+            cache.add(self.version_cache_key, version, None)
+        return version
+
+    def _build(self):
+        from .models import ProductSPU
+
+        postings = defaultdict(dict)
+        doc_count = 0
+        fields = list(SEARCH_FIELDS)
+        for row in ProductSPU.objects.values_list('id', *fields).iterator(chunk_size=2000):
+            spu_id = row[0]
+            doc_count += 1
+            for field, text in zip(fields, row[1:]):
+                weight = SEARCH_FIELDS[field]
+                for token in tokenize(text):
+                    doc = postings[token]
+                    doc[spu_id] = doc.get(spu_id, 0) + weight
+        return dict(postings), doc_count
+
+    def _get_postings(self):
+        version = self._current_version()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._postings, self._doc_count = self._build()
+                    self._version = version
+        return self._postings
+
+    def rank(self, query, candidate_ids=None):
+        """
+        返回按得分从高到低排序的 SPU id 列表（最多 max_results 个）
+        candidate_ids: 只对这些 SPU 打分（调用方过滤后的结果），先过滤再截断，下架或不符合条件的 SPU 不占名额
+        """
+        postings = self._get_postings()
+        doc_count = self._doc_count or 1
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            docs = postings.get(token)
+            if not docs:
+                continue
+            idf = math.log(1 + doc_count / len(docs))
+            for spu_id, tf in docs.items():
+                if candidate_ids is None or spu_id in candidate_ids:
+                    scores[spu_id] += tf * idf
+        return heapq.nsmallest(self.max_results, scores, key=lambda spu_id: (-scores[spu_id], -spu_id))
+
+    def search(self, queryset, query):
+        ranked_ids = self.rank(query, set(queryset.order_by().values_list('id', flat=True)))
+        if not ranked_ids:
+            return queryset.none()
+        # id 来自索引且均为整数，直接拼入 SQL，避免大量参数和 Case/When 对象的构建开销
+        column = f'{connection.ops.quote_name(queryset.model._meta.db_table)}.{connection.ops.quote_name("id")}'
+        whens = ' '.join(f'WHEN {int(spu_id)} THEN {position}' for position, spu_id in enumerate(ranked_ids))
+        rank = RawSQL(f'CASE {column} {whens} END', (), output_field=IntegerField())
+        return queryset.filter(id__in=ranked_ids).annotate(search_rank=rank).order_by('search_rank')
+
+    @classmethod
+    def invalidate(cls):
+        """参与搜索的 SPU 字段变更后调用，使所有进程的索引失效"""
+        try:
+            cache.incr(cls.version_cache_key)
+        except ValueError:
+            cache.set(cls.version_cache_key, 2, None)
+
+
+def loaded_search_values(instance):
+    """实例中已加载的搜索字段值 {字段: 值}（延迟加载的字段不包含在内）"""
+    return {field: instance.__dict__[field] for field in SEARCH_FIELDS if field in instance.__dict__}
+
+
+def search_fields_changed(instance, update_fields=None):
+    """
+    SPU 保存后判断搜索字段是否变化（与从数据库加载时的值比较，见 ProductSPU.from_db），
+    并记录当前值供下次保存比较；不是从数据库加载的实例视为已变化
+    """
+    previous = getattr(instance, '_loaded_search_values', None)
+    current = loaded_search_values(instance)
+    instance._loaded_search_values = current
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return False
+    if previous is None:
+        return True
+    return any(field not in previous or previous[field] != value for field, value in current.items())
+
+
+_backend = None
+
+
+def get_search_backend():
+    """获取当前配置的搜索后端（进程内单例）"""
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+        if backend_path:
+            _backend = import_string(backend_path)()
+        elif connection.vendor == 'mysql':
+            _backend = MySQLFullTextSearchBackend()
+        else:
+            _backend = InvertedIndexSearchBackend()
+    return _backend
+
+
+def search_products(queryset, query):
+    """对 SPU queryset 执行全文搜索，结果按相关度排序"""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    return get_search_backend().search(queryset, query)
@@ -1,8 +1,14 @@
+import os
+
+from django.conf import settings
 from rest_framework import serializers
 from .models import (
     ProductSPU, ProductSKU, ProductReview, Category, Order, OrderItem,
     RefundRequest, OrderItemReview, OrderItemReviewImage
 )
+from .category_tree import get_category_node
+from .review_images import ALLOWED_EXTENSIONS, stage_review_image
+from backend.thumbnails import image_url
 
 class CategorySerializer(serializers.ModelSerializer):
     """分类序列化器，支持层级显示"""
@@ -15,6 +21,12 @@ class CategorySerializer(serializers.ModelSerializer):
     
     def get_full_name(self, obj):
         """获取完整的分类路径，如：服装 > 上衣 > T恤"""
+        # 优先从分类树快照读取，避免逐级查询 parent；
+        # 列表由视图在 context['category_tree'] 中传入整个请求共用的快照，不必每个分类都检查一次缓存版本号
+        tree = self.context.get('category_tree')
+        node = tree.get(obj.id) if tree is not None else get_category_node(obj.id)
+        if node is not None:
+            return node.full_name
         names = [obj.name]
         parent = obj.parent
         while parent:
@@ -26,37 +38,30 @@ class CategorySerializer(serializers.ModelSerializer):
 class ProductSPUSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()  # 从ProductImage获取主图
     is_favorited = serializers.SerializerMethodField()  # 是否已收藏
-    review_count = serializers.SerializerMethodField()  # 评论数
 
     class Meta:
         model = ProductSPU
         fields = ['id', 'name', 'description', 'category', 'brand', 'series', 'is_active', 
-                  'created_at', 'updated_at', 'image', 'is_favorited', 'review_count']
+                  'created_at', 'updated_at', 'image', 'is_favorited', 'review_count', 'rating_avg']
+        read_only_fields = ['review_count', 'rating_avg']
 
     def get_image(self, obj):
-        """返回主图完整 URL"""
-        request = self.context.get('request')
-        image = obj.images.filter(is_main=True).first()
-        if image:
-            if request:
-                try:
-                    return request.build_absolute_uri(image.image.url)
-                except Exception:
-                    return image.image.url
-            return image.image.url
-        return None
+        """返回主图完整 URL（优先使用视图预加载的 main_images），尺寸由 image_size 参数选择"""
+        if hasattr(obj, 'main_images'):
+            image = obj.main_images[0] if obj.main_images else None
+        else:
+            image = obj.images.filter(is_main=True).first()
+        return image_url(image.image, self.context.get('request')) if image else None
     
     def get_is_favorited(self, obj):
-        """检查当前用户是否已收藏"""
+        """检查当前用户是否已收藏（优先使用视图的 Exists 注解）"""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             from user.models import ProductFavorite
             return ProductFavorite.objects.filter(user=request.user, product=obj).exists()
         return False
-    
-    def get_review_count(self, obj):
-        """获取评论数量"""
-        return obj.reviews.count()
 
 
 class ProductSKUSerializer(serializers.ModelSerializer):
@@ -69,16 +74,8 @@ class ProductSKUSerializer(serializers.ModelSerializer):
 
     def get_image(self, obj):
         """返回SKU主图完整 URL"""
-        request = self.context.get('request')
         image = obj.spu.images.filter(is_main=True).first()
-        if image:
-            if request:
-                try:
-                    return request.build_absolute_uri(image.image.url)
-                except Exception:
-                    return image.image.url
-            return image.image.url
-        return None
+        return image_url(image.image, self.context.get('request')) if image else None
 
 
 class SKUDetailSerializer(serializers.ModelSerializer):
@@ -106,15 +103,7 @@ class ProductReviewSerializer(serializers.ModelSerializer):
     
     def get_user_avatar(self, obj):
         """获取用户头像URL"""
-        request = self.context.get('request')
-        if obj.user.avatar:
-            if request:
-                try:
-                    return request.build_absolute_uri(obj.user.avatar.url)
-                except Exception:
-                    return obj.user.avatar.url
-            return obj.user.avatar.url
-        return None
+        return image_url(obj.user.avatar, self.context.get('request'))
 
 
 # ==================== 退款申请序列化器 ====================
@@ -144,20 +133,12 @@ class OrderItemReviewImageSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = OrderItemReviewImage
-        fields = ['id', 'image', 'url', 'created_at']
-        read_only_fields = ['created_at']
+        fields = ['id', 'image', 'url', 'status', 'created_at']
+        read_only_fields = ['status', 'created_at']
     
     def get_url(self, obj):
         """获取图片完整URL"""
-        request = self.context.get('request')
-        if obj.image and hasattr(obj.image, 'url'):
-            try:
-                if request:
-                    return request.build_absolute_uri(obj.image.url)
-                return obj.image.url
-            except Exception:
-                pass
-        return None
+        return image_url(obj.image, self.context.get('request'))
 
 
 class OrderItemReviewSerializer(serializers.ModelSerializer):
@@ -166,37 +147,31 @@ class OrderItemReviewSerializer(serializers.ModelSerializer):
     user_avatar = serializers.SerializerMethodField()
     spu_name = serializers.CharField(source='order_item.spu_name', read_only=True)
     images = serializers.SerializerMethodField()  # 评价图片
-    # 用于接收上传的图片文件
+    processing_images = serializers.SerializerMethodField()  # 后台处理中的图片数
+    # 用于接收上传的图片文件，只检查扩展名和大小，解码和缩放由后台任务完成（见 review_images.py）
     uploaded_images = serializers.ListField(
-        child=serializers.ImageField(max_length=100000, allow_empty_file=False),
+        child=serializers.FileField(max_length=255, allow_empty_file=False),
         write_only=True,
-        required=False
+        required=False,
+        max_length=settings.REVIEW_IMAGE_MAX_COUNT,
     )
     
     class Meta:
         model = OrderItemReview
         fields = [
             'id', 'order_item', 'user', 'username', 'user_avatar',
-            'spu', 'spu_name', 'content', 'images', 'uploaded_images', 'created_at', 'updated_at'
+            'spu', 'spu_name', 'content', 'images', 'processing_images', 'uploaded_images', 'created_at', 'updated_at'
         ]
         read_only_fields = ['order_item', 'user', 'spu', 'created_at', 'updated_at', 'username', 'user_avatar', 'spu_name']
     
     def get_user_avatar(self, obj):
         """获取用户头像URL"""
-        request = self.context.get('request')
-        if obj.user.avatar:
-            if request:
-                try:
-                    return request.build_absolute_uri(obj.user.avatar.url)
-                except Exception:
-                    return obj.user.avatar.url
-            return obj.user.avatar.url
-        return None
+        return image_url(obj.user.avatar, self.context.get('request'))
     
     def get_images(self, obj):
-        """获取评价图片列表"""
+        """获取评价图片列表（只返回处理完成的图片）"""
         if hasattr(obj, 'review_images'):
-            images = obj.review_images.all()
+            images = [image for image in obj.review_images.all() if image.status == 'ready']
             serializer = OrderItemReviewImageSerializer(
                 images, 
                 many=True, 
@@ -204,26 +179,44 @@ class OrderItemReviewSerializer(serializers.ModelSerializer):
             )
             return serializer.data
         return []
+
+    def get_processing_images(self, obj):
+        return sum(1 for image in obj.review_images.all() if image.status == 'pending')
+
+    def validate_uploaded_images(self, files):
+        """校验扩展名、大小和评价的图片总数"""
+        max_size = settings.REVIEW_IMAGE_MAX_UPLOAD_SIZE
+        for file in files:
+            ext = os.path.splitext(file.name)[1].lower()
+            if ext not in ALLOWED_EXTENSIONS:
+                raise serializers.ValidationError(f'不支持的图片格式: {file.name}')
+            if file.size > max_size:
+                raise serializers.ValidationError(f'图片 {file.name} 超过 {max_size // (1024 * 1024)}MB')
+        if self.instance is not None and files:
+            existing = self.instance.review_images.exclude(status='failed').count()
+            if existing + len(files) > settings.REVIEW_IMAGE_MAX_COUNT:
+                raise serializers.ValidationError(f'每条评价最多 {settings.REVIEW_IMAGE_MAX_COUNT} 张图片')
+        return files
     
     def create(self, validated_data):
-        """创建评价并处理图片上传"""
+        """创建评价，上传的图片暂存后由后台任务处理"""
         uploaded_images = validated_data.pop('uploaded_images', [])
         review = super().create(validated_data)
         
         # 创建评价图片
         for image in uploaded_images:
-            OrderItemReviewImage.objects.create(review=review, image=image)
+            stage_review_image(review, image)
         
         return review
     
     def update(self, instance, validated_data):
-        """更新评价并处理图片上传"""
+        """更新评价，新上传的图片暂存后由后台任务处理"""
         uploaded_images = validated_data.pop('uploaded_images', [])
         review = super().update(instance, validated_data)
         
         # 如果有新上传的图片，添加到评价中
         for image in uploaded_images:
-            OrderItemReviewImage.objects.create(review=review, image=image)
+            stage_review_image(review, image)
         
         return review
 
@@ -247,22 +240,12 @@ class OrderItemSerializer(serializers.ModelSerializer):
         # 尝试获取SKU图片
         sku_image = obj.sku.images.first()
         if sku_image:
-            if request:
-                try:
-                    return request.build_absolute_uri(sku_image.image.url)
-                except Exception:
-                    return sku_image.image.url
-            return sku_image.image.url
+            return image_url(sku_image.image, request)
         
         # 否则获取SPU主图
         spu_main_image = obj.sku.spu.images.filter(is_main=True).first()
         if spu_main_image:
-            if request:
-                try:
-                    return request.build_absolute_uri(spu_main_image.image.url)
-                except Exception:
-                    return spu_main_image.image.url
-            return spu_main_image.image.url
+            return image_url(spu_main_image.image, request)
         
         return None
     
@@ -400,20 +383,10 @@ class UserOwnedProductSerializer(serializers.ModelSerializer):
         # 尝试获取SKU图片
         sku_image = obj.sku.images.first()
         if sku_image:
-            if request:
-                try:
-                    return request.build_absolute_uri(sku_image.image.url)
-                except Exception:
-                    return sku_image.image.url
-            return sku_image.image.url
+            return image_url(sku_image.image, request)
         
         # 否则获取SPU主图
         spu_main_image = obj.sku.spu.images.filter(is_main=True).first()
         if spu_main_image:
-            if request:
-                try:
-                    return request.build_absolute_uri(spu_main_image.image.url)
-                except Exception:
-                    return spu_main_image.image.url
-            return spu_main_image.image.url
+            return image_url(spu_main_image.image, request)
         return None
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+SKU 编码分配与批量创建
+- allocate_sku_codes: 原子分配 SKU 编码
+- create_skus: 一个事务内批量创建 SKU、库存和属性值，属性值在内存中按预加载的 SPU 属性校验
+- generate_sku_combinations: 按所选属性值的笛卡尔积生成 SKU（管理页面“生成全部组合”）
+SKU 编码格式为 "{spu_id}-{序号}"，序号来自 ProductSPU.sku_counter：
+    UPDATE shopping_productspu SET sku_counter = sku_counter + n WHERE id = ?
+由数据库原子递增并锁定该 SPU 行直到事务结束，同一 SPU 的并发创建依次取得不同的号段；
+序号只增不减，删除 SKU 后编码不会被新 SKU 重复使用（历史订单仍指向原 SKU）。
+"""
+from itertools import product
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import (
+    AttributeValue, Inventory, ProductSKU, ProductSKUAttributeValue, ProductSPU, ProductSPUAttribute
+)
+from .sku_matrix import invalidate_sku_matrix
+
+
+def format_sku_code(spu_id, number):
+    return f'{spu_id}-{number}'
+
+
+def allocate_sku_codes(spu_id, count=1):
+    """
+    为 SPU 分配 count 个新 SKU 编码，返回编码列表
+    应在创建 SKU 的事务中调用：SPU 行在事务提交前保持锁定，事务回滚时号段一并回滚
+    """
+    with transaction.atomic():
+        updated = ProductSPU.objects.filter(id=spu_id).update(sku_counter=F('sku_counter') + count)
+        if not updated:
+            raise ProductSPU.DoesNotExist(f'SPU {spu_id} 不存在')
+        end = ProductSPU.objects.filter(id=spu_id).values_list('sku_counter', flat=True).get()
+    return [format_sku_code(spu_id, number) for number in range(end - count + 1, end + 1)]
+
+
+def _validate_attribute_values(spu, rows):
+    """
+    校验属性值属于对应属性、属性属于该 SPU（与 ProductSKUAttributeValue.save 的检查一致）
+    SPU 属性和属性值各查询一次，之后逐行在内存中校验
+    """
+    spu_attribute_ids = set(ProductSPUAttribute.objects.filter(spu=spu).values_list('attribute_id', flat=True))
+    value_ids = {value_id for row in rows for value_id in (row.get('attribute_values') or {}).values()}
+    value_attributes = dict(AttributeValue.objects.filter(id__in=value_ids).values_list('id', 'attribute_id'))
+
+    for row in rows:
+        for attribute_id, value_id in (row.get('attribute_values') or {}).items():
+            if attribute_id not in spu_attribute_ids:
+                raise ValueError("SKU 的属性必须在所属 SPU 的属性列表中")
+            if value_attributes.get(value_id) != attribute_id:
+                raise ValueError("属性值必须属于指定的属性")
+
+
+def create_skus(spu, rows):
+    """
+    在一个事务中批量创建 SKU（含库存和属性值），返回创建的 SKU 列表
+    rows: [{'title', 'price', 'is_active'(可选), 'stock'(可选), 'attribute_values'(可选): {attribute_id: value_id}}]
+    bulk_create 不触发信号，创建后手动使 SKU 矩阵缓存失效
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    _validate_attribute_values(spu, rows)
+
+    with transaction.atomic():
+        codes = allocate_sku_codes(spu.id, len(rows))
+        skus = ProductSKU.objects.bulk_create([
+            ProductSKU(
+                sku_code=code,
+                spu=spu,
+                title=row['title'],
+                price=row['price'],
+                is_active=row.get('is_active', True),
+            )
+            for code, row in zip(codes, rows)
+        ])
+        Inventory.objects.bulk_create([
+            Inventory(sku=sku, quantity=int(row.get('stock') or 0))
+            for sku, row in zip(skus, rows)
+        ])
+        ProductSKUAttributeValue.objects.bulk_create([
+            ProductSKUAttributeValue(sku=sku, attribute_id=attribute_id, attribute_value_id=value_id)
+            for sku, row in zip(skus, rows)
+            for attribute_id, value_id in (row.get('attribute_values') or {}).items()
+        ])
+        invalidate_sku_matrix(spu.id)
+    return skus
+
+
+def replace_sku_attribute_values(sku, attribute_values):
+    """替换单个 SKU 的属性值 {attribute_id: value_id}（管理页面编辑 SKU）"""
+    _validate_attribute_values(sku.spu, [{'attribute_values': attribute_values}])
+    with transaction.atomic():
+        sku.attribute_values.all().delete()
+        ProductSKUAttributeValue.objects.bulk_create([
+            ProductSKUAttributeValue(sku=sku, attribute_id=attribute_id, attribute_value_id=value_id)
+            for attribute_id, value_id in attribute_values.items()
+        ])
+        invalidate_sku_matrix(sku.spu_id)
+
+
+MAX_SKU_COMBINATIONS = 2000
+
+
+def generate_sku_combinations(spu, value_ids_by_attribute, price, stock=0, is_active=True, skip_existing=True):
+    """
+    按所选属性值的笛卡尔积批量创建 SKU，返回 (创建的 SKU 列表, 跳过的已存在组合数)
+    value_ids_by_attribute: {attribute_id: [value_id, ...]}，只包含要参与组合的属性
+    SKU 标题为 "SPU名称 属性值1 属性值2 ..."（按 SPU 属性顺序）
+    skip_existing: 跳过属性值组合与已有 SKU 完全相同的组合
+    """
+    spu_attributes = list(
+        ProductSPUAttribute.objects.filter(spu=spu, attribute_id__in=value_ids_by_attribute).order_by('id')
+    )
+    attribute_ids = [spu_attr.attribute_id for spu_attr in spu_attributes]
+    if len(attribute_ids) != len(value_ids_by_attribute):
+        raise ValueError("SKU 的属性必须在所属 SPU 的属性列表中")
+
+    value_names = dict(AttributeValue.objects.filter(
+        id__in=[value_id for value_ids in value_ids_by_attribute.values() for value_id in value_ids]
+    ).values_list('id', 'value'))
+    axes = [list(dict.fromkeys(value_ids_by_attribute[attribute_id])) for attribute_id in attribute_ids]
+    if not axes or not all(axes):
+        raise ValueError("每个参与组合的属性至少选择一个属性值")
+
+    total = 1
+    for axis in axes:
+        total *= len(axis)
+    if total > MAX_SKU_COMBINATIONS:
+        raise ValueError(f"组合数 {total} 超过上限 {MAX_SKU_COMBINATIONS}")
+
+    existing = set()
+    if skip_existing:
+        combinations = {}
+        for sku_id, attribute_id, value_id in ProductSKUAttributeValue.objects.filter(
+            sku__spu=spu, attribute_id__in=attribute_ids
+        ).values_list('sku_id', 'attribute_id', 'attribute_value_id'):
+            combinations.setdefault(sku_id, {})[attribute_id] = value_id
+        existing = {
+            tuple(values.get(attribute_id) for attribute_id in attribute_ids)
+            for values in combinations.values()
+        }
+
+    rows = []
+    skipped = 0
+    for combination in product(*axes):
+        if combination in existing:
+            skipped += 1
+            continue
+        rows.append({
+            'title': ' '.join([spu.name] + [value_names.get(value_id, '') for value_id in combination]),
+            'price': price,
+            'stock': stock,
+            'is_active': is_active,
+            'attribute_values': dict(zip(attribute_ids, combination)),
+        })
+    return create_skus(spu, rows), skipped
@@ -0,0 +1,142 @@
+"""
+SPU 的 SKU 矩阵（属性 + SKU 列表）缓存
+商品详情页最热的匿名接口，完整结果存放在 Django 缓存中，
+ProductSKU / ProductSKUAttributeValue / Inventory / ProductImage / ProductSPUAttribute
+变更时由信号主动失效（见 models.py）。
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+# 修改 build_sku_matrix 的输出结构时递增，旧缓存自动作废
+SKU_MATRIX_CACHE_VERSION = 1
+
+
+def sku_matrix_cache_key(spu_id):
+    return f'shopping:spu:{spu_id}:sku_matrix:v{SKU_MATRIX_CACHE_VERSION}'
+
+
+def build_sku_matrix(spu):
+    """
+    构建 SKU 矩阵，图片使用相对路径，返回前再转换为完整 URL
+    """
+    from .models import ProductImage, ProductSKU, ProductSKUAttributeValue, ProductSPUAttribute
+
+    # SPU 的所有属性
+    spu_attributes = list(
+        ProductSPUAttribute.objects.filter(spu=spu).select_related('attribute').order_by('id')
+    )
+
+    # 该 SPU 下所有 SKU 使用过的属性值，一次查询按属性分组
+    used_values = {}
+    rows = ProductSKUAttributeValue.objects.filter(
+        sku__spu=spu,
+        attribute_id__in=[spu_attr.attribute_id for spu_attr in spu_attributes]
+    ).values_list(
+        'attribute_id', 'attribute_value_id', 'attribute_value__value'
+    ).order_by('attribute_value_id').distinct()
+    for attribute_id, value_id, value in rows:
+        used_values.setdefault(attribute_id, []).append({'id': value_id, 'value': value})
+
+    attributes_data = [
+        {
+            'id': spu_attr.attribute.id,
+            'name': spu_attr.attribute.name,
+            'values': used_values.get(spu_attr.attribute_id, []),
+        }
+        for spu_attr in spu_attributes
+    ]
+
+    # 所有上架 SKU 及其属性值、库存、图片
+    skus = ProductSKU.objects.filter(spu=spu, is_active=True).select_related('inventory').prefetch_related(
+        'attribute_values',
+        Prefetch('images', queryset=ProductImage.objects.order_by('id')),
+    )
+
+    # SPU 主图
+    spu_main_image = spu.images.filter(is_main=True).first()
+    spu_image_url = spu_main_image.image.url if spu_main_image else None
+
+    skus_data = []
+    for sku in skus:
+        sku_attrs = {
+            sku_attr_value.attribute_id: sku_attr_value.attribute_value_id
+            for sku_attr_value in sku.attribute_values.all()
+        }
+
+        # SKU 图片，没有则使用 SPU 主图
+        sku_images = sku.images.all()
+        image_url = sku_images[0].image.url if sku_images else spu_image_url
+
+        inventory = getattr(sku, 'inventory', None)
+        skus_data.append({
+            'sku_code': sku.sku_code,
+            'title': sku.title,
+            'price': str(sku.price),
+            'stock': inventory.quantity if inventory else 0,
+            'attributes': sku_attrs,
+            'image': image_url,
+        })
+
+    return {
+        'attributes': attributes_data,
+        'skus': skus_data,
+    }
+
+
+def compute_etag(payload):
+    """根据内容计算 ETag"""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def get_cached_sku_matrix(spu_id):
+    """读取缓存，返回 (payload, etag) 或 None"""
+    return cache.get(sku_matrix_cache_key(spu_id))
+
+
+def get_sku_matrix(spu):
+    """读取或构建 SKU 矩阵，返回 (payload, etag)"""
+    cached = get_cached_sku_matrix(spu.id)
+    if cached is not None:
+        return cached
+
+    payload = build_sku_matrix(spu)
+    cached = (payload, compute_etag(payload))
+    cache.set(sku_matrix_cache_key(spu.id), cached, settings.SKU_MATRIX_CACHE_TIMEOUT)
+    return cached
+
+
+def invalidate_sku_matrix(*spu_ids):
+    """
+    使指定 SPU 的 SKU 矩阵缓存失效
+    在事务提交后执行，避免并发请求在提交前用旧数据重建缓存
+    """
+    keys = [sku_matrix_cache_key(spu_id) for spu_id in spu_ids if spu_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_sku_matrix_for_skus(sku_codes):
+    """按 SKU 编码查出所属 SPU 并失效（用于 queryset.update 等不触发信号的批量变更）"""
+    from .models import ProductSKU
+
+    spu_ids = set(ProductSKU.objects.filter(sku_code__in=sku_codes).values_list('spu_id', flat=True))
+    invalidate_sku_matrix(*spu_ids)
+
+
+def absolutize_sku_matrix(payload, request):
+    """将缓存中的相对图片路径转换为完整 URL"""
+    skus = []
+    for sku in payload['skus']:
+        if sku['image']:
+            sku = dict(sku, image=request.build_absolute_uri(sku['image']))
+        skus.append(sku)
+    return {
+        'attributes': payload['attributes'],
+        'skus': skus,
+    }
@@ -0,0 +1,98 @@
+"""
+Stripe Webhook 事件的记录与后台处理
+- record_event: Webhook 验签后调用，按 event_id 去重写入 StripeEvent，并在同一事务中添加后台任务，立即返回
+- process_stripe_event: 后台任务 shopping.process_stripe_event 的处理函数（见 tasks.py），
+  失败时抛出异常，由任务队列回滚并按指数退避重试，超过最大次数后 mark_event_failed 标记为 failed
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Order, StripeEvent
+from .ownership import grant_order_products
+from .tasks import process_stripe_event as process_stripe_event_task
+
+
+def record_event(event):
+    """
+    记录 Webhook 事件，返回 (StripeEvent, created)
+    event: 已验签的事件 dict，Stripe 重复推送时 created 为 False，不会重复添加任务
+    """
+    defaults = {'event_type': event['type'], 'payload': event}
+    try:
+        with transaction.atomic():
+            stripe_event, created = StripeEvent.objects.get_or_create(event_id=event['id'], defaults=defaults)
+            if created:
+                process_stripe_event_task.enqueue(event_id=stripe_event.event_id)
+            return stripe_event, created
+    except IntegrityError:
+        # 并发推送同一事件
+        return StripeEvent.objects.get(event_id=event['id']), False
+
+
+# ==================== 事件处理 ====================
+
+def handle_checkout_session_completed(payload):
+    """支付成功：更新订单状态，并把商品加入用户拥有列表"""
+    session = payload['data']['object']
+    order_id = (session.get('metadata') or {}).get('order_id') or session.get('client_reference_id')
+    if not order_id:
+        return '缺少订单ID，忽略'
+
+    order = Order.objects.select_for_update().filter(id=order_id).first()
+    if order is None:
+        return f'订单 {order_id} 不存在，忽略'
+    if order.status != 'pending':
+        return f'订单 {order_id} 状态为 {order.status}，跳过更新'
+
+    order.status = 'paid'
+    order.paid_at = timezone.now()
+    order.payment_method = 'stripe'
+    order.save()
+
+    # 如果是虚拟商品，自动添加到用户拥有列表
+    grant_order_products(order)
+    return f'订单 {order_id} 支付成功，已更新状态'
+
+
+EVENT_HANDLERS = {
+    'checkout.session.completed': handle_checkout_session_completed,
+}
+
+
+def process_event(stripe_event):
+    """处理单个事件，未注册处理函数的事件类型直接标记为已处理"""
+    handler = EVENT_HANDLERS.get(stripe_event.event_type)
+    if handler is None:
+        return f'未处理的事件类型: {stripe_event.event_type}'
+    return handler(stripe_event.payload)
+
+
+def process_stripe_event(event_id):
+    """
+    处理一个事件，返回处理结果；已处理的事件直接跳过（任务被重复执行时不会重复生效）
+    在任务的事务中执行，事件行被锁定，处理失败时随任务一起回滚，事件保持 pending
+    """
+    stripe_event = StripeEvent.objects.select_for_update().filter(event_id=event_id).first()
+    if stripe_event is None or stripe_event.status == 'processed':
+        return None
+    message = process_event(stripe_event)
+    stripe_event.status = 'processed'
+    stripe_event.processed_at = timezone.now()
+    stripe_event.last_error = ''
+    stripe_event.save(update_fields=['status', 'processed_at', 'last_error'])
+    return message
+
+
+def mark_event_failed(event_id, error):
+    """任务超过最大次数后调用，事件标记为 failed，可在 Admin 中重新处理"""
+    StripeEvent.objects.filter(event_id=event_id, status='pending').update(status='failed', last_error=error)
+
+
+def retry_events(queryset):
+    """把失败的事件重新放回待处理状态并添加任务，返回事件数"""
+    with transaction.atomic():
+        event_ids = list(queryset.filter(status='failed').select_for_update().values_list('event_id', flat=True))
+        StripeEvent.objects.filter(event_id__in=event_ids).update(status='pending', last_error='')
+        for event_id in event_ids:
+            process_stripe_event_task.enqueue(event_id=event_id)
+    return len(event_ids)
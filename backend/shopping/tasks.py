@@ -0,0 +1,51 @@
+"""
+shopping 应用的后台任务（由 manage.py runworker 执行，见 jobs/queue.py）
+"""
+from jobs.queue import task
+
+
+@task('shopping.restore_orders_stock', priority=10)
+def restore_orders_stock(order_ids):
+    """恢复一组订单的库存（批量同意退款后执行），按 SKU 汇总后一条 UPDATE 写回"""
+    from . import inventory
+
+    inventory.restore_orders_stock(order_ids)
+
+
+@task('shopping.grant_order_products', priority=10)
+def grant_order_products(order_id):
+    """把订单中的全部 SKU 加入下单用户的拥有列表（支付、确认收货后执行，已拥有的跳过）"""
+    from . import ownership
+    from .models import Order
+
+    order = Order.objects.filter(id=order_id).only('id', 'user_id').first()
+    if order is not None:
+        ownership.grant_order_products(order)
+
+
+def _stripe_event_failed(error, event_id):
+    from .stripe_events import mark_event_failed
+
+    mark_event_failed(event_id, error)
+
+
+@task('shopping.process_stripe_event', priority=20, max_attempts=8, on_failure=_stripe_event_failed)
+def process_stripe_event(event_id):
+    """处理一个 Stripe Webhook 事件（支付成功时更新订单状态并发放商品）"""
+    from . import stripe_events
+
+    stripe_events.process_stripe_event(event_id)
+
+
+def _review_image_failed(error, image_id):
+    from .review_images import mark_image_failed
+
+    mark_image_failed(image_id, error)
+
+
+@task('shopping.process_review_image', on_failure=_review_image_failed)
+def process_review_image(image_id):
+    """校验、缩放并重新编码一张待处理的评价图片"""
+    from . import review_images
+
+    review_images.process_staged_image(image_id)
@@ -1,3 +1,916 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import OperationalError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from jobs.queue import claim_jobs, run_job
+from user.models import Address, CartItem, ProductFavorite, User, UserProduct
+from .catalog_io import import_catalog
+from .inventory import InsufficientStock, reserve_stock, restore_orders_stock
+from .models import (
+    Category, Inventory, Order, OrderItem, OrderItemReview, OrderNumberBlock, OrderNumberWorker, OrderStatusStat,
+    DailySales, ProductImage, ProductReview, ProductSKU, ProductSPU, RefundRequest, StripeEvent,
+)
+from .order_numbers import MAX_WORKER_ID, SEQUENCE_BITS, LeasedSnowflakeGenerator, SequenceGenerator, acquire_worker_id
+from .order_stats import compute_order_stats, rebuild_order_status_stats, transition_orders
+from .refunds import approve_refunds
+from .review_images import stage_review_image
+from .sales_rollup import mark_sales_day_dirty
+from .search import InvertedIndexSearchBackend
+from .stripe_events import retry_events
+from .tasks import grant_order_products
+
+
+def create_spu(category, name='商品', stock=10, price=10):
+    """创建带一个 SKU、库存和主图的 SPU"""
+    spu = ProductSPU.objects.create(name=name, category=category)
+    sku = ProductSKU.objects.create(spu=spu, title=f'{name} 默认', price=price)
+    Inventory.objects.create(sku=sku, quantity=stock)
+    ProductImage.objects.create(spu=spu, image=f'products/{spu.id}.jpg', is_main=True)
+    return spu
+
+
+class ProductSPUQueryCountTests(TestCase):
+    """SPU 列表 / 详情的查询数与每页条数无关"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='服装')
+        self.user = User.objects.create_user(username='buyer', password='x')
+        self.spus = [create_spu(self.category, f'商品{index}') for index in range(30)]
+        for spu in self.spus[::2]:
+            ProductFavorite.objects.create(user=self.user, product=spu)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def assert_list_queries_constant(self):
+        # 先请求一次，预热分类树等进程内缓存
+        self.client.get('/api/shopping/spu/?page_size=2')
+        small, _ = self.count_queries('/api/shopping/spu/?page_size=2')
+        with self.assertNumQueries(small):
+            response = self.client.get('/api/shopping/spu/?page_size=30')
+        self.assertEqual(len(response.data['results']), 30)
+        return response
+
+    def test_list_anonymous(self):
+        response = self.assert_list_queries_constant()
+        result = response.data['results'][0]
+        self.assertTrue(result['image'].endswith('.jpg'))
+        self.assertFalse(result['is_favorited'])
+
+    def test_list_authenticated(self):
+        self.client.force_authenticate(self.user)
+        response = self.assert_list_queries_constant()
+        favorited = {result['id'] for result in response.data['results'] if result['is_favorited']}
+        self.assertEqual(favorited, {spu.id for spu in self.spus[::2]})
+
+    def test_list_cursor_mode(self):
+        self.client.get('/api/shopping/spu/?pagination=cursor&page_size=2')
+        small, _ = self.count_queries('/api/shopping/spu/?pagination=cursor&page_size=2')
+        with self.assertNumQueries(small):
+            self.client.get('/api/shopping/spu/?pagination=cursor&page_size=30')
+
+    def test_invalid_min_rating_ignored(self):
+        for value in ('NaN', 'Infinity', '-inf', 'sNaN', 'abc'):
+            response = self.client.get(f'/api/shopping/spu/?min_rating={value}')
+            self.assertEqual(response.status_code, 200, value)
+            self.assertEqual(response.data['count'], 30)
+
+    def test_detail(self):
+        self.client.force_authenticate(self.user)
+        spu = self.spus[0]
+        queries, response = self.count_queries(f'/api/shopping/spu/{spu.id}/')
+        self.assertTrue(response.data['is_favorited'])
+        self.assertTrue(response.data['image'].endswith(f'{spu.id}.jpg'))
+        # 主对象 + 主图预加载（含认证后的收藏 EXISTS 注解在主查询中）
+        self.assertLessEqual(queries, 2)
+
+
+class CategoryListTests(TestCase):
+    """分类列表整个请求只读取一次分类树快照"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def category_cache_reads(self):
+        with mock.patch('shopping.category_tree.cache', wraps=cache) as tree_cache:
+            response = self.client.get('/api/shopping/categories/')
+        self.assertEqual(response.status_code, 200)
+        return tree_cache.get.call_count, response
+
+    def test_cache_reads_independent_of_category_count(self):
+        clothes = Category.objects.create(name='服装')
+        tops = Category.objects.create(name='上衣', parent=clothes)
+        self.category_cache_reads()
+        small, _ = self.category_cache_reads()
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(10):
+                Category.objects.create(name=f'T恤{index}', parent=tops)
+        # 版本号变化后第一次请求重新构建快照，之后每次请求只读取一次版本号
+        self.category_cache_reads()
+        large, response = self.category_cache_reads()
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(response.data[-1]['full_name'], '服装 > 上衣 > T恤9')
+
+
+def stock_of(spu):
+    return Inventory.objects.get(sku__spu=spu).quantity
+
+
+class ReserveStockConcurrencyTests(TransactionTestCase):
+    """多个线程（各自的数据库连接）同时扣减同一 SKU，不会超卖"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='服装')
+
+    def compete(self, sku_code, threads, quantity=1):
+        """threads 个线程同时扣减，返回成功次数"""
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def buy():
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        reserve_stock([(sku_code, quantity)])
+                        results.append(True)
+                        return
+                    except InsufficientStock:
+                        results.append(False)
+                        return
+                    except OperationalError:
+                        # SQLite 共享缓存模式下表锁冲突会立即报错而不是等待，重试即等同于等锁
+                        continue
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=buy) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(len(results), threads)
+        return results.count(True)
+
+    def test_last_unit(self):
+        spu = create_spu(self.category, stock=1)
+        sku_code = spu.skus.get().sku_code
+        self.assertEqual(self.compete(sku_code, threads=2), 1)
+        self.assertEqual(stock_of(spu), 0)
+
+    def test_no_oversell_under_contention(self):
+        spu = create_spu(self.category, stock=5)
+        sku_code = spu.skus.get().sku_code
+        self.assertEqual(self.compete(sku_code, threads=12), 5)
+        self.assertEqual(stock_of(spu), 0)
+
+    def test_multi_unit_requests(self):
+        spu = create_spu(self.category, stock=7)
+        sku_code = spu.skus.get().sku_code
+        # 每次扣 3 件，只能成功 2 次，剩 1 件
+        self.assertEqual(self.compete(sku_code, threads=6, quantity=3), 2)
+        self.assertEqual(stock_of(spu), 1)
+
+
+class OrderCreateStockTests(TestCase):
+    """下单扣减库存：库存不足时返回 400，整单回滚"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', password='x')
+        self.client.force_authenticate(self.user)
+        self.address = Address.objects.create(
+            user=self.user, name='张三', phone='1', province='p', city='c', district='d', address='x',
+        )
+        category = Category.objects.create(name='服装')
+        self.shirt = create_spu(category, '衬衫', stock=2)
+        self.hat = create_spu(category, '帽子', stock=5)
+        self.cart = [
+            CartItem.objects.create(user=self.user, sku=self.shirt.skus.get(), quantity=2),
+            CartItem.objects.create(user=self.user, sku=self.hat.skus.get(), quantity=1),
+        ]
+
+    def create_order(self):
+        return self.client.post('/api/shopping/orders/', {
+            'address_id': self.address.id, 'cart_item_ids': [item.id for item in self.cart],
+        }, format='json')
+
+    def test_create_reserves_stock(self):
+        response = self.create_order()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(stock_of(self.shirt), 0)
+        self.assertEqual(stock_of(self.hat), 4)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+    def test_stock_taken_after_validation_returns_400(self):
+        """校验通过后库存被其他订单抢走：条件 UPDATE 失败，返回 400，订单和其他 SKU 的扣减都回滚"""
+        shirt_sku = self.shirt.skus.get().sku_code
+
+        def competing_reserve(items):
+            # 模拟校验之后另一个订单买走了 1 件（与本请求在同一事务中，随请求一起回滚）
+            Inventory.objects.filter(sku_id=shirt_sku).update(quantity=1)
+            return reserve_stock(items)
+
+        with mock.patch('shopping.views.reserve_stock', side_effect=competing_reserve):
+            response = self.create_order()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('衬衫', str(response.data))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(stock_of(self.shirt), 2)
+        self.assertEqual(stock_of(self.hat), 5)
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+
+    def test_insufficient_stock_rejected_by_validation(self):
+        Inventory.objects.filter(sku__spu=self.shirt).update(quantity=1)
+        response = self.create_order()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class ProductSPUMaintainedFieldsTests(TestCase):
+    """由 UPDATE ... F() 维护的冗余字段不会被旧实例的 save() 覆盖"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reviewer', password='x')
+        self.spu = create_spu(Category.objects.create(name='服装'))
+
+    def test_stale_save_keeps_review_stats(self):
+        stale = ProductSPU.objects.get(id=self.spu.id)
+        ProductReview.objects.create(spu=self.spu, user=self.user, content='好', rating=4)
+
+        stale.name = '新名称'
+        stale.save()
+
+        self.spu.refresh_from_db()
+        self.assertEqual(self.spu.name, '新名称')
+        self.assertEqual((self.spu.review_count, self.spu.rating_total), (1, 4))
+        self.assertEqual(self.spu.rating_avg, Decimal('4.00'))
+
+    def test_stale_save_keeps_sku_counter(self):
+        stale = ProductSPU.objects.get(id=self.spu.id)
+        ProductSKU.objects.create(spu=self.spu, title='新规格', price=10)
+        counter = ProductSPU.objects.get(id=self.spu.id).sku_counter
+
+        stale.is_active = False
+        stale.save()
+        self.assertEqual(ProductSPU.objects.get(id=self.spu.id).sku_counter, counter)
+        # 计数未回退，下一个编码不会与已有 SKU 重复
+        sku = ProductSKU.objects.create(spu=self.spu, title='第三个规格', price=10)
+        self.assertEqual(sku.sku_code, f'{self.spu.id}-{counter + 1}')
+
+    def test_manage_edit_keeps_sku_counter(self):
+        staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        ProductSKU.objects.create(spu=self.spu, title='新规格', price=10)
+        counter = ProductSPU.objects.get(id=self.spu.id).sku_counter
+
+        with mock.patch('shopping.admin_views.get_object_or_404', return_value=ProductSPU.objects.get(id=self.spu.id)):
+            # 模拟编辑页加载 SPU 后，其他请求又分配了一个 SKU 编码
+            ProductSKU.objects.create(spu=self.spu, title='并发规格', price=10)
+            self.client.post(f'/manage/shopping/products/{self.spu.id}/edit/', {
+                'name': '新名称', 'category': self.spu.category_id, 'is_active': 'on',
+            })
+        spu = ProductSPU.objects.get(id=self.spu.id)
+        self.assertEqual(spu.name, '新名称')
+        self.assertEqual(spu.sku_counter, counter + 1)
+
+
+class SearchIndexInvalidationTests(TestCase):
+    """进程内倒排索引只在搜索字段变化时失效"""
+
+    def setUp(self):
+        cache.clear()
+        self.spu = create_spu(Category.objects.create(name='服装'), '红色T恤')
+
+    def version(self):
+        return cache.get(InvertedIndexSearchBackend.version_cache_key)
+
+    def save(self, spu, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            spu.save(**kwargs)
+
+    def test_non_search_fields_keep_index(self):
+        before = self.version()
+        spu = ProductSPU.objects.get(id=self.spu.id)
+        spu.is_active = False
+        self.save(spu)
+        ProductReview.objects.create(spu=spu, user=User.objects.create_user(username='u'), content='好', rating=5)
+        self.assertEqual(self.version(), before)
+
+    def test_search_field_change_invalidates(self):
+        backend = InvertedIndexSearchBackend()
+        self.assertEqual(backend.rank('蓝色'), [])
+        spu = ProductSPU.objects.get(id=self.spu.id)
+        spu.name = '蓝色T恤'
+        self.save(spu)
+        self.assertEqual(backend.rank('蓝色'), [spu.id])
+
+        # 同一实例再次保存且未修改时不失效
+        before = self.version()
+        self.save(spu)
+        self.assertEqual(self.version(), before)
+
+    def test_update_fields_without_search_fields(self):
+        before = self.version()
+        spu = ProductSPU.objects.get(id=self.spu.id)
+        spu.name = '改名但不保存该字段'
+        self.save(spu, update_fields=['is_active'])
+        self.assertEqual(self.version(), before)
+
+
+class ProductSearchFilterTests(TestCase):
+    """列表默认按上架时间排序，搜索按相关度；搜索结果先按列表条件过滤再截断到 max_results；品牌按包含匹配"""
+
+    def setUp(self):
+        cache.clear()
+        # 每个测试使用新的搜索后端，不沿用其他测试（已回滚的数据）建立的索引
+        patcher = mock.patch('shopping.search._backend', InvertedIndexSearchBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        category = Category.objects.create(name='服装')
+        # 下架商品得分更高，先截断时会占满名额
+        for index in range(3):
+            spu = create_spu(category, f'羊毛围巾 羊毛围巾 {index}')
+            ProductSPU.objects.filter(id=spu.id).update(is_active=False)
+        self.active = [create_spu(category, f'羊毛围巾 {index}') for index in range(2)]
+
+    def test_brand_substring_match(self):
+        ProductSPU.objects.filter(id=self.active[0].id).update(brand='索尼 Sony')
+        ProductSPU.objects.filter(id=self.active[1].id).update(brand='Sonya')
+        response = self.client.get('/api/shopping/spu/?brand=sony')
+        self.assertEqual({result['id'] for result in response.data['results']}, {spu.id for spu in self.active})
+        response = self.client.get('/api/shopping/spu/?brand=索尼&search=羊毛围巾')
+        self.assertEqual([result['id'] for result in response.data['results']], [self.active[0].id])
+
+    def test_default_order_and_search_relevance(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            response = self.client.get('/api/shopping/spu/?page_size=1')
+            second = self.client.get('/api/shopping/spu/?page_size=1&page=2')
+        self.assertEqual(
+            [response.data['results'][0]['id'], second.data['results'][0]['id']],
+            [self.active[1].id, self.active[0].id],
+        )
+        # 搜索时按相关度排序，不按上架时间
+        ProductSPU.objects.filter(id=self.active[0].id).update(name='羊毛围巾 羊毛围巾 羊毛围巾')
+        InvertedIndexSearchBackend.invalidate()
+        response = self.client.get('/api/shopping/spu/?search=羊毛围巾')
+        self.assertEqual(response.data['results'][0]['id'], self.active[0].id)
+
+    @mock.patch.object(InvertedIndexSearchBackend, 'max_results', 2)
+    def test_inactive_matches_do_not_take_the_cap(self):
+        response = self.client.get('/api/shopping/spu/?search=羊毛围巾')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({result['id'] for result in response.data['results']}, {spu.id for spu in self.active})
+
+
+class CursorPaginationOrderingTests(TestCase):
+    """游标分页沿用当前排序（?ordering=、搜索相关度），翻页不重复、不遗漏"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('shopping.search._backend', InvertedIndexSearchBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        category = Category.objects.create(name='服装')
+        self.spus = [create_spu(category, f'T恤{index}') for index in range(7)]
+        # 评分有重复，验证 id 兜底
+        for index, spu in enumerate(self.spus):
+            ProductSPU.objects.filter(id=spu.id).update(rating_avg=Decimal(index % 3), review_count=index % 3)
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [result['id'] for result in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_ordering_param(self):
+        ids = self.collect('/api/shopping/spu/?pagination=cursor&page_size=2&ordering=-rating_avg')
+        expected = list(
+            ProductSPU.objects.order_by('-rating_avg', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_search_relevance(self):
+        full = self.client.get('/api/shopping/spu/?search=T恤&page_size=100')
+        expected = [result['id'] for result in full.data['results']]
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(self.collect('/api/shopping/spu/?search=T恤&pagination=cursor&page_size=3'), expected)
+
+    def test_unsupported_ordering_rejected(self):
+        # 外键排序会展开为关联模型的排序列，无法构建游标
+        with mock.patch('shopping.views.ProductSPUViewSet.ordering_fields', ['rating_avg', 'category']):
+            response = self.client.get('/api/shopping/spu/?pagination=cursor&ordering=category')
+        self.assertEqual(response.status_code, 400)
+
+
+def create_order(user, skus, status='pending', order_number='ORD-TEST'):
+    """直接创建订单和订单行（每个 SKU 一行，数量 1）"""
+    order = Order.objects.create(
+        order_number=order_number, user=user, status=status, receiver_name='张三', receiver_phone='1',
+        receiver_province='p', receiver_city='c', receiver_district='d', receiver_address='x',
+        total_amount=10 * len(skus),
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, sku=sku, sku_title=sku.title, spu_name=sku.spu.name, price=10, quantity=1, subtotal=10)
+        for sku in skus
+    ])
+    return order
+
+
+def run_due_jobs():
+    """执行全部到期的后台任务，返回 JobResult 列表"""
+    return [run_job(job, 'test-worker') for job in claim_jobs('test-worker', 100)]
+
+
+def sign_stripe_payload(payload, secret, timestamp=None):
+    """按 Stripe 的签名规则生成 Stripe-Signature 请求头（t=时间戳,v1=HMAC-SHA256）"""
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookTests(TestCase):
+    """Webhook 验签、按事件 id 去重，以及后台任务的重试和失败状态"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', password='x')
+        spu = create_spu(Category.objects.create(name='音乐'), '数字专辑')
+        self.sku = spu.skus.get()
+        self.order = create_order(self.user, [self.sku])
+
+    def post_event(self, event_id='evt_1', secret='whsec_test'):
+        payload = json.dumps({
+            'id': event_id, 'type': 'checkout.session.completed',
+            'data': {'object': {'metadata': {'order_id': str(self.order.id)}}},
+        })
+        return self.client.post(
+            '/api/shopping/payments/webhook/', payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=sign_stripe_payload(payload, secret),
+        )
+
+    def test_invalid_signature_rejected(self):
+        self.assertEqual(self.post_event(secret='whsec_other').status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_duplicate_event_processed_once(self):
+        self.assertEqual(self.post_event().status_code, 200)
+        self.assertEqual(self.post_event().status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        self.assertEqual(Job.objects.filter(name='shopping.process_stripe_event').count(), 1)
+
+        self.assertTrue(all(result.ok for result in run_due_jobs()))
+        # 支付任务添加的拥有权任务
+        run_due_jobs()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+        self.assertEqual(StripeEvent.objects.get().status, 'processed')
+        self.assertTrue(UserProduct.objects.filter(user=self.user, sku=self.sku).exists())
+        self.assertFalse(Job.objects.exists())
+
+        # 处理完成后 Stripe 再次推送，不会重复处理
+        self.assertEqual(self.post_event().status_code, 200)
+        self.assertFalse(Job.objects.exists())
+
+    def test_retry_then_failed(self):
+        self.post_event()
+        job = Job.objects.get()
+
+        with mock.patch.dict('shopping.stripe_events.EVENT_HANDLERS', {
+            'checkout.session.completed': mock.Mock(side_effect=RuntimeError('Stripe 超时')),
+        }):
+            [result] = run_due_jobs()
+            self.assertFalse(result.ok)
+            job.refresh_from_db()
+            # 失败后重新排队并延后执行，事件保持待处理，订单状态随任务事务回滚
+            self.assertEqual((job.status, job.attempts), ('queued', 1))
+            self.assertGreater(job.run_at, timezone.now())
+            self.assertIn('Stripe 超时', job.last_error)
+            self.assertEqual(StripeEvent.objects.get().status, 'pending')
+            self.assertEqual(Order.objects.get(id=self.order.id).status, 'pending')
+            self.assertEqual(run_due_jobs(), [])
+
+            # 最后一次仍失败：任务和事件都标记为 failed
+            Job.objects.filter(id=job.id).update(run_at=timezone.now(), attempts=job.max_attempts - 1)
+            run_due_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        stripe_event = StripeEvent.objects.get()
+        self.assertEqual(stripe_event.status, 'failed')
+        self.assertIn('Stripe 超时', stripe_event.last_error)
+
+        # Admin 重新处理失败的事件
+        self.assertEqual(retry_events(StripeEvent.objects.all()), 1)
+        self.assertEqual(StripeEvent.objects.get().status, 'pending')
+        run_due_jobs()
+        self.assertEqual(StripeEvent.objects.get().status, 'processed')
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'paid')
+
+
+class ReviewImageTaskTests(TestCase):
+    """评价图片由后台任务处理：成功、无法解码、重试次数用完"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        user = User.objects.create_user(username='reviewer', password='x')
+        spu = create_spu(Category.objects.create(name='服装'))
+        order = create_order(user, [spu.skus.get()], status='completed')
+        self.review = OrderItemReview.objects.create(
+            order_item=order.items.get(), user=user, spu=spu, content='好', rating=5,
+        )
+
+    def stage(self, content, name='photo.png'):
+        review_image = stage_review_image(self.review, ContentFile(content, name=name))
+        self.assertTrue(Job.objects.filter(name='shopping.process_review_image', payload={'image_id': review_image.id}).exists())
+        return review_image
+
+    def run_jobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return run_due_jobs()
+
+    def png(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_processed(self):
+        review_image = self.stage(self.png())
+        staged = review_image.image.name
+        self.assertTrue(all(result.ok for result in self.run_jobs()))
+        review_image.refresh_from_db()
+        self.assertEqual(review_image.status, 'ready')
+        self.assertTrue(review_image.image.name.startswith(f'reviews/{self.review.spu_id}/'))
+        self.assertFalse(default_storage.exists(staged))
+
+    def test_rejected_image_fails_without_retry(self):
+        review_image = self.stage(b'not an image')
+        staged = review_image.image.name
+        self.run_jobs()
+        review_image.refresh_from_db()
+        self.assertEqual(review_image.status, 'failed')
+        self.assertEqual(review_image.last_error, '无法识别的图片')
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(default_storage.exists(staged))
+
+    def test_attempts_exhausted(self):
+        review_image = self.stage(self.png())
+        staged = review_image.image.name
+        with mock.patch('shopping.review_images.convert_review_image', side_effect=OSError('存储不可用')):
+            self.run_jobs()
+            review_image.refresh_from_db()
+            self.assertEqual(review_image.status, 'pending')
+            self.assertTrue(default_storage.exists(staged))
+
+            job = Job.objects.get()
+            Job.objects.filter(id=job.id).update(run_at=timezone.now(), attempts=job.max_attempts - 1)
+            self.run_jobs()
+        review_image.refresh_from_db()
+        self.assertEqual(review_image.status, 'failed')
+        self.assertIn('存储不可用', review_image.last_error)
+        self.assertFalse(default_storage.exists(staged))
+
+
+class OwnershipGrantQueryCountTests(TestCase):
+    """发放商品拥有权的语句数与订单行数无关"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', password='x')
+        category = Category.objects.create(name='音乐')
+        self.skus = [create_spu(category, f'专辑{index}').skus.get() for index in range(50)]
+
+    def grant_queries(self, order):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(all(result.ok for result in run_due_jobs()))
+        return len(queries)
+
+    def test_grant_task(self):
+        small = create_order(self.user, self.skus[:2], order_number='ORD-SMALL')
+        grant_order_products.enqueue(order_id=small.id)
+        small_queries = self.grant_queries(small)
+
+        large = create_order(self.user, self.skus, order_number='ORD-LARGE')
+        grant_order_products.enqueue(order_id=large.id)
+        self.assertEqual(self.grant_queries(large), small_queries)
+        self.assertEqual(UserProduct.objects.filter(user=self.user).count(), 50)
+
+        # 已拥有的 SKU 不重复写入
+        grant_order_products.enqueue(order_id=large.id)
+        self.assertEqual(self.grant_queries(large), small_queries)
+        self.assertEqual(UserProduct.objects.filter(user=self.user).count(), 50)
+
+    def test_pay_order_enqueues_grant(self):
+        self.client.force_authenticate(self.user)
+        order = create_order(self.user, self.skus)
+        response = self.client.post(f'/api/shopping/orders/{order.id}/pay/')
+        self.assertEqual(response.status_code, 200)
+        # 支付接口只添加任务，拥有权由 worker 发放
+        self.assertEqual(Job.objects.filter(name='shopping.grant_order_products').count(), 1)
+        self.assertFalse(UserProduct.objects.exists())
+        run_due_jobs()
+        self.assertEqual(UserProduct.objects.filter(user=self.user).count(), 50)
+
+
+class CatalogImportSkuCodeTests(TestCase):
+    """导入时指定新 SKU 编码：只接受大于已分配序号的编码"""
+
+    def setUp(self):
+        self.spu = create_spu(Category.objects.create(name='服装'))
+        # 分配到 3 号后删除 2、3 号，序号不能再被使用
+        ProductSKU.objects.create(spu=self.spu, title='规格2', price=10)
+        ProductSKU.objects.create(spu=self.spu, title='规格3', price=10)
+        ProductSKU.objects.filter(sku_code__in=[f'{self.spu.id}-2', f'{self.spu.id}-3']).delete()
+
+    def import_rows(self, *codes):
+        lines = [json.dumps({'sku_code': code, 'spu_id': self.spu.id, 'title': code, 'price': '9.9'}) for code in codes]
+        return import_catalog(io.BytesIO('\n'.join(lines).encode()), 'jsonl')
+
+    def test_allocated_number_rejected(self):
+        result = self.import_rows(f'{self.spu.id}-3')
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn('已分配过', result.errors[0][1])
+        self.assertFalse(ProductSKU.objects.filter(sku_code=f'{self.spu.id}-3').exists())
+
+    def test_new_number_accepted_and_counter_advanced(self):
+        result = self.import_rows(f'{self.spu.id}-10')
+        self.assertEqual(result.errors, [])
+        self.assertTrue(ProductSKU.objects.filter(sku_code=f'{self.spu.id}-10').exists())
+        sku = ProductSKU.objects.create(spu=self.spu, title='自动分配', price=10)
+        self.assertEqual(sku.sku_code, f'{self.spu.id}-11')
+
+
+class _Rollback(Exception):
+    pass
+
+
+class OrderNumberAllocationTests(TestCase):
+    """号段和 worker id 租约：回滚的分配不会继续使用，过期租约被回收"""
+
+    def rolled_back(self, func):
+        # 在随后回滚的事务中调用 func
+        try:
+            with transaction.atomic():
+                func()
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def test_sequence_block_used_only_after_commit(self):
+        generator = SequenceGenerator(block_size=10)
+        self.rolled_back(generator.next_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = generator.next_id()
+        second = generator.next_id()
+        self.assertEqual(second, first + 1)
+        # 两个号码都来自已提交的号段
+        self.assertTrue(OrderNumberBlock.objects.filter(id=first // 10).exists())
+
+    def test_expired_worker_id_reclaimed(self):
+        self.assertEqual(acquire_worker_id('a', 60), 0)
+        self.assertEqual(acquire_worker_id('b', 60), 1)
+        OrderNumberWorker.objects.filter(worker_id=0).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(acquire_worker_id('c', 60), 0)
+        self.assertEqual(OrderNumberWorker.objects.get(worker_id=0).holder, 'c')
+
+    def test_all_worker_ids_leased(self):
+        expires_at = timezone.now() + timedelta(minutes=1)
+        OrderNumberWorker.objects.bulk_create([
+            OrderNumberWorker(worker_id=worker_id, holder='x', expires_at=expires_at)
+            for worker_id in range(MAX_WORKER_ID + 1)
+        ])
+        with self.assertRaises(RuntimeError):
+            acquire_worker_id('y', 60)
+
+    def test_lease_renewed_and_reacquired(self):
+        now = [0.0]
+        with self.captureOnCommitCallbacks(execute=True):
+            generator = LeasedSnowflakeGenerator(60, holder='me', monotonic=lambda: now[0])
+        self.assertEqual(generator.worker_id, 0)
+        OrderNumberWorker.objects.filter(worker_id=0).update(expires_at=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            generator.next_id()
+        self.assertEqual(len(queries), 0)
+
+        # 超过半个租期：续期
+        now[0] = 31
+        with self.captureOnCommitCallbacks(execute=True):
+            generator.next_id()
+        self.assertGreater(OrderNumberWorker.objects.get(worker_id=0).expires_at, timezone.now() + timedelta(seconds=50))
+
+        # 租约已被其他进程回收：改用新的 worker id
+        OrderNumberWorker.objects.filter(worker_id=0).update(holder='other')
+        now[0] = 62
+        with self.captureOnCommitCallbacks(execute=True):
+            number = generator.next_id()
+        self.assertEqual(generator.worker_id, 1)
+        self.assertEqual((number >> SEQUENCE_BITS) & MAX_WORKER_ID, 1)
+
+    def test_lease_from_rolled_back_transaction_reacquired(self):
+        generators = []
+        self.rolled_back(lambda: generators.append(LeasedSnowflakeGenerator(60, holder='me')))
+        self.assertFalse(OrderNumberWorker.objects.exists())
+        generators[0].next_id()
+        self.assertEqual(OrderNumberWorker.objects.get(worker_id=generators[0].worker_id).holder, 'me')
+
+
+@override_settings(ORDER_STATS_SHARDS=4)
+class OrderStatusStatShardTests(TestCase):
+    """订单状态汇总分散写入多个分片，统计时按状态求和"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='x')
+        sku = create_spu(Category.objects.create(name='服装')).skus.get()
+        for index in range(40):
+            create_order(self.user, [sku], order_number=f'ORD-SHARD-{index}')
+
+    def test_counters_spread_over_shards(self):
+        shards = set(OrderStatusStat.objects.filter(status='pending').values_list('shard', flat=True))
+        self.assertGreater(len(shards), 1)
+        self.assertTrue(shards <= set(range(4)))
+
+        transition_orders(Order.objects.order_by('id'), 'pending', 'paid', limit=15, paid_at=timezone.now())
+        stats = compute_order_stats()
+        self.assertEqual((stats['total_orders'], stats['pending_orders'], stats['paid_orders']), (40, 25, 15))
+        self.assertEqual(stats['total_amount'], Decimal('150'))
+
+    def test_rebuild_matches_sharded_totals(self):
+        Order.objects.filter(order_number='ORD-SHARD-0').get().delete()
+        before = compute_order_stats()
+        rebuild_order_status_stats()
+        self.assertEqual(OrderStatusStat.objects.filter(status='pending').count(), 1)
+        self.assertEqual(compute_order_stats(), before)
+
+
+class ConfirmDeliveryTests(TestCase):
+    """确认收货在锁定订单后检查状态，重复确认不会重复计入汇总表或重复发放商品"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', password='x')
+        self.client.force_authenticate(self.user)
+        sku = create_spu(Category.objects.create(name='服装')).skus.get()
+        self.order = create_order(self.user, [sku], status='shipped')
+
+    def assert_completed_once(self):
+        stats = compute_order_stats()
+        self.assertEqual((stats['shipped_orders'], stats['completed_orders']), (0, 1))
+        self.assertEqual(Job.objects.filter(name='shopping.grant_order_products').count(), 1)
+
+    def test_stale_order_rechecked_under_lock(self):
+        # 模拟并发：本请求读到 shipped 后，另一个请求已完成确认
+        stale = Order.objects.get(id=self.order.id)
+        self.client.post(f'/api/shopping/orders/{self.order.id}/confirm_delivery/')
+        with mock.patch('shopping.views.OrderViewSet.get_object', return_value=stale):
+            response = self.client.post(f'/api/shopping/orders/{self.order.id}/confirm_delivery/')
+        self.assertEqual(response.status_code, 400)
+        self.assert_completed_once()
+
+    def test_legacy_confirm_endpoint(self):
+        self.assertEqual(self.client.post(f'/api/shopping/orders/{self.order.id}/confirm/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/shopping/orders/{self.order.id}/confirm/').status_code, 400)
+        self.assert_completed_once()
+
+
+class RefundApprovalTests(TestCase):
+    """批量同意退款：订单改为已取消，库存按 SKU 汇总后由后台任务恢复，已处理的申请不会重复恢复"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='x')
+        category = Category.objects.create(name='服装')
+        self.shirt = create_spu(category, 'T恤', stock=10)
+        self.hat = create_spu(category, '帽子', stock=10)
+        shirt_sku, hat_sku = self.shirt.skus.get(), self.hat.skus.get()
+        # 两个订单都包含 T恤
+        self.orders = [
+            create_order(self.user, [shirt_sku, hat_sku], status='paid', order_number='ORD-REFUND-1'),
+            create_order(self.user, [shirt_sku], status='shipped', order_number='ORD-REFUND-2'),
+        ]
+        self.refunds = [
+            RefundRequest.objects.create(order=order, reason='other', description='-', refund_amount=order.total_amount)
+            for order in self.orders
+        ]
+
+    def test_batch_approve_view(self):
+        staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.post('/manage/shopping/refunds/batch-approve/', {
+            'refund_ids[]': [refund.id for refund in self.refunds],
+        })
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'cancelled'})
+        self.assertEqual(set(RefundRequest.objects.values_list('status', flat=True)), {'approved'})
+
+        # 库存在后台任务中恢复
+        self.assertEqual((stock_of(self.shirt), stock_of(self.hat)), (10, 10))
+        run_due_jobs()
+        self.assertEqual((stock_of(self.shirt), stock_of(self.hat)), (12, 11))
+
+        # 再次批准同一批申请：没有待处理的申请，不会再次恢复库存
+        response = self.client.post('/manage/shopping/refunds/batch-approve/', {
+            'refund_ids[]': [refund.id for refund in self.refunds],
+        })
+        self.assertEqual(response.json()['message'], '成功批准 0 个退款申请')
+        run_due_jobs()
+        self.assertEqual((stock_of(self.shirt), stock_of(self.hat)), (12, 11))
+
+    def test_already_approved_refund_not_restored_again(self):
+        approve_refunds(RefundRequest.objects.filter(id=self.refunds[0].id))
+        self.assertEqual((stock_of(self.shirt), stock_of(self.hat)), (11, 11))
+        refund_ids, order_ids = approve_refunds(RefundRequest.objects.filter(id__in=[r.id for r in self.refunds]))
+        self.assertEqual((refund_ids, order_ids), ([self.refunds[1].id], [self.orders[1].id]))
+        self.assertEqual((stock_of(self.shirt), stock_of(self.hat)), (12, 11))
+
+    def test_cancelled_order_with_pending_refund_not_restored(self):
+        Order.objects.filter(id=self.orders[0].id).update(status='cancelled')
+        refund_ids, order_ids = approve_refunds(RefundRequest.objects.filter(id__in=[r.id for r in self.refunds]))
+        self.assertEqual(len(refund_ids), 2)
+        self.assertEqual(order_ids, [self.orders[1].id])
+        self.assertEqual((stock_of(self.shirt), stock_of(self.hat)), (11, 10))
+
+    def test_restore_queries_independent_of_order_count(self):
+        def count(order_ids):
+            with CaptureQueriesContext(connection) as queries:
+                restore_orders_stock(order_ids)
+            return len(queries)
+
+        sku = self.shirt.skus.get()
+        more = [create_order(self.user, [sku], order_number=f'ORD-REFUND-X{index}') for index in range(10)]
+        self.assertEqual(count([self.orders[0].id]), count([order.id for order in more]))
+        self.assertEqual(stock_of(self.shirt), 10 + 1 + 10)
+
+
+class SalesDayDirtyMarkTests(TestCase):
+    """销售日期的待汇总标记在事务提交后写入，已标记的日期不再更新"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='x')
+        self.sku = create_spu(Category.objects.create(name='服装')).skus.get()
+        self.today = timezone.localdate()
+
+    def test_marked_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            order = create_order(self.user, [self.sku])
+            order.status, order.paid_at = 'paid', timezone.now()
+            order.save()
+            self.assertFalse(DailySales.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertTrue(DailySales.objects.get(date=self.today).is_dirty)
+
+    def test_only_clean_day_updated(self):
+        DailySales.objects.create(date=self.today, is_dirty=True)
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                mark_sales_day_dirty(timezone.now())
+        # 条件 UPDATE 只匹配 is_dirty=False 的行
+        update = queries[0]['sql']
+        self.assertTrue(update.startswith('UPDATE'))
+        self.assertIn('is_dirty', update.split('WHERE')[1])
+
+        DailySales.objects.filter(date=self.today).update(is_dirty=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_sales_day_dirty(timezone.now())
+        self.assertTrue(DailySales.objects.get(date=self.today).is_dirty)
@@ -1,5 +1,6 @@
 from django.shortcuts import render, get_object_or_404
 from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value, BooleanField
 from django.utils import timezone
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
@@ -7,17 +8,21 @@ from django.http import HttpResponse
 import stripe
 import json
 import os
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import viewsets
+from rest_framework import filters
 
 from .models import (
     ProductSPU, ProductSKU, Attribute, AttributeValue, 
     ProductSKUAttributeValue, ProductSPUAttribute, ProductReview, 
-    Category, Order, OrderItem, Inventory, RefundRequest, OrderItemReview
+    Category, Order, OrderItem, Inventory, RefundRequest, OrderItemReview,
+    ProductImage
 )
 from .serializers import (
     ProductSPUSerializer, ProductSKUSerializer, ProductReviewSerializer, 
@@ -25,7 +30,15 @@ from .serializers import (
     OrderCreateSerializer, OrderItemSerializer, RefundRequestSerializer,
     OrderItemReviewSerializer, UserOwnedProductSerializer
 )
-from .pagination import ProductPagination
+from .pagination import ProductPagination, OrderPagination
+from .inventory import InsufficientStock, reserve_stock, restore_orders_stock
+from .sku_matrix import get_cached_sku_matrix, get_sku_matrix, absolutize_sku_matrix
+from .search import search_products
+from .stripe_events import record_event
+from .tasks import grant_order_products
+from .category_tree import descendants_q, get_category_tree
+from .order_stats import transition_orders
+from .order_expiry import pending_order_expires_at
 
 # Create your views here.
 
@@ -41,6 +54,12 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """返回所有分类，按树形结构排序"""
         return Category.objects.all().order_by('tree_id', 'lft')
+    
+    def get_serializer_context(self):
+        """整个请求只取一次分类树快照，序列化每个分类的完整名称时直接使用"""
+        context = super().get_serializer_context()
+        context['category_tree'] = get_category_tree()
+        return context
 
 
 class ProductSPUViewSet(viewsets.ModelViewSet):
@@ -51,95 +70,90 @@ class ProductSPUViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSPUSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = ProductPagination
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['rating_avg', 'review_count', 'created_at']  # ?ordering=-rating_avg
     
     def get_queryset(self):
-        queryset = ProductSPU.objects.filter(is_active=True)
+        # 默认按上架时间倒序（id 保证顺序唯一，分页不重复、不遗漏）；?ordering= 和搜索相关度会替换该排序
+        queryset = ProductSPU.objects.filter(is_active=True).order_by('-created_at', '-id')
+        if self.action in ('list', 'retrieve'):
+            queryset = self.annotate_list_fields(queryset)
         
         # 按分类过滤（包含子分类）
         category_id = self.request.query_params.get('category')
         if category_id:
-            try:
-                category = Category.objects.get(id=category_id)
-                # 获取该分类及其所有子分类
-                categories = category.get_descendants(include_self=True)
-                queryset = queryset.filter(category__in=categories)
-            except Category.DoesNotExist:
-                pass
-        
-        # 按品牌过滤
+            # 从分类树快照取该分类的 lft/rght 区间，一个条件覆盖所有子分类
+            condition = descendants_q(category_id)
+            if condition is not None:
+                queryset = queryset.filter(condition)
+        
+        # 按品牌过滤（包含匹配，如 Sony 也能匹配“索尼 Sony”）
         brand = self.request.query_params.get('brand')
         if brand:
             queryset = queryset.filter(brand__icontains=brand)
         
-        # 搜索
+        # 按最低评分 / 最少评价数过滤
+        min_rating = self.request.query_params.get('min_rating')
+        if min_rating:
+            try:
+                min_rating = Decimal(min_rating)
+            except InvalidOperation:
+                min_rating = None
+            # NaN / Infinity 能解析但执行查询时才报错，同样忽略
+            if min_rating is not None and min_rating.is_finite():
+                queryset = queryset.filter(rating_avg__gte=min_rating)
+        
+        min_reviews = self.request.query_params.get('min_reviews')
+        if min_reviews and min_reviews.isdigit():
+            queryset = queryset.filter(review_count__gte=int(min_reviews))
+        
+        # 全文搜索（名称、描述、品牌、系列），结果按相关度排序
         search = self.request.query_params.get('search')
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = search_products(queryset, search)
         
         return queryset
     
-    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
-    def skus(self, request, pk=None):
+    def annotate_list_fields(self, queryset):
         """
-        获取SPU的所有SKU信息，包括属性、库存、价格
+        批量计算序列化器需要的主图和收藏状态，避免每行额外查询
+        （评论数直接读取 ProductSPU.review_count 冗余字段）
         """
-        spu = self.get_object()
-        
-        # 获取SPU的所有属性
-        spu_attributes = ProductSPUAttribute.objects.filter(spu=spu).select_related('attribute')
-        
-        # 构建属性和属性值的数据结构
-        attributes_data = []
-        for spu_attr in spu_attributes:
-            attribute = spu_attr.attribute
-            # 获取该SPU下所有SKU使用的属性值
-            attribute_values = AttributeValue.objects.filter(
-                productskuattributevalue__sku__spu=spu,
-                attribute=attribute
-            ).distinct()
-            
-            attributes_data.append({
-                'id': attribute.id,
-                'name': attribute.name,
-                'values': [{'id': av.id, 'value': av.value} for av in attribute_values]
-            })
+        from user.models import ProductFavorite
         
-        # 获取所有SKU及其属性值
-        skus = ProductSKU.objects.filter(spu=spu, is_active=True).prefetch_related(
-            'attribute_values__attribute',
-            'attribute_values__attribute_value',
-            'inventory',
-            'images'  # 预加载SKU图片
+        # 主图：一次查询预加载当前页所有SPU的主图
+        queryset = queryset.prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.filter(is_main=True), to_attr='main_images')
         )
         
-        # 获取SPU主图
-        spu_main_image = spu.images.filter(is_main=True).first()
-        spu_image_url = request.build_absolute_uri(spu_main_image.image.url) if spu_main_image else None
-        
-        skus_data = []
-        for sku in skus:
-            sku_attrs = {}
-            for sku_attr_value in sku.attribute_values.all():
-                sku_attrs[sku_attr_value.attribute.id] = sku_attr_value.attribute_value.id
-            
-            # 获取SKU图片，如果没有则使用SPU主图
-            sku_image = sku.images.first()
-            image_url = request.build_absolute_uri(sku_image.image.url) if sku_image else spu_image_url
-            
-            inventory = getattr(sku, 'inventory', None)
-            skus_data.append({
-                'sku_code': sku.sku_code,
-                'title': sku.title,
-                'price': str(sku.price),
-                'stock': inventory.quantity if inventory else 0,
-                'attributes': sku_attrs,
-                'image': image_url  # 添加图片URL
-            })
+        # 收藏状态：EXISTS 子查询
+        user = self.request.user
+        if user.is_authenticated:
+            is_favorited = Exists(ProductFavorite.objects.filter(user=user, product=OuterRef('pk')))
+        else:
+            is_favorited = Value(False, output_field=BooleanField())
         
-        return Response({
-            'attributes': attributes_data,
-            'skus': skus_data
-        })
+        return queryset.annotate(is_favorited=is_favorited)
+    
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def skus(self, request, pk=None):
+        """
+        获取SPU的所有SKU信息，包括属性、库存、价格
+        结果整体缓存，并支持 ETag / If-None-Match 条件请求
+        """
+        cached = get_cached_sku_matrix(pk) if str(pk).isdigit() else None
+        if cached is None:
+            spu = self.get_object()
+            cached = get_sku_matrix(spu)
+        payload, etag = cached
+        
+        etag = f'"{etag}"'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(absolutize_sku_matrix(payload, request))
+        response['ETag'] = etag
+        return response
     
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def reviews(self, request, pk=None):
@@ -150,7 +164,7 @@ class ProductSPUViewSet(viewsets.ModelViewSet):
         # 获取该SPU的所有订单评价
         reviews = OrderItemReview.objects.filter(spu=spu).select_related(
             'user', 'order_item'
-        ).order_by('-created_at')
+        ).prefetch_related('review_images').order_by('-created_at')
         serializer = OrderItemReviewSerializer(reviews, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -183,6 +197,7 @@ class OrderViewSet(viewsets.ModelViewSet):
     """订单管理视图集"""
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderPagination  # 支持 ?pagination=cursor
     
     def get_queryset(self):
         queryset = Order.objects.filter(user=self.request.user).prefetch_related('items__sku__spu')
@@ -234,20 +249,17 @@ class OrderViewSet(viewsets.ModelViewSet):
             remark=remark
         )
         
-        # 创建订单商品并扣减库存
+        # 扣减库存（条件 UPDATE，一条语句完成整批扣减，防止并发超卖）
+        try:
+            reserve_stock((item.sku_id, item.quantity) for item in cart_items)
+        except InsufficientStock as e:
+            from rest_framework import serializers as drf_serializers
+            titles = [item.sku.title for item in cart_items if item.sku_id in e.sku_codes]
+            raise drf_serializers.ValidationError(f'商品 {"、".join(titles)} 库存不足')
+        
+        # 创建订单商品
         for cart_item in cart_items:
             sku = cart_item.sku
-            inventory = sku.inventory
-            
-            # 再次检查库存（防止并发问题）
-            if inventory.quantity < cart_item.quantity:
-                raise serializers.ValidationError(f'商品 {sku.title} 库存不足')
-            
-            # 扣减库存
-            inventory.quantity -= cart_item.quantity
-            inventory.save()
-            
-            # 创建订单商品
             OrderItem.objects.create(
                 order=order,
                 sku=sku,
@@ -271,20 +283,15 @@ class OrderViewSet(viewsets.ModelViewSet):
         """取消订单"""
         order = self.get_object()
         
-        if order.status != 'pending':
-            return Response({'error': '只能取消待支付的订单'}, status=status.HTTP_400_BAD_REQUEST)
-        
         with transaction.atomic():
-            # 恢复库存
-            for item in order.items.all():
-                inventory = item.sku.inventory
-                inventory.quantity += item.quantity
-                inventory.save()
+            # 锁定订单并只在仍为待支付时改状态，避免与 expire_orders 或支付同时处理而重复恢复库存
+            if not transition_orders(Order.objects.filter(pk=order.pk), 'pending', 'cancelled'):
+                return Response({'error': '只能取消待支付的订单'}, status=status.HTTP_400_BAD_REQUEST)
             
-            # 更新订单状态
-            order.status = 'cancelled'
-            order.save()
+            # 恢复库存
+            restore_orders_stock([order.pk])
         
+        order.refresh_from_db()
         serializer = self.get_serializer(order)
         return Response(serializer.data)
     
@@ -325,30 +332,25 @@ class OrderViewSet(viewsets.ModelViewSet):
         """确认收货"""
         order = self.get_object()
         
-        if order.status != 'shipped':
-            return Response({
-                'error': '只能确认已发货的订单'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         with transaction.atomic():
+            # 锁定订单后再检查状态，并发的重复确认只有一个成功（避免重复计入汇总表、重复发放）
+            order = Order.objects.select_for_update().get(pk=order.pk)
+            if order.status != 'shipped':
+                return Response({
+                    'error': '只能确认已发货的订单'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
             # 更新订单状态
             order.status = 'completed'
             order.completed_at = timezone.now()
             order.save()
             
-            # 将商品添加到用户拥有列表
-            from user.models import UserProduct
-            for item in order.items.all():
-                # 使用get_or_create，如果已存在则不重复添加
-                user_product, created = UserProduct.objects.get_or_create(
-                    user=order.user,
-                    sku=item.sku
-                )
-                # UserProduct模型中没有quantity和order字段，只需创建即可
+            # 由后台任务将商品添加到用户拥有列表（随订单状态一起提交，已拥有的不重复添加）
+            grant_order_products.enqueue(order_id=order.id)
         
         serializer = self.get_serializer(order)
         return Response({
-            'message': '确认收货成功，商品已添加到您的拥有列表',
+            'message': '确认收货成功，商品将添加到您的拥有列表',
             'order': serializer.data
         }, status=status.HTTP_200_OK)
 
@@ -360,24 +362,20 @@ def pay_order(request, order_id):
     user = request.user
     
     try:
-        order = Order.objects.get(id=order_id, user=user)
-        
-        if order.status != 'pending':
-            return Response({'error': '订单状态不正确'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 模拟支付成功
-        order.status = 'paid'
-        order.paid_at = timezone.now()
-        order.save()
-        
-        # 如果用户购买的是虚拟商品（音乐等），自动添加到用户拥有的商品
-        from user.models import UserProduct
-        for item in order.items.all():
-            UserProduct.objects.get_or_create(
-                user=user,
-                sku=item.sku,
-                defaults={'purchased_at': timezone.now()}
-            )
+        with transaction.atomic():
+            # 锁定订单，避免与 expire_orders 超时取消同时处理
+            order = Order.objects.select_for_update().get(id=order_id, user=user)
+            
+            if order.status != 'pending':
+                return Response({'error': '订单状态不正确'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # 模拟支付成功
+            order.status = 'paid'
+            order.paid_at = timezone.now()
+            order.save()
+            
+            # 如果用户购买的是虚拟商品（音乐等），由后台任务自动添加到用户拥有的商品
+            grant_order_products.enqueue(order_id=order.id)
         
         serializer = OrderSerializer(order, context={'request': request})
         return Response({
@@ -396,29 +394,24 @@ def confirm_order(request, order_id):
     user = request.user
     
     try:
-        order = Order.objects.get(id=order_id, user=user)
-        
-        if order.status != 'shipped':
-            return Response({'error': '只能确认已发货的订单'}, status=status.HTTP_400_BAD_REQUEST)
-        
         with transaction.atomic():
+            # 锁定订单后再检查状态，并发的重复确认只有一个成功
+            order = Order.objects.select_for_update().get(id=order_id, user=user)
+            
+            if order.status != 'shipped':
+                return Response({'error': '只能确认已发货的订单'}, status=status.HTTP_400_BAD_REQUEST)
+            
             # 更新订单状态
             order.status = 'completed'
             order.completed_at = timezone.now()
             order.save()
             
-            # 将订单中的商品添加到用户拥有的商品中
-            from user.models import UserProduct
-            for item in order.items.all():
-                # 使用get_or_create，如果已存在则不重复添加
-                UserProduct.objects.get_or_create(
-                    user=user,
-                    sku=item.sku
-                )
+            # 由后台任务将订单中的商品添加到用户拥有的商品中（已拥有的不重复添加）
+            grant_order_products.enqueue(order_id=order.id)
         
         serializer = OrderSerializer(order, context={'request': request})
         return Response({
-            'message': '确认收货成功，商品已添加到您的拥有列表',
+            'message': '确认收货成功，商品将添加到您的拥有列表',
             'order': serializer.data
         }, status=status.HTTP_200_OK)
         
@@ -439,7 +432,7 @@ class OrderItemReviewViewSet(viewsets.ModelViewSet):
             'order_item__order',
             'order_item__sku__spu',
             'user'
-        ).order_by('-created_at')
+        ).prefetch_related('review_images').order_by('-created_at')
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -471,6 +464,7 @@ class OrderItemReviewViewSet(viewsets.ModelViewSet):
         
         # 保存评价（rating 使用模型默认值5）
         review = serializer.save(
+            order_item=order_item,
             user=self.request.user,
             spu=order_item.sku.spu,
             rating=5  # 明确设置评分为5
@@ -570,6 +564,10 @@ class UserOwnedProductViewSet(viewsets.ModelViewSet):
 # 配置 Stripe API 密钥
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Stripe 支付页有效期范围（expires_at 需在创建后 30 分钟到 24 小时之间）
+STRIPE_CHECKOUT_MIN_LIFETIME = timedelta(minutes=31)
+STRIPE_CHECKOUT_MAX_LIFETIME = timedelta(hours=24)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_checkout_session(request):
@@ -598,6 +596,14 @@ def create_checkout_session(request):
                 'error': '订单状态不正确，只能支付待支付订单'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # 支付页需在订单过期（expire_orders 自动取消）前关闭，Stripe 要求支付页至少保留 30 分钟
+        expires_at = pending_order_expires_at(order)
+        if expires_at - timezone.now() < STRIPE_CHECKOUT_MIN_LIFETIME:
+            return Response({
+                'error': '订单即将超时关闭，请重新下单'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        expires_at = min(expires_at, timezone.now() + STRIPE_CHECKOUT_MAX_LIFETIME)
+        
         # 获取前端地址（从环境变量或请求头获取）
         frontend_url = os.environ.get('FRONTEND_URL')
         
@@ -632,6 +638,7 @@ def create_checkout_session(request):
                 'user_id': str(request.user.id),
             },
             client_reference_id=str(order.id),
+            expires_at=int(expires_at.timestamp()),
         )
         
         # 返回 session ID 和 URL
@@ -656,11 +663,9 @@ def create_checkout_session(request):
 @permission_classes([AllowAny])  # Webhook 不需要身份验证
 def stripe_webhook(request):
     """
-    处理 Stripe Webhook 事件
-    
-    主要处理以下事件:
+    接收 Stripe Webhook 事件
+    验签后写入 StripeEvent 并立即返回 200，事件处理见 stripe_events.py:
     - checkout.session.completed: 支付成功
-    - payment_intent.succeeded: 支付意图成功
     """
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
@@ -681,9 +686,11 @@ def stripe_webhook(request):
     else:
         # 验证 webhook 签名
         try:
-            event = stripe.Webhook.construct_event(
+            stripe.Webhook.construct_event(
                 payload, sig_header, webhook_secret
             )
+            # 验签通过后按原始 JSON 存储（Event 对象不能直接写入 JSONField）
+            event = json.loads(payload)
         except ValueError:
             # 无效的 payload
             return HttpResponse(status=400)
@@ -691,54 +698,10 @@ def stripe_webhook(request):
             # 无效的签名
             return HttpResponse(status=400)
     
-    # 处理事件
-    event_type = event['type']
-    
-    if event_type == 'checkout.session.completed':
-        # 支付成功
-        session = event['data']['object']
-        
-        # 获取订单ID
-        order_id = session.get('metadata', {}).get('order_id') or session.get('client_reference_id')
-        
-        if order_id:
-            try:
-                with transaction.atomic():
-                    order = Order.objects.get(id=order_id)
-                    
-                    # 更新订单状态为已支付
-                    if order.status == 'pending':
-                        order.status = 'paid'
-                        order.paid_at = timezone.now()
-                        order.payment_method = 'stripe'
-                        order.save()
-                        
-                        # 如果是虚拟商品，自动添加到用户拥有列表
-                        from user.models import UserProduct
-                        for item in order.items.all():
-                            UserProduct.objects.get_or_create(
-                                user=order.user,
-                                sku=item.sku,
-                                defaults={'purchased_at': timezone.now()}
-                            )
-                        
-                        print(f'✅ 订单 {order_id} 支付成功，已更新状态')
-                    else:
-                        print(f'⚠️ 订单 {order_id} 状态为 {order.status}，跳过更新')
-                        
-            except Order.DoesNotExist:
-                print(f'❌ 订单 {order_id} 不存在')
-                return HttpResponse(status=404)
-            except Exception as e:
-                print(f'❌ 处理订单 {order_id} 时出错: {str(e)}')
-                return HttpResponse(status=500)
-    
-    elif event_type == 'payment_intent.succeeded':
-        # 支付意图成功（如果使用 PaymentIntent 而不是 Checkout）
-        payment_intent = event['data']['object']
-        print(f'✅ PaymentIntent {payment_intent["id"]} 成功')
-    
-    else:
-        print(f'ℹ️ 未处理的事件类型: {event_type}')
+    # 记录事件后立即返回，由后台任务 shopping.process_stripe_event 处理（manage.py runworker）
+    # event_id 唯一，Stripe 重试推送同一事件时不会重复记录
+    if not isinstance(event, dict) or not event.get('id') or not event.get('type'):
+        return HttpResponse(status=400)
+    record_event(event)
     
     return HttpResponse(status=200)
\ No newline at end of file
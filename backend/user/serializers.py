@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth import authenticate
 
 from .models import PostFavorite, ProductFavorite, CartItem, Address
+from backend.thumbnails import image_url
 from forum.serializers import PostSerializer
 
 User = get_user_model()  # 获取自定义的 User 模型
@@ -80,13 +81,8 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'date_joined']
     
     def get_avatar(self, obj):
-        """返回头像完整 URL"""
-        request = self.context.get('request')
-        if obj.avatar:
-            if request:
-                return request.build_absolute_uri(obj.avatar.url)
-            return obj.avatar.url
-        return None
+        """返回头像完整 URL，尺寸由 image_size 参数选择"""
+        return image_url(obj.avatar, self.context.get('request'))
     
 class PostFavoriteSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
@@ -100,8 +96,8 @@ class PostFavoriteSerializer(serializers.ModelSerializer):
     def get_post(self, obj):
         """使用PostSerializer序列化post对象，并传递request上下文"""
         from forum.serializers import PostSerializer
-        request = self.context.get('request')
-        return PostSerializer(obj.post, context={'request': request}).data
+        # 传递完整上下文，沿用视图预先加载的回复树
+        return PostSerializer(obj.post, context=self.context).data
 
 class ProductFavoriteSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
@@ -139,11 +135,11 @@ class CartItemSerializer(serializers.ModelSerializer):
         spu_main_image = sku.spu.images.filter(is_main=True).first()
         
         if sku_image:
-            image_url = request.build_absolute_uri(sku_image.image.url) if request else sku_image.image.url
+            sku_image_url = image_url(sku_image.image, request)
         elif spu_main_image:
-            image_url = request.build_absolute_uri(spu_main_image.image.url) if request else spu_main_image.image.url
+            sku_image_url = image_url(spu_main_image.image, request)
         else:
-            image_url = None
+            sku_image_url = None
         
         # 获取库存信息
         inventory = getattr(sku, 'inventory', None)
@@ -158,7 +154,7 @@ class CartItemSerializer(serializers.ModelSerializer):
             'price': str(sku.price),
             'stock': stock,
             'is_active': is_active,
-            'image': image_url,
+            'image': sku_image_url,
             'spu_name': sku.spu.name,
             'spu_id': sku.spu.id
         }
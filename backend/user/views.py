@@ -9,6 +9,9 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework import viewsets
 from rest_framework.pagination import PageNumberPagination
+from shopping.pagination import KeysetPaginationMixin
+from forum.views import PostReplyTreeMixin, prefetch_post_relations
+from backend.thumbnails import delete_derivatives
 
 # 序列化器
 from .serializers import RegisterSerializer
@@ -78,6 +81,8 @@ def upload_avatar(request):
         
     # 删除旧头像（如果存在且不是默认头像）
     if user.avatar and user.avatar.name != 'avatars/default.png':
+        # 新头像可能沿用旧文件名，先删除旧头像的缩略图
+        delete_derivatives(user.avatar.name)
         user.avatar.delete(save=False)
         
     # 保存新头像
@@ -134,6 +139,7 @@ def delete_account(request):
     try:
         # 删除用户头像文件（如果存在且不是默认头像）
         if user.avatar and user.avatar.name != 'avatars/default.png':
+            delete_derivatives(user.avatar.name)
             user.avatar.delete(save=False)
                 
         # 删除用户账户
@@ -150,28 +156,28 @@ def delete_account(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-# 自定义分页类，允许客户端指定page_size
-class LargeResultsSetPagination(PageNumberPagination):
+# 自定义分页类，允许客户端指定page_size，传 ?pagination=cursor 时使用游标分页
+class LargeResultsSetPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 1000
 
 
 # 帖子收藏ViewSet
-class PostFavoriteViewSet(viewsets.ModelViewSet):
+class PostFavoriteViewSet(PostReplyTreeMixin, viewsets.ModelViewSet):
     serializer_class = PostFavoriteSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = LargeResultsSetPagination
+    cursor_ordering = ('-id',)  # PostFavorite 没有 created_at，id 按收藏顺序递增
         
     def get_queryset(self):
-        return PostFavorite.objects.filter(user=self.request.user).select_related(
-            'post', 
-            'post__author'
-        ).prefetch_related(
-            'post__images',
-            'post__tags',
-            'post__products'
+        return prefetch_post_relations(
+            PostFavorite.objects.filter(user=self.request.user).select_related('post', 'user'),
+            prefix='post__',
         )
+
+    def get_reply_posts(self, page):
+        return [favorite.post for favorite in page]
         
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -212,6 +218,7 @@ class ProductFavoriteViewSet(viewsets.ModelViewSet):
     serializer_class = ProductFavoriteSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = LargeResultsSetPagination
+    cursor_ordering = ('-id',)  # 早期收藏记录的 created_at 可能为空，按 id 排序
 
     def get_queryset(self):
         return ProductFavorite.objects.filter(user=self.request.user).select_related(
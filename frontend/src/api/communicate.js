@@ -7,6 +7,11 @@ export const communicateAPI = {
         return apiClient.get('/forum/posts/', { params });
     },
 
+    // 获取帖子详情（完整内容、图片和回复）
+    getPost(postId) {
+        return apiClient.get(`/forum/posts/${postId}/`);
+    },
+
     // 创建帖子
     createPost(data) {
         return apiClient.post('/forum/posts/', data);
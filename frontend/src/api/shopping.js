@@ -11,8 +11,9 @@ export const category = {
 // SPU相关API
 export const shopping = {
   // 获取SPU列表（支持分页和搜索）
+  // 列表卡片使用 400px 的 WebP 缩略图，不下载原图
   getSPUList(params = {}) {
-    return axios.get('/shopping/spu/', { params })
+    return axios.get('/shopping/spu/', { params: { image_size: 'small', image_format: 'webp', ...params } })
   },
 
   // 获取SPU详情
@@ -60,7 +61,7 @@ export const shopping = {
 export const cart = {
   // 获取购物车列表
   getCartItems() {
-    return axios.get('/cart/')
+    return axios.get('/cart/', { params: { image_size: 'thumb', image_format: 'webp' } })
   },
 
   // 添加到购物车
@@ -41,6 +41,17 @@ export const usePostsStore = defineStore('posts', () => {
         }
     }
 
+    // 获取帖子详情（列表只返回摘要，完整内容需单独获取）
+    const fetchPost = async (postId) => {
+        try {
+            const response = await communicateAPI.getPost(postId)
+            return response.data
+        } catch (error) {
+            console.error('获取帖子详情失败:', error)
+            throw error
+        }
+    }
+
     // 获取标签
     const fetchTags = async () => {
         try {
@@ -190,5 +201,5 @@ export const usePostsStore = defineStore('posts', () => {
         }
     }
 
-    return { posts, availableTags, pagination, fetchPosts, fetchTags, createTag, uploadImage, uploadImages, deletePost, createPost, updatePost, createReply, fetchReplies, deleteReply }
+    return { posts, availableTags, pagination, fetchPosts, fetchPost, fetchTags, createTag, uploadImage, uploadImages, deletePost, createPost, updatePost, createReply, fetchReplies, deleteReply }
 })
\ No newline at end of file